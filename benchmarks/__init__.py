@@ -0,0 +1,4 @@
+"""
+Offline benchmarks: fake Ollama server, in-memory Neo4j/MongoDB stand-ins and
+scenario scripts. Run with `python -m benchmarks.run <scenario>`.
+"""
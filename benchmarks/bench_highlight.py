@@ -0,0 +1,140 @@
+"""
+benchmarks/bench_highlight.py
+
+Highlight render latency:
+    - render_page_highlight called directly, with the ingest sidecar (stored
+      word boxes) and without it (full-page search_for fallback),
+    - the /pdf/highlight endpoint through a TestClient: cold (render cache
+      miss), warm (cache hit) and conditional (304) passes,
+    - /pdf/highlight/batch with every sampled chunk of a page in one request.
+"""
+
+import os
+import time
+import random
+import shutil
+import logging
+from collections import defaultdict
+from typing import List
+
+from benchmarks.harness import Stopwatch, histogram_totals, make_pdf, percentiles, stage_delta
+
+#logging configuration
+logger= logging.getLogger(__name__)
+
+#highest resolution accepted by the highlight endpoints (RenderOptions.dpi)
+MAX_DPI= 300
+
+
+def _analyze(pdf_path: str)-> List[dict]:
+    """Chunk the PDF once, write its sidecar and return the chunks."""
+    from services.chunking import DocumentChunker
+    from services.pdf_analysis import sidecar_path
+
+    chunker= DocumentChunker()
+    try:
+        with chunker.open(pdf_path) as pdf:
+            chunks= list(pdf.chunks())
+        pdf.analysis.save(sidecar_path(pdf_path))
+    finally:
+        chunker.close()
+    return chunks
+
+
+def _timed(call, items)-> List[float]:
+    latencies= []
+    for item in items:
+        start= time.perf_counter()
+        call(item)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run(workdir: str, server= None, samples: int= 50, pages: int= 20, words_per_page: int= 350,
+        dpi: int= 150, fmt: str= "png", seed: int= 7, **_)-> dict:
+    """
+    Arguments:
+        workdir ---> str: Scratch directory of the run.
+        server ---> FakeOllamaServer: Unused (highlighting needs no model).
+        samples ---> int: Chunks highlighted per pass.
+        pages ---> int: Pages of the synthetic PDF.
+        words_per_page ---> int: Body text per page.
+        dpi ---> int: Render resolution.
+        fmt ---> str: Image format (png, jpeg, webp).
+        seed ---> int: Seed for sampling chunks.
+    """
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from router import pdf_render
+    from services.metrics import HIGHLIGHT_SECONDS
+    from services.pdf_analysis import sidecar_path
+    from services.pdf_utils import render_page_highlight
+
+    directory= os.path.join(workdir, "highlight_pdfs")
+    os.makedirs(directory, exist_ok= True)
+    pdf_path= make_pdf(os.path.join(directory, "highlight.pdf"), pages, seed= 0, words_per_page= words_per_page)
+    #same bytes without a sidecar, for the search_for fallback
+    plain_path= os.path.join(directory, "highlight_plain.pdf")
+    shutil.copyfile(pdf_path, plain_path)
+
+    with Stopwatch() as analyze_sw:
+        chunks= _analyze(pdf_path)
+    rng= random.Random(seed)
+    picked= [chunks[i] for i in sorted(rng.sample(range(len(chunks)), min(samples, len(chunks))))]
+    options= {"dpi": dpi, "fmt": fmt}
+
+    #direct rendering (no cache); first call of each kind warms the document pool
+    render_page_highlight(pdf_path, picked[0]["page_num"], picked[0]["text"], **options)
+    render_page_highlight(plain_path, picked[0]["page_num"], picked[0]["text"], **options)
+    stored= _timed(lambda c: render_page_highlight(pdf_path, c["page_num"], c["text"],
+                                                   chunk_ids= [c["chunk_id"]], **options), picked)
+    searched= _timed(lambda c: render_page_highlight(plain_path, c["page_num"], c["text"], **options), picked)
+
+    #endpoint passes through the render cache
+    app= FastAPI()
+    app.include_router(pdf_render.router)
+    client= TestClient(app)
+    body= lambda c: {"pdf_path": pdf_path, "page_num": c["page_num"], "snippet": c["text"],
+                     "chunk_id": c["chunk_id"], "dpi": dpi, "format": fmt}
+    etags= {}
+
+    def cold(c):
+        response= client.post("/pdf/highlight", json= body(c))
+        response.raise_for_status()
+        etags[c["chunk_id"]]= response.headers["etag"]
+
+    def conditional(c):
+        response= client.post("/pdf/highlight", json= body(c), headers= {"If-None-Match": etags[c["chunk_id"]]})
+        if response.status_code != 304:
+            raise RuntimeError(f"expected 304, got {response.status_code}")
+
+    before= histogram_totals(HIGHLIGHT_SECONDS)
+    cold_latencies= _timed(cold, picked)
+    warm_latencies= _timed(lambda c: client.post("/pdf/highlight", json= body(c)).raise_for_status(), picked)
+    not_modified= _timed(conditional, picked)
+
+    #one batch request per page: every sampled chunk of the page, at a resolution not rendered yet
+    #(one step below at the endpoint's upper bound)
+    batch_dpi= dpi + 1 if dpi < MAX_DPI else dpi - 1
+    by_page= defaultdict(list)
+    for c in picked:
+        by_page[c["page_num"]].append({**body(c), "dpi": batch_dpi})
+    batch= _timed(lambda items: client.post("/pdf/highlight/batch", json= {"items": items}).raise_for_status(),
+                  list(by_page.values()))
+    stages= stage_delta(before, histogram_totals(HIGHLIGHT_SECONDS))
+    client.close()
+
+    return {
+        "chunks": len(chunks),
+        "samples": len(picked),
+        "analyze_s": round(analyze_sw.elapsed, 3),
+        "sidecar_bytes": os.path.getsize(sidecar_path(pdf_path)),
+        "render_stored_boxes": percentiles(stored),
+        "render_search_for": percentiles(searched),
+        "endpoint_cold": percentiles(cold_latencies),
+        "endpoint_warm": percentiles(warm_latencies),
+        "endpoint_304": percentiles(not_modified),
+        "batch_per_page": percentiles(batch),
+        "batch_pages": len(by_page),
+        "stages": stages,
+    }
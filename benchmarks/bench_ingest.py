@@ -0,0 +1,96 @@
+"""
+benchmarks/bench_ingest.py
+
+Ingest throughput: synthetic PDFs through PDFUploader.process_saved_pdfs
+(chunking -> embedding on the fake Ollama -> writes to the in-memory stores).
+
+Reports pages/s and chunks/s, the per-stage breakdown from the ingest metrics
+and, for a second pass over the same files, the incremental re-ingest time
+(unchanged pages are skipped by their page hashes).
+"""
+
+import os
+import hashlib
+import logging
+from typing import List
+
+from benchmarks.harness import Stopwatch, histogram_totals, make_corpus, stage_delta
+from benchmarks.stand_ins import InMemoryMongo, InMemoryVectorStorage
+
+#logging configuration
+logger= logging.getLogger(__name__)
+
+
+def _saved_entries(paths: List[str])-> List[dict]:
+    """Entries in the shape returned by PDFUploader.save_uploads."""
+    entries= []
+    for path in paths:
+        with open(path, "rb") as f:
+            content_hash= hashlib.sha256(f.read()).hexdigest()
+        entries.append({"filename": os.path.basename(path), "path": path,
+                        "content_hash": content_hash, "duplicate_of": None})
+    return entries
+
+
+def build_uploader(neo4j_latency: float= 0.0, mongo_latency: float= 0.0):
+    """PDFUploader with the databases replaced by in-memory stand-ins."""
+    from router.pdf_upload import PDFUploader
+
+    uploader= PDFUploader()
+    uploader.storage.close()
+    uploader.mongo.close()
+    uploader.storage= InMemoryVectorStorage(mirror= uploader.local_index, latency= neo4j_latency)
+    uploader.mongo= InMemoryMongo(latency= mongo_latency)
+    return uploader
+
+
+def _ingest_pass(uploader, entries: List[dict], project: str)-> dict:
+    from services.metrics import INGEST_STAGE_SECONDS
+
+    before= histogram_totals(INGEST_STAGE_SECONDS)
+    with Stopwatch() as sw:
+        summary= uploader.process_saved_pdfs(entries, project_name= project)
+    return {
+        "seconds": round(sw.elapsed, 3),
+        "uploaded": len(summary["uploaded_files"]),
+        "stages": stage_delta(before, histogram_totals(INGEST_STAGE_SECONDS)),
+    }
+
+
+def run(workdir: str, server, pdfs: int= 4, pages: int= 20, words_per_page: int= 350,
+        neo4j_latency: float= 0.0, mongo_latency: float= 0.0, **_)-> dict:
+    """
+    Arguments:
+        workdir ---> str: Scratch directory of the run.
+        server ---> FakeOllamaServer: Running fake Ollama (for request counts).
+        pdfs ---> int: Number of PDFs to ingest.
+        pages ---> int: Pages per PDF.
+        words_per_page ---> int: Body text per page.
+        neo4j_latency ---> float: Simulated Neo4j round trip, in seconds.
+        mongo_latency ---> float: Simulated MongoDB round trip, in seconds.
+    """
+    paths= make_corpus(os.path.join(workdir, "ingest_pdfs"), pdfs, pages, words_per_page)
+    entries= _saved_entries(paths)
+    uploader= build_uploader(neo4j_latency, mongo_latency)
+    embed_requests= server.requests.get("/api/embed", 0)
+
+    logger.info(f"Ingesting {pdfs} PDFs x {pages} pages")
+    first= _ingest_pass(uploader, entries, "bench_ingest")
+    chunks= uploader.storage.stats()["chunks"]
+    total_pages= pdfs * pages
+    first.update({
+        "pages": total_pages,
+        "chunks": chunks,
+        "pages_per_s": round(total_pages / first["seconds"], 2) if first["seconds"] else None,
+        "chunks_per_s": round(chunks / first["seconds"], 2) if first["seconds"] else None,
+        "embed_requests": server.requests.get("/api/embed", 0) - embed_requests,
+    })
+
+    #same files again: every page hash matches, so nothing is re-embedded or re-written
+    embed_requests= server.requests.get("/api/embed", 0)
+    second= _ingest_pass(uploader, entries, "bench_ingest")
+    second["embed_requests"]= server.requests.get("/api/embed", 0) - embed_requests
+
+    storage_calls= uploader.storage.stats()["calls"]
+    uploader.chunker.close()
+    return {"ingest": first, "reingest": second, "storage_calls": storage_calls}
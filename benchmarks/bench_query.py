@@ -0,0 +1,128 @@
+"""
+benchmarks/bench_query.py
+
+Query latency under concurrency: RAGPipeline.aquery (or astream_query with
+--stream) against a corpus ingested into the in-memory store, with the fake
+Ollama serving embeddings and generations.
+
+Reports p50/p95/p99 end-to-end latency, time to first token when streaming,
+throughput (queries/s) and the per-stage breakdown from the query metrics.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import List
+
+from benchmarks.bench_ingest import _saved_entries, build_uploader
+from benchmarks.harness import corpus_questions, histogram_totals, make_corpus, percentiles, stage_delta
+
+#logging configuration
+logger= logging.getLogger(__name__)
+
+
+def build_pipeline(storage):
+    """RAGPipeline with Neo4j replaced by `storage` and Langfuse switched off."""
+    from services.querying import RAGPipeline
+
+    pipeline= RAGPipeline()
+    if pipeline.prompt_cache:
+        pipeline.prompt_cache.stop()
+    pipeline.prompt_cache= None
+    pipeline.langfuse= None
+    pipeline.llm.callbacks= None
+    pipeline.vector_index= None
+    pipeline.async_driver= None
+    if pipeline.storage is not None:
+        pipeline.storage.close()
+    pipeline.storage= storage
+    return pipeline
+
+
+async def _one_query(pipeline, question: str, top_k: int, stream: bool)-> dict:
+    start= time.perf_counter()
+    if not stream:
+        result= await pipeline.aquery(question, top_k= top_k)
+        return {"seconds": time.perf_counter() - start, "ttft": None, "chunks": len(result.get("chunks", []))}
+    ttft= None
+    chunks= 0
+    async for event in pipeline.astream_query(question, top_k= top_k):
+        if event["event"] == "chunks":
+            chunks= len(event["data"]["chunks"])
+        elif event["event"] == "token" and ttft is None:
+            ttft= time.perf_counter() - start
+        elif event["event"] == "error":
+            raise RuntimeError(event["data"]["detail"])
+    return {"seconds": time.perf_counter() - start, "ttft": ttft, "chunks": chunks}
+
+
+async def _run_load(pipeline, questions: List[str], concurrency: int, top_k: int, stream: bool)-> dict:
+    semaphore= asyncio.Semaphore(concurrency)
+    samples, errors= [], []
+
+    async def worker(question: str):
+        async with semaphore:
+            try:
+                samples.append(await _one_query(pipeline, question, top_k, stream))
+            except Exception as e:
+                errors.append(str(e))
+
+    start= time.perf_counter()
+    await asyncio.gather(*(worker(q) for q in questions))
+    wall= time.perf_counter() - start
+    return {"samples": samples, "errors": errors, "wall": wall}
+
+
+def run(workdir: str, server, requests: int= 200, concurrency: int= 8, top_k: int= 3, stream: bool= False,
+        warmup: int= 5, pdfs: int= 4, pages: int= 20, words_per_page: int= 350,
+        neo4j_latency: float= 0.0, **_)-> dict:
+    """
+    Arguments:
+        workdir ---> str: Scratch directory of the run.
+        server ---> FakeOllamaServer: Running fake Ollama.
+        requests ---> int: Measured queries.
+        concurrency ---> int: Queries in flight at once.
+        top_k ---> int: Chunks retrieved per query.
+        stream ---> bool: Use astream_query and report time to first token.
+        warmup ---> int: Unmeasured queries sent first.
+        pdfs, pages, words_per_page ---> int: Size of the ingested corpus.
+        neo4j_latency ---> float: Simulated Neo4j round trip, in seconds.
+    """
+    from services.metrics import QUERY_STAGE_SECONDS
+
+    #corpus setup through the real ingest path (not measured)
+    paths= make_corpus(os.path.join(workdir, "query_pdfs"), pdfs, pages, words_per_page)
+    uploader= build_uploader(neo4j_latency)
+    uploader.process_saved_pdfs(_saved_entries(paths), project_name= "bench_query")
+    uploader.chunker.close()
+    storage= uploader.storage
+    logger.info(f"Corpus ready: {storage.stats()['chunks']} chunks")
+
+    pipeline= build_pipeline(storage)
+    questions= corpus_questions(requests + warmup)
+
+    async def main():
+        await _run_load(pipeline, questions[:warmup], concurrency, top_k, stream)
+        before= histogram_totals(QUERY_STAGE_SECONDS)
+        load= await _run_load(pipeline, questions[warmup:], concurrency, top_k, stream)
+        load["stages"]= stage_delta(before, histogram_totals(QUERY_STAGE_SECONDS))
+        return load
+
+    load= asyncio.run(main())
+    samples= load["samples"]
+    results= {
+        "chunks": storage.stats()["chunks"],
+        "completed": len(samples),
+        "errors": len(load["errors"]),
+        "wall_s": round(load["wall"], 3),
+        "qps": round(len(samples) / load["wall"], 2) if load["wall"] else None,
+        "latency": percentiles([s["seconds"] for s in samples]),
+        "empty_results": sum(1 for s in samples if not s["chunks"]),
+        "stages": load["stages"],
+    }
+    if stream:
+        results["ttft"]= percentiles([s["ttft"] for s in samples if s["ttft"] is not None])
+    if load["errors"]:
+        results["first_error"]= load["errors"][0]
+    return results
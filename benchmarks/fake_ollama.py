@@ -0,0 +1,276 @@
+"""
+benchmarks/fake_ollama.py
+
+Local stand-in for the Ollama HTTP API, for offline benchmarks.
+
+Implements the endpoints used through langchain_ollama / the ollama client:
+    POST /api/embed        -> {"embeddings": [[...], ...]}
+    POST /api/embeddings   -> {"embedding": [...]}          (legacy)
+    POST /api/generate     -> NDJSON stream (or one object when stream=false)
+    POST /api/chat         -> NDJSON stream (or one object when stream=false)
+    GET  /api/tags, GET /api/version, POST /api/show
+
+Embeddings are deterministic (hashed bag of words, L2-normalized), so texts
+sharing words are similar and repeated runs give identical vectors.
+Latency is configurable per request, per embedded text, to first token and
+per generated token.
+
+Run standalone:
+    python -m benchmarks.fake_ollama --port 11435 --ttft 0.2 --token-latency 0.02
+"""
+
+import re
+import json
+import time
+import zlib
+import hashlib
+import argparse
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+#logging configuration
+logger= logging.getLogger(__name__)
+
+_WORD= re.compile(r"\w+")
+
+
+@dataclass
+class FakeOllamaConfig:
+    """Latency and output shape of the fake server (seconds)."""
+    dim: int= 768
+    embed_latency: float= 0.005
+    embed_per_item: float= 0.001
+    ttft: float= 0.05
+    token_latency: float= 0.005
+    answer_tokens: int= 64
+
+
+def fake_embedding(text: str, dim: int= 768)-> List[float]:
+    """Deterministic unit vector: signed hashed word counts (random unit vector for wordless text)."""
+    vector= [0.0] * dim
+    words= _WORD.findall(text.lower())
+    for word in words:
+        h= zlib.crc32(word.encode("utf-8"))
+        vector[h % dim]+= 1.0 if (h >> 16) & 1 else -1.0
+    if not any(vector):
+        seed= hashlib.sha256(text.encode("utf-8")).digest()
+        vector= [(seed[i % len(seed)] - 127.5) / 127.5 for i in range(dim)]
+    norm= sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+def fake_answer(prompt: str, tokens: int)-> List[str]:
+    """Deterministic answer pieces built from the prompt's words."""
+    words= _WORD.findall(prompt) or ["answer"]
+    offset= zlib.crc32(prompt.encode("utf-8")) % len(words)
+    return [words[(offset + i) % len(words)] + " " for i in range(max(1, tokens))]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version= "HTTP/1.1"
+    server: "FakeOllamaServer"
+
+    def log_message(self, format, *args):
+        logger.debug("fake-ollama: " + format, *args)
+
+    def _read_json(self)-> dict:
+        length= int(self.headers.get("Content-Length") or 0)
+        body= self.rfile.read(length) if length else b""
+        return json.loads(body) if body else {}
+
+    def _send_json(self, payload: dict, status: int= 200):
+        data= json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, pieces: List[str], make_chunk, make_final):
+        """Send NDJSON chunks with chunked transfer encoding, pacing tokens like a real model."""
+        config= self.server.config
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write(obj: dict):
+            line= (json.dumps(obj) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+            self.wfile.flush()
+
+        time.sleep(config.ttft)
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(config.token_latency)
+            write(make_chunk(piece))
+        write(make_final())
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.startswith("/api/tags"):
+            self._send_json({"models": [{"name": "fake:latest", "model": "fake:latest", "size": 0}]})
+        elif self.path.startswith("/api/version"):
+            self._send_json({"version": "0.0.0-fake"})
+        else:
+            self._send_json({"status": "ok"})
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        try:
+            body= self._read_json()
+        except ValueError as e:
+            self._send_json({"error": f"invalid JSON: {e}"}, status= 400)
+            return
+        path= self.path.split("?")[0]
+        handler= {
+            "/api/embed": self._embed,
+            "/api/embeddings": self._embeddings,
+            "/api/generate": self._generate,
+            "/api/chat": self._chat,
+            "/api/show": self._show,
+        }.get(path)
+        if handler is None:
+            self._send_json({"error": f"unknown endpoint {path}"}, status= 404)
+            return
+        self.server.count(path)
+        handler(body)
+
+    def _embed(self, body: dict):
+        config= self.server.config
+        texts= body.get("input", "")
+        texts= [texts] if isinstance(texts, str) else list(texts)
+        time.sleep(config.embed_latency + config.embed_per_item * len(texts))
+        self._send_json({
+            "model": body.get("model", "fake"),
+            "embeddings": [fake_embedding(t, config.dim) for t in texts],
+        })
+
+    def _embeddings(self, body: dict):
+        config= self.server.config
+        time.sleep(config.embed_latency + config.embed_per_item)
+        self._send_json({"embedding": fake_embedding(body.get("prompt", ""), config.dim)})
+
+    def _generate(self, body: dict):
+        model= body.get("model", "fake")
+        pieces= fake_answer(body.get("prompt", ""), self.server.config.answer_tokens)
+        created= datetime.now(timezone.utc).isoformat()
+        final= {"model": model, "created_at": created, "response": "", "done": True, "done_reason": "stop",
+                "eval_count": len(pieces)}
+        if body.get("stream", True) is False:
+            config= self.server.config
+            time.sleep(config.ttft + config.token_latency * (len(pieces) - 1))
+            self._send_json({**final, "response": "".join(pieces)})
+            return
+        self._stream(
+            pieces,
+            lambda piece: {"model": model, "created_at": created, "response": piece, "done": False},
+            lambda: final,
+        )
+
+    def _chat(self, body: dict):
+        model= body.get("model", "fake")
+        messages= body.get("messages") or []
+        prompt= "\n".join(str(m.get("content", "")) for m in messages)
+        pieces= fake_answer(prompt, self.server.config.answer_tokens)
+        created= datetime.now(timezone.utc).isoformat()
+        final= {"model": model, "created_at": created, "message": {"role": "assistant", "content": ""},
+                "done": True, "done_reason": "stop", "eval_count": len(pieces)}
+        if body.get("stream", True) is False:
+            config= self.server.config
+            time.sleep(config.ttft + config.token_latency * (len(pieces) - 1))
+            self._send_json({**final, "message": {"role": "assistant", "content": "".join(pieces)}})
+            return
+        self._stream(
+            pieces,
+            lambda piece: {"model": model, "created_at": created,
+                           "message": {"role": "assistant", "content": piece}, "done": False},
+            lambda: final,
+        )
+
+    def _show(self, body: dict):
+        self._send_json({"modelfile": "", "parameters": "", "template": "", "details": {"family": "fake"},
+                         "model_info": {}, "capabilities": ["completion", "embedding"]})
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    """
+    Threaded fake Ollama server. Use as a context manager, or start()/stop().
+    """
+    daemon_threads= True
+
+    def __init__(self, host: str= "127.0.0.1", port: int= 0, config: Optional[FakeOllamaConfig]= None):
+        """
+        Arguments:
+            host ---> str: Interface to bind.
+            port ---> int: Port (0 picks a free one; see `url`).
+            config ---> FakeOllamaConfig: Latency and output settings.
+        """
+        super().__init__((host, port), _Handler)
+        self.config= config or FakeOllamaConfig()
+        self.requests= {}
+        self._counts_lock= threading.Lock()
+        self._thread: Optional[threading.Thread]= None
+
+    @property
+    def url(self)-> str:
+        host, port= self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, path: str):
+        with self._counts_lock:
+            self.requests[path]= self.requests.get(path, 0) + 1
+
+    def start(self)-> "FakeOllamaServer":
+        self._thread= threading.Thread(target= self.serve_forever, name= "fake-ollama", daemon= True)
+        self._thread.start()
+        logger.info(f"Fake Ollama listening on {self.url}")
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self)-> "FakeOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser= argparse.ArgumentParser(description= "Fake Ollama server for offline benchmarks.")
+    parser.add_argument("--host", default= "127.0.0.1")
+    parser.add_argument("--port", type= int, default= 11435)
+    defaults= FakeOllamaConfig()
+    parser.add_argument("--dim", type= int, default= defaults.dim)
+    parser.add_argument("--embed-latency", type= float, default= defaults.embed_latency)
+    parser.add_argument("--embed-per-item", type= float, default= defaults.embed_per_item)
+    parser.add_argument("--ttft", type= float, default= defaults.ttft)
+    parser.add_argument("--token-latency", type= float, default= defaults.token_latency)
+    parser.add_argument("--answer-tokens", type= int, default= defaults.answer_tokens)
+    args= parser.parse_args()
+    logging.basicConfig(level= logging.INFO, format= "%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    config= FakeOllamaConfig(args.dim, args.embed_latency, args.embed_per_item,
+                             args.ttft, args.token_latency, args.answer_tokens)
+    server= FakeOllamaServer(args.host, args.port, config)
+    logger.info(f"Fake Ollama listening on {server.url} (set OLLAMA_HOST={server.url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
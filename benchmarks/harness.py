@@ -0,0 +1,263 @@
+"""
+benchmarks/harness.py
+
+Shared pieces of the benchmark scenarios:
+    - configure_environment: points the app at the fake Ollama server and at a
+      scratch directory (must run before any app module is imported, since
+      settings are read from the environment at import time),
+    - make_pdf / make_corpus: deterministic synthetic PDFs,
+    - percentiles and stage_delta (per-stage timings from the metrics registry),
+    - write_result / compare: machine-readable results and run-to-run diffs.
+"""
+
+import os
+import sys
+import math
+import json
+import time
+import random
+import platform
+import subprocess
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+RESULTS_DIR= Path(__file__).resolve().parent / "results"
+REPO_ROOT= Path(__file__).resolve().parent.parent
+
+#vocabulary of the synthetic corpus; a few topic words per page make retrieval non-trivial
+_VOCABULARY= (
+    "data model index vector query graph node chunk page document search answer context "
+    "embedding latency throughput cache memory disk network batch stream token prompt score "
+    "ranking retrieval storage project upload render highlight metric stage worker queue pool "
+    "system design service request response error retry timeout session driver cluster shard"
+).split()
+_TOPICS= (
+    "photosynthesis volcano glacier monsoon estuary savanna tundra archipelago aquifer canyon "
+    "nebula quasar pulsar comet asteroid eclipse meteor galaxy orbit satellite"
+).split()
+
+
+def configure_environment(ollama_url: str, workdir: str, semantic_cache: bool= False,
+                          vector_index_mode: str= "off", overrides: Optional[Dict[str, str]]= None):
+    """
+    Environment for an offline run. Call before importing services/router modules.
+
+    Arguments:
+        ollama_url ---> str: Base URL of the fake Ollama server.
+        workdir ---> str: Scratch directory for indexes, caches and sidecars.
+        semantic_cache ---> bool: Keep the semantic answer cache on (off measures the full pipeline).
+        vector_index_mode ---> str: VECTOR_INDEX_MODE for the run (off, fallback or primary).
+        overrides ---> Dict[str, str]: Extra settings, applied last.
+    """
+    os.makedirs(workdir, exist_ok= True)
+    os.environ.update({
+        "OLLAMA_HOST": ollama_url,
+        #every embedding goes to the (fake) model, so runs are comparable
+        "EMBEDDING_CACHE_ENABLED": "false",
+        "SEMANTIC_CACHE_ENABLED": "true" if semantic_cache else "false",
+        "VECTOR_INDEX_MODE": vector_index_mode,
+        "VECTOR_INDEX_PATH": os.path.join(workdir, "vector_index"),
+        "RENDER_CACHE_DIR": os.path.join(workdir, "render_cache"),
+        "SEMANTIC_CACHE_SHARED_DIR": os.path.join(workdir, "semantic_cache"),
+        #real services are replaced by stand-ins; unreachable addresses fail fast
+        "NEO4J_URI": "bolt://127.0.0.1:9",
+        "NEO4J_USER": "bench",
+        "NEO4J_PASSWORD": "bench",
+        "LANGFUSE_HOST": "http://127.0.0.1:9",
+        "LANGFUSE_PUBLIC_KEY": "",
+        "LANGFUSE_SECRET_KEY": "",
+        "MONGODB_URI": "",
+    })
+    os.environ.update(overrides or {})
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT))
+
+
+def make_pdf(path: str, pages: int, seed: int= 0, words_per_page: int= 350)-> str:
+    """
+    Write a deterministic text PDF (same arguments -> same text).
+
+    Arguments:
+        path ---> str: Output file.
+        pages ---> int: Number of pages.
+        seed ---> int: Seed for the generated text.
+        words_per_page ---> int: Words of body text per page.
+    """
+    import fitz
+
+    rng= random.Random(seed)
+    doc= fitz.open()
+    try:
+        for page_num in range(1, pages + 1):
+            topic= rng.sample(_TOPICS, 2)
+            words= [rng.choice(_VOCABULARY if rng.random() > 0.08 else topic) for _ in range(words_per_page)]
+            sentences= []
+            for i in range(0, len(words), 12):
+                sentence= " ".join(words[i:i + 12])
+                sentences.append(sentence[:1].upper() + sentence[1:] + ".")
+            page= doc.new_page()
+            body= f"Section {seed}.{page_num}: {topic[0]} and {topic[1]}\n\n" + " ".join(sentences)
+            page.insert_textbox(fitz.Rect(50, 50, page.rect.width - 50, page.rect.height - 50), body, fontsize= 9)
+        doc.save(path)
+    finally:
+        doc.close()
+    return path
+
+
+def make_corpus(directory: str, pdfs: int, pages: int, words_per_page: int= 350)-> List[str]:
+    """`pdfs` synthetic PDFs of `pages` pages each in `directory`; returns their paths."""
+    os.makedirs(directory, exist_ok= True)
+    return [
+        make_pdf(os.path.join(directory, f"bench_{i:03d}.pdf"), pages, seed= i, words_per_page= words_per_page)
+        for i in range(pdfs)
+    ]
+
+
+def corpus_questions(count: int, seed: int= 1)-> List[str]:
+    """Deterministic natural-language questions over the synthetic vocabulary."""
+    rng= random.Random(seed)
+    return [
+        f"How does the {rng.choice(_TOPICS)} {rng.choice(_VOCABULARY)} affect the {rng.choice(_VOCABULARY)} "
+        f"{rng.choice(_VOCABULARY)} of the {rng.choice(_VOCABULARY)}?"
+        for _ in range(count)
+    ]
+
+
+def percentiles(values: Sequence[float])-> dict:
+    """p50/p95/p99 (nearest rank), mean, min and max of latencies, in milliseconds."""
+    if not values:
+        return {"count": 0}
+    ordered= sorted(values)
+
+    def rank(p: float)-> float:
+        index= max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    to_ms= lambda seconds: round(seconds * 1000, 3)
+    return {
+        "count": len(ordered),
+        "p50_ms": to_ms(rank(50)),
+        "p95_ms": to_ms(rank(95)),
+        "p99_ms": to_ms(rank(99)),
+        "mean_ms": to_ms(sum(ordered) / len(ordered)),
+        "min_ms": to_ms(ordered[0]),
+        "max_ms": to_ms(ordered[-1]),
+    }
+
+
+def histogram_totals(histogram)-> Dict[str, tuple]:
+    """{label values joined by ',': (count, sum)} of a services.metrics Histogram."""
+    totals= {}
+    for key, child in histogram._items():
+        counts, total= child.snapshot()
+        totals[",".join(key) or "total"]= (sum(counts), total)
+    return totals
+
+
+def stage_delta(before: Dict[str, tuple], after: Dict[str, tuple])-> dict:
+    """Observations between two histogram_totals snapshots: count, total and mean per stage."""
+    stages= {}
+    for label, (count, total) in sorted(after.items()):
+        prev_count, prev_total= before.get(label, (0, 0.0))
+        count-= prev_count
+        total-= prev_total
+        if count:
+            stages[label]= {"count": count, "total_s": round(total, 4), "mean_ms": round(total / count * 1000, 3)}
+    return stages
+
+
+def _git(*args)-> Optional[str]:
+    try:
+        return subprocess.run(["git", *args], cwd= REPO_ROOT, capture_output= True, text= True,
+                              timeout= 30, check= True).stdout.strip()
+    except Exception:
+        return None
+
+
+def write_result(scenario: str, params: dict, results: dict, out_dir: Optional[str]= None)-> str:
+    """
+    Write one run as JSON (scenario, environment, parameters, results).
+
+    Arguments:
+        scenario ---> str: Scenario name (ingest, query, highlight).
+        params ---> dict: Parameters the run was started with.
+        results ---> dict: Measured values.
+        out_dir ---> str: Directory for result files (default benchmarks/results).
+    Returns:
+        str: Path of the written file.
+    """
+    now= datetime.now(timezone.utc)
+    status= _git("status", "--porcelain", "--untracked-files=no")
+    record= {
+        "scenario": scenario,
+        "timestamp": now.isoformat(timespec= "seconds"),
+        "git_commit": _git("rev-parse", "--short", "HEAD"),
+        "git_dirty": bool(status) if status is not None else None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": params,
+        "results": results,
+    }
+    directory= Path(out_dir) if out_dir else RESULTS_DIR
+    directory.mkdir(parents= True, exist_ok= True)
+    path= directory / f"{scenario}-{now.strftime('%Y%m%dT%H%M%SZ')}.json"
+    path.write_text(json.dumps(record, indent= 2))
+    return str(path)
+
+
+def _numeric_leaves(value, prefix: str= "")-> Dict[str, float]:
+    leaves= {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            leaves.update(_numeric_leaves(item, f"{prefix}.{key}" if prefix else str(key)))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        leaves[prefix]= float(value)
+    return leaves
+
+
+def compare(baseline_path: str, candidate_path: str)-> List[dict]:
+    """
+    Numeric results of two runs side by side.
+
+    Returns:
+        [{"metric", "baseline", "candidate", "change_pct"}] for every numeric
+        result present in both files (change_pct is None when the baseline is 0).
+    """
+    with open(baseline_path) as f:
+        baseline= json.load(f)
+    with open(candidate_path) as f:
+        candidate= json.load(f)
+    if baseline.get("scenario") != candidate.get("scenario"):
+        raise ValueError(f"Different scenarios: {baseline.get('scenario')} vs {candidate.get('scenario')}")
+    old= _numeric_leaves(baseline.get("results", {}))
+    new= _numeric_leaves(candidate.get("results", {}))
+    rows= []
+    for metric in old:
+        if metric not in new:
+            continue
+        change= round((new[metric] - old[metric]) / old[metric] * 100, 1) if old[metric] else None
+        rows.append({"metric": metric, "baseline": old[metric], "candidate": new[metric], "change_pct": change})
+    return rows
+
+
+def format_comparison(rows: List[dict])-> str:
+    width= max([len(r["metric"]) for r in rows] + [6])
+    lines= [f"{'metric':<{width}}  {'baseline':>12}  {'candidate':>12}  {'change':>8}"]
+    for r in rows:
+        change= f"{r['change_pct']:+.1f}%" if r["change_pct"] is not None else "n/a"
+        lines.append(f"{r['metric']:<{width}}  {r['baseline']:>12g}  {r['candidate']:>12g}  {change:>8}")
+    return "\n".join(lines)
+
+
+class Stopwatch:
+    """perf_counter timer: `with Stopwatch() as sw: ...; sw.elapsed`."""
+
+    def __enter__(self)-> "Stopwatch":
+        self.start= time.perf_counter()
+        self.elapsed= 0.0
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed= time.perf_counter() - self.start
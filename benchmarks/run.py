@@ -0,0 +1,115 @@
+"""
+benchmarks/run.py
+
+Offline benchmark runner. Starts the fake Ollama server, points the app at it
+and at a scratch directory, runs the scenario(s) with the in-memory Neo4j and
+MongoDB stand-ins, and writes one JSON result per scenario to benchmarks/results/.
+
+    python -m benchmarks.run ingest --pdfs 8 --pages 25
+    python -m benchmarks.run query --requests 300 --concurrency 16 --stream
+    python -m benchmarks.run highlight --samples 100
+    python -m benchmarks.run all
+    python -m benchmarks.run compare benchmarks/results/query-A.json benchmarks/results/query-B.json
+"""
+
+import sys
+import json
+import shutil
+import logging
+import argparse
+import tempfile
+import importlib
+
+from benchmarks.fake_ollama import FakeOllamaConfig, FakeOllamaServer
+from benchmarks.harness import compare, configure_environment, format_comparison, write_result
+
+#logging configuration
+logger= logging.getLogger(__name__)
+
+SCENARIOS= ("ingest", "query", "highlight")
+
+
+def _parser()-> argparse.ArgumentParser:
+    parser= argparse.ArgumentParser(description= "Offline benchmarks with local stand-ins for Ollama, Neo4j and MongoDB.")
+    parser.add_argument("scenario", choices= SCENARIOS + ("all", "compare"))
+    parser.add_argument("files", nargs= "*", help= "compare: baseline and candidate result files")
+    parser.add_argument("--out", default= None, help= "Result directory (default benchmarks/results)")
+    parser.add_argument("--workdir", default= None, help= "Scratch directory (default: a temporary one)")
+    parser.add_argument("--keep", action= "store_true", help= "Keep the scratch directory")
+    parser.add_argument("--verbose", action= "store_true", help= "Show application logs")
+
+    corpus= parser.add_argument_group("corpus")
+    corpus.add_argument("--pdfs", type= int, default= 4)
+    corpus.add_argument("--pages", type= int, default= 20)
+    corpus.add_argument("--words-per-page", type= int, default= 350)
+
+    query= parser.add_argument_group("query")
+    query.add_argument("--requests", type= int, default= 200)
+    query.add_argument("--concurrency", type= int, default= 8)
+    query.add_argument("--top-k", type= int, default= 3)
+    query.add_argument("--warmup", type= int, default= 5)
+    query.add_argument("--stream", action= "store_true", help= "Measure astream_query (reports time to first token)")
+    query.add_argument("--semantic-cache", action= "store_true", help= "Leave the semantic answer cache on")
+    query.add_argument("--vector-index-mode", default= "off", choices= ("off", "fallback", "primary"))
+
+    highlight= parser.add_argument_group("highlight")
+    highlight.add_argument("--samples", type= int, default= 50)
+    highlight.add_argument("--dpi", type= int, default= 150)
+    highlight.add_argument("--format", dest= "fmt", default= "png", choices= ("png", "jpeg", "webp"))
+
+    latency= parser.add_argument_group("simulated latency (seconds)")
+    defaults= FakeOllamaConfig()
+    latency.add_argument("--dim", type= int, default= defaults.dim, help= "Embedding dimension of the fake model")
+    latency.add_argument("--embed-latency", type= float, default= defaults.embed_latency)
+    latency.add_argument("--embed-per-item", type= float, default= defaults.embed_per_item)
+    latency.add_argument("--ttft", type= float, default= defaults.ttft)
+    latency.add_argument("--token-latency", type= float, default= defaults.token_latency)
+    latency.add_argument("--answer-tokens", type= int, default= defaults.answer_tokens)
+    latency.add_argument("--neo4j-latency", type= float, default= 0.0)
+    latency.add_argument("--mongo-latency", type= float, default= 0.0)
+    return parser
+
+
+def _compare(files):
+    if len(files) != 2:
+        raise SystemExit("compare needs a baseline and a candidate result file")
+    try:
+        rows= compare(*files)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(format_comparison(rows))
+
+
+def main(argv= None):
+    args= _parser().parse_args(argv)
+    logging.basicConfig(level= logging.INFO if args.verbose else logging.ERROR,
+                        format= "%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    logging.getLogger(__name__).setLevel(logging.INFO)
+    if args.scenario == "compare":
+        return _compare(args.files)
+
+    params= {k: v for k, v in vars(args).items() if k not in ("scenario", "files", "out", "workdir", "keep", "verbose")}
+    config= FakeOllamaConfig(dim= args.dim, embed_latency= args.embed_latency, embed_per_item= args.embed_per_item,
+                             ttft= args.ttft, token_latency= args.token_latency, answer_tokens= args.answer_tokens)
+    workdir= args.workdir or tempfile.mkdtemp(prefix= "rag-bench-")
+    scenarios= SCENARIOS if args.scenario == "all" else (args.scenario,)
+
+    with FakeOllamaServer(config= config) as server:
+        configure_environment(server.url, workdir, semantic_cache= args.semantic_cache,
+                              vector_index_mode= args.vector_index_mode)
+        try:
+            for name in scenarios:
+                #app modules read settings at import time, so import only after configure_environment
+                scenario= importlib.import_module(f"benchmarks.bench_{name}")
+                logger.info(f"Running {name} benchmark (workdir {workdir})")
+                results= scenario.run(workdir, server, **params)
+                path= write_result(name, params, results, args.out)
+                print(json.dumps({"scenario": name, "results": results}, indent= 2))
+                logger.info(f"Results written to {path}")
+        finally:
+            if not args.keep and not args.workdir:
+                shutil.rmtree(workdir, ignore_errors= True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+"""
+benchmarks/stand_ins.py
+
+In-memory stand-ins for the databases, so ingest and query benchmarks run
+without Neo4j or MongoDB:
+
+    InMemoryVectorStorage -- the Neo4jStorage interface (PDF/chunk writes,
+                             page hashes, scoped vector search, BM25 full-text
+                             search, iter_chunks) over numpy arrays.
+    InMemoryMongo         -- the MongoMetadata interface over a list.
+
+Both take a `latency` (seconds per call) to stand in for a network round trip.
+"""
+
+import re
+import math
+import time
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.storage import Neo4jStorage
+
+#logging configuration
+logger= logging.getLogger(__name__)
+
+_WORD= re.compile(r"\w+")
+
+#BM25 parameters (Lucene defaults)
+BM25_K1= 1.2
+BM25_B= 0.75
+
+
+class InMemoryVectorStorage(Neo4jStorage):
+    """
+    Neo4jStorage replacement holding projects, PDFs and chunks in memory.
+    Vector search is exact cosine over a numpy matrix; full-text search is BM25.
+    Writes are mirrored to the local vector index exactly like Neo4jStorage.
+    """
+
+    def __init__(self, mirror= None, latency: float= 0.0):
+        """
+        Arguments:
+            mirror ---> LocalVectorIndex: Optional index kept in sync with chunk writes.
+            latency ---> float: Simulated round trip per call, in seconds.
+        """
+        self.latency= latency
+        self._lock= threading.Lock()
+        self._projects: Dict[str, set]= {}
+        #PDFs and chunks are keyed by project like the Neo4j nodes
+        self._pdfs: Dict[Tuple[str, str], dict]= {}
+        self._chunks: Dict[Tuple[str, str, str], dict]= {}
+        self._matrix: Optional[np.ndarray]= None
+        self._matrix_keys: List[Tuple[str, str, str]]= []
+        self._doc_freq: Counter= Counter()
+        self.calls: Counter= Counter()
+        super().__init__(uri= "memory://", user= "", password= "", mirror= mirror)
+
+    def _connect(self):
+        self.driver= None
+
+    def _round_trip(self, name: str):
+        self.calls[name]+= 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    #writes
+    def ensure_index(self):
+        self._round_trip("ensure_index")
+
+    def store_pdfs(self, project_name: str, pdf_data: list):
+        self._round_trip("store_pdfs")
+        with self._lock:
+            for pdf in pdf_data:
+                name= pdf.get("name") or pdf.get("pdf_name")
+                if not name:
+                    continue
+                entry= self._pdfs.setdefault((project_name, name), {"page_hashes": []})
+                entry.update({"pages": pdf.get("pages", 0), "content_hash": pdf.get("content_hash")})
+                self._projects.setdefault(project_name, set()).add(name)
+
+    def store_chunks(self, chunks: list, batch_size: Optional[int]= None)-> Tuple[int, int]:
+        batch_size= batch_size or self.write_batch_size
+        written= 0
+        for i in range(0, len(chunks), batch_size):
+            self._round_trip("store_chunks")
+            rows= [self._chunk_row(c) for c in chunks[i:i + batch_size]]
+            with self._lock:
+                #like the MATCH in Neo4j, rows without a PDF node are not written
+                rows= [row for row in rows if (row["project"], row["pdf_name"]) in self._pdfs]
+                for row in rows:
+                    key= self._row_key(row)
+                    old= self._chunks.get(key)
+                    if old is not None:
+                        self._doc_freq.subtract(old["terms"].keys())
+                    terms= Counter(_WORD.findall(row["text"].lower()))
+                    self._chunks[key]= {**row, "terms": terms, "length": sum(terms.values())}
+                    self._doc_freq.update(terms.keys())
+                self._matrix= None
+            self._mirror("upsert", rows)
+            written+= len(rows)
+        return written, len(chunks) - written
+
+    def store_project(self, project_name: str, pdf_data: list, chunks: list,
+                      bulk: Optional[bool]= None, batch_size: Optional[int]= None)-> dict:
+        start= time.perf_counter()
+        self.store_pdfs(project_name, pdf_data)
+        written, failed= self.store_chunks(chunks, batch_size)
+        elapsed= time.perf_counter() - start
+        return {"chunks_written": written, "chunks_failed": failed, "seconds": round(elapsed, 3),
+                "chunks_per_second": round(written / elapsed, 1) if elapsed > 0 else 0.0}
+
+    def find_pdf_by_hash(self, project_name: str, content_hash: str)-> Optional[str]:
+        self._round_trip("find_pdf_by_hash")
+        with self._lock:
+            for name in self._projects.get(project_name, ()):
+                if content_hash and self._pdfs[(project_name, name)].get("content_hash") == content_hash:
+                    return name
+        return None
+
+    def get_page_hashes(self, project_name: str, pdf_name: str)-> Dict[int, str]:
+        self._round_trip("get_page_hashes")
+        with self._lock:
+            hashes= (self._pdfs.get((project_name, pdf_name)) or {}).get("page_hashes") or []
+        return {page: h for page, h in enumerate(hashes, start= 1) if h}
+
+    def set_page_hashes(self, project_name: str, pdf_name: str, page_hashes: List[str]):
+        self._round_trip("set_page_hashes")
+        with self._lock:
+            if (project_name, pdf_name) in self._pdfs:
+                self._pdfs[(project_name, pdf_name)]["page_hashes"]= list(page_hashes)
+
+    def set_content_hash(self, project_name: str, pdf_name: str, content_hash: Optional[str]):
+        self._round_trip("set_content_hash")
+        with self._lock:
+            if (project_name, pdf_name) in self._pdfs:
+                self._pdfs[(project_name, pdf_name)]["content_hash"]= content_hash
+
+    def delete_stale_chunks(self, project_name: str, pdf_name: str, keep_ids: List[str],
+                            pages: Optional[List[int]]= None, batch_size: Optional[int]= None)-> int:
+        if pages is not None and not pages:
+            return 0
+        self._round_trip("delete_stale_chunks")
+        keep= set(keep_ids)
+        page_set= set(pages) if pages is not None else None
+        with self._lock:
+            stale= [
+                key for key, row in self._chunks.items()
+                if key[:2] == (project_name, pdf_name) and key[2] not in keep
+                and (page_set is None or row["page_num"] in page_set)
+            ]
+            for key in stale:
+                self._doc_freq.subtract(self._chunks.pop(key)["terms"].keys())
+            if stale:
+                self._matrix= None
+        self._mirror("delete_chunks", project_name, pdf_name, keep_ids, pages)
+        return len(stale)
+
+    #reads
+    def _in_scope(self, row: dict, project_name: Optional[str], pdf_names: Optional[List[str]])-> bool:
+        if pdf_names and row["pdf_name"] not in pdf_names:
+            return False
+        if project_name and row["project"] != project_name:
+            return False
+        return True
+
+    def _result(self, row: dict, score: float)-> dict:
+        return {"text": row["text"], "project": row["project"], "pdf_name": row["pdf_name"], "page_num": row["page_num"],
+                "pdf_path": row["pdf_path"], "chunk_id": row["chunk_id"], "score": score}
+
+    def _vectors(self)-> Tuple[np.ndarray, List[Tuple[str, str, str]]]:
+        """Normalized embedding matrix, rebuilt after writes. Caller holds the lock."""
+        if self._matrix is None:
+            keys= [key for key, row in self._chunks.items() if row["embedding"]]
+            if keys:
+                matrix= np.asarray([self._chunks[key]["embedding"] for key in keys], dtype= np.float32)
+                norms= np.linalg.norm(matrix, axis= 1, keepdims= True)
+                norms[norms == 0]= 1.0
+                self._matrix= matrix / norms
+            else:
+                self._matrix= np.zeros((0, 0), dtype= np.float32)
+            self._matrix_keys= keys
+        return self._matrix, self._matrix_keys
+
+    def similarity_search(self, embedding: List[float], k: int= 3, project_name: Optional[str]= None,
+                          pdf_names: Optional[List[str]]= None, index_name: str= "vector")-> List[dict]:
+        self._round_trip("similarity_search")
+        if not embedding:
+            return []
+        query= np.asarray(embedding, dtype= np.float32)
+        query/= np.linalg.norm(query) or 1.0
+        with self._lock:
+            matrix, keys= self._vectors()
+            if not len(keys):
+                return []
+            scores= matrix @ query
+            order= np.argsort(-scores)
+            results= []
+            for i in order:
+                row= self._chunks[keys[i]]
+                if self._in_scope(row, project_name, pdf_names):
+                    results.append(self._result(row, float(scores[i])))
+                    if len(results) >= k:
+                        break
+        return results
+
+    def fulltext_search(self, question: str, k: int= 3, project_name: Optional[str]= None,
+                        pdf_names: Optional[List[str]]= None)-> List[dict]:
+        self._round_trip("fulltext_search")
+        terms= set(_WORD.findall(question.lower()))
+        if not terms:
+            return []
+        with self._lock:
+            total= len(self._chunks)
+            if not total:
+                return []
+            avg_length= sum(row["length"] for row in self._chunks.values()) / total
+            idf= {t: math.log(1 + (total - self._doc_freq[t] + 0.5) / (self._doc_freq[t] + 0.5))
+                  for t in terms if self._doc_freq[t] > 0}
+            scored= []
+            for row in self._chunks.values():
+                if not self._in_scope(row, project_name, pdf_names):
+                    continue
+                score= 0.0
+                for term, weight in idf.items():
+                    tf= row["terms"].get(term)
+                    if tf:
+                        norm= BM25_K1 * (1 - BM25_B + BM25_B * row["length"] / avg_length)
+                        score+= weight * tf * (BM25_K1 + 1) / (tf + norm)
+                if score > 0:
+                    scored.append((score, row))
+            scored.sort(key= lambda item: -item[0])
+            return [self._result(row, score) for score, row in scored[:k]]
+
+    def iter_chunks(self, batch_size: Optional[int]= None):
+        with self._lock:
+            rows= [dict(row) for row in self._chunks.values() if row["embedding"]]
+        for row in rows:
+            row.pop("terms", None)
+            row.pop("length", None)
+            yield row
+
+    def stats(self)-> dict:
+        with self._lock:
+            return {"projects": len(self._projects), "pdfs": len(self._pdfs),
+                    "chunks": len(self._chunks), "calls": dict(self.calls)}
+
+    def close(self):
+        pass
+
+
+class InMemoryMongo:
+    """MongoMetadata replacement that keeps inserted metadata documents in a list."""
+
+    def __init__(self, latency: float= 0.0):
+        """
+        Arguments:
+            latency ---> float: Simulated round trip per insert, in seconds.
+        """
+        self.latency= latency
+        self.documents: List[dict]= []
+        self._lock= threading.Lock()
+
+    def store_metadata(self, metadata: dict):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.documents.append(dict(metadata))
+
+    def close(self):
+        pass
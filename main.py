@@ -1,17 +1,36 @@
 """
 main.py
 
-Fast API endpoints that includes simple query endpoint.
-Uses the RAGPipeline class for semantic querying.
+Fast API endpoints that includes simple query endpoint
+and a token-streaming (SSE) query endpoint.
+Uses the RAGPipeline class for semantic querying; both query endpoints
+run on the async (non-blocking) path so one slow LLM call does not hold a
+worker thread.
+The pipeline and the PDF uploader are built lazily (see services/lifecycle.py):
+the lifespan startup task builds them in the background and warms up the
+Ollama models; /health/live and /health/ready report liveness and readiness.
 """
 
+import json
+import time
+import asyncio
 import logging
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager, suppress
+from typing import AsyncIterator, List, Optional
+from fastapi import Depends, FastAPI, HTTPException, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from router.pdf_upload import router as pdf_router
+from router.pdf_upload import job_manager, pdf_uploader, router as pdf_router
 from router.pdf_render import router as pdf_render_router
 
-from services.querying import RAGPipeline
+from services.querying import RAGPipeline, semantic_cache
+from services.lifecycle import (
+    OLLAMA_KEEP_ALIVE, STARTUP_RETRY_INTERVAL, WARMUP_ON_STARTUP, WARMUP_TIMEOUT,
+    Lazy, readiness, warm_up_models,
+)
+from services.metrics import IN_FLIGHT, QUERY_SECONDS, REGISTRY
+from services.neo4j_drivers import neo4j_drivers
+from utils.embeddings import get_embedding_cache
 
 #logging configuration
 logging.basicConfig(
@@ -20,12 +39,86 @@ logging.basicConfig(
 )
 logger= logging.getLogger(__name__)
 
+#shared query pipeline, built on first use (or by the startup task)
+rag_pipeline= Lazy("rag_pipeline", RAGPipeline)
+
+def get_rag_pipeline()-> RAGPipeline:
+    """FastAPI dependency: the shared RAGPipeline (503 while the startup task is still building it)."""
+    try:
+        return rag_pipeline.get()
+    except Exception as e:
+        raise HTTPException(status_code= 503, detail= f"Query pipeline is unavailable: {e}")
+
+async def _start_component(name: str, start):
+    """Run `start()` in a worker thread until it succeeds, recording readiness."""
+    while True:
+        try:
+            result= await asyncio.to_thread(start)
+            readiness.mark(name, True)
+            return result
+        except Exception as e:
+            readiness.mark(name, False, str(e))
+            logger.warning(f"Startup of {name} failed, retrying in {STARTUP_RETRY_INTERVAL}s: {e}")
+            await asyncio.sleep(STARTUP_RETRY_INTERVAL)
+
+async def _warm_up(pipeline: RAGPipeline):
+    """Preload the Ollama models (and the prompt template) until it succeeds."""
+    if pipeline.prompt_cache:
+        await asyncio.to_thread(pipeline.prompt_cache.refresh)
+    while True:
+        try:
+            timings= await asyncio.wait_for(
+                warm_up_models(pipeline.llm.model, pipeline.embedding_model, OLLAMA_KEEP_ALIVE), WARMUP_TIMEOUT)
+            readiness.mark("models", True, f"loaded in {timings}")
+            return
+        except Exception as e:
+            readiness.mark("models", False, f"warm-up failed: {e!r}")
+            logger.warning(f"Model warm-up failed, retrying in {STARTUP_RETRY_INTERVAL}s: {e!r}")
+            await asyncio.sleep(STARTUP_RETRY_INTERVAL)
+
+async def _start_up():
+    """Build the shared clients and warm the models without blocking the server start."""
+    pipeline= await _start_component("rag_pipeline", rag_pipeline.build)
+    await _start_component("pdf_uploader", pdf_uploader.build)
+    #Neo4j may still be down: keep reconnecting the vector index while the models warm up
+    steps= [_start_component("neo4j", pipeline.connect_neo4j)]
+    if WARMUP_ON_STARTUP:
+        steps.append(_warm_up(pipeline))
+    await asyncio.gather(*steps)
+    logger.info("Startup complete; ready to serve traffic.")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    readiness.require("rag_pipeline", "pdf_uploader", "neo4j", *(("models",) if WARMUP_ON_STARTUP else ()))
+    #requests get a 503 until the startup task has built these, instead of building them inline
+    rag_pipeline.managed= True
+    pdf_uploader.managed= True
+    startup= asyncio.create_task(_start_up())
+    yield
+    startup.cancel()
+    with suppress(asyncio.CancelledError):
+        await startup
+    pipeline= rag_pipeline.reset()
+    if pipeline is not None:
+        await pipeline.aclose()
+    #background ingestion still uses the uploader's chunker pool and clients
+    await asyncio.to_thread(job_manager.shutdown)
+    uploader= pdf_uploader.reset()
+    if uploader is not None:
+        uploader.close()
+    await neo4j_drivers.aclose()
+
 #FastAPI
-app= FastAPI(title= "Generative AI RAG System")
+app= FastAPI(title= "Generative AI RAG System", lifespan= lifespan)
+
+#queries currently being answered (both endpoints)
+_QUERIES_IN_FLIGHT= IN_FLIGHT.labels(operation= "query")
 
 #request schema
 class QueryRequest(BaseModel):
     query: str= Field(..., example="what is transformers?")
+    project_name: Optional[str]= Field(None, example="default_project")
+    pdf_names: Optional[List[str]]= Field(None, example=["attention.pdf"])
 
 @app.get("/", tags= ["Health Check"])
 def home():
@@ -33,32 +126,101 @@ def home():
     logger.info("Home Endpoint is Called.")
     return {"message": "Generative AI Backend is Running"}
 
+@app.get("/health/live", tags= ["Health Check"])
+def liveness():
+    """Liveness probe: the process is up and serving requests (dependencies are not checked)."""
+    return {"status": "alive"}
+
+@app.get("/health/ready", tags= ["Health Check"])
+def readiness_probe():
+    """Readiness probe: 200 once the pipeline and uploader are built and the models are warm, else 503."""
+    state= readiness.snapshot()
+    return JSONResponse(state, status_code= 200 if state["ready"] else 503)
+
 app.include_router(pdf_router, prefix="/api")
 app.include_router(pdf_render_router)
 
-try:
-    rag_pipeline = RAGPipeline()
-    logger.info("RAGPipeline initialized successfully.")
-except Exception as e:
-    logger.exception("Failed to initialize RAGPipeline: %s", e)
-    raise
+@app.get("/stats/cache", tags= ["Health Check"])
+def cache_stats(pipeline: RAGPipeline= Depends(get_rag_pipeline)):
+    """Prompt template, semantic answer cache, embedding cache, local vector index and context packing statistics."""
+    embedding_cache= get_embedding_cache()
+    return {
+        "prompt_template": pipeline.prompt_cache.stats() if pipeline.prompt_cache else None,
+        "semantic_cache": semantic_cache.stats(),
+        "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+        "local_vector_index": pipeline.local_index.stats() if pipeline.local_index else None,
+        "context_packing": pipeline.context_packer.stats() if pipeline.context_packer else None,
+    }
+
+@app.get("/stats/neo4j", tags= ["Health Check"])
+def neo4j_stats():
+    """Shared Neo4j driver pool settings and connection usage (in use, idle, pending) per driver."""
+    return neo4j_drivers.stats()
+
+@app.get("/metrics", tags= ["Health Check"])
+def metrics():
+    """Prometheus metrics: per-stage latency histograms, throughput counters and in-flight gauges."""
+    return Response(content= REGISTRY.render(), media_type= "text/plain; version=0.0.4; charset=utf-8")
 
 @app.post("/query", tags= ['Querying'])
-def query_endpoint(request: QueryRequest):
+async def query_endpoint(request: QueryRequest, pipeline: RAGPipeline= Depends(get_rag_pipeline)):
     question= request.query.strip()
     if not question:
         logger.warning("Empty Query Received.")
         raise HTTPException(status_code=400, detail= "Query Text is required")
+    start= time.perf_counter()
+    outcome= "error"
     try:
         logger.info(f"Received Query: {question}")
-        result= rag_pipeline.query(question)
+        with _QUERIES_IN_FLIGHT.track():
+            result= await pipeline.aquery(question, project_name= request.project_name,
+                                          pdf_names= request.pdf_names)
         answer= result.get("answer")
         chunks= result.get("chunks", [])
+        outcome= "cached" if result.get("cached") else ("answered" if chunks else "no_context")
         logger.info("Query Processed Successfully.")
         return {
             "answer": answer,
-            "chunks": chunks
+            "chunks": chunks,
+            "cached": result.get("cached", False)
             }
     except Exception as e:
         logger.exception("Error while processing Query: %s", e)
-        raise HTTPException(status_code= 500, detail="Internal Server Error")
\ No newline at end of file
+        raise HTTPException(status_code= 500, detail="Internal Server Error")
+    finally:
+        QUERY_SECONDS.labels(endpoint= "query", outcome= outcome).observe(time.perf_counter() - start)
+
+async def _sse(events: AsyncIterator[dict])-> AsyncIterator[str]:
+    """Format pipeline events as Server-Sent Events (and record the stream's end-to-end latency)."""
+    start= time.perf_counter()
+    outcome= "disconnected"
+    try:
+        with _QUERIES_IN_FLIGHT.track():
+            async for event in events:
+                if event["event"] == "chunks":
+                    outcome= "cached" if event["data"].get("cached") else (
+                        "answered" if event["data"].get("chunks") else "no_context")
+                elif event["event"] == "error":
+                    outcome= "error"
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+    finally:
+        QUERY_SECONDS.labels(endpoint= "stream", outcome= outcome).observe(time.perf_counter() - start)
+
+@app.post("/query/stream", tags= ['Querying'])
+async def query_stream_endpoint(request: QueryRequest, pipeline: RAGPipeline= Depends(get_rag_pipeline)):
+    """
+    Streaming query endpoint (Server-Sent Events).
+    Sends the retrieved chunks first (`chunks` event), then the answer as
+    `token` events while the LLM generates it, and finally a `done` event.
+    """
+    question= request.query.strip()
+    if not question:
+        logger.warning("Empty Query Received.")
+        raise HTTPException(status_code=400, detail= "Query Text is required")
+    logger.info(f"Received Streaming Query: {question}")
+    return StreamingResponse(
+        _sse(pipeline.astream_query(question, project_name= request.project_name,
+                                    pdf_names= request.pdf_names)),
+        media_type= "text/event-stream",
+        headers= {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,40 +1,196 @@
 """
 router/pdf_render.py
-API endpoint to render highlighted PDF pages as images.
+API endpoints to render highlighted PDF pages as images.
+Rendered images are cached (see services/render_cache.py) and served with
+an ETag, so repeat requests cost a cache lookup or a 304.
+The batch endpoint renders every page of an answer's chunks in one request.
 """
 
-from fastapi import APIRouter, Response
-from pydantic import BaseModel
-from services.pdf_utils import highlight_text_on_page
-import tempfile
+from fastapi import APIRouter, Request, Response
+from pydantic import BaseModel, Field
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Literal, Optional, Tuple
+from services.metrics import HIGHLIGHT_PAGES, HIGHLIGHT_SECONDS, IN_FLIGHT
+from services.pdf_utils import document_pool, render_page_highlight
+from services.render_cache import RENDER_CACHE_MAX_AGE, file_content_hash, render_cache, render_key
 import os
+import base64
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/pdf", tags=["PDF"])
 
+MEDIA_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
 
-class HighlightRequest(BaseModel):
+#worker pool for rendering distinct pages of a batch in parallel
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "4"))
+_render_pool = ThreadPoolExecutor(max_workers=max(1, RENDER_WORKERS), thread_name_prefix="render")
+
+#highlight metrics (served by /metrics)
+_RENDER_SECONDS = HIGHLIGHT_SECONDS.labels(stage="render")
+_SINGLE_SECONDS = HIGHLIGHT_SECONDS.labels(stage="single")
+_BATCH_SECONDS = HIGHLIGHT_SECONDS.labels(stage="batch")
+_PAGES_CACHED = HIGHLIGHT_PAGES.labels(cache="hit")
+_PAGES_RENDERED = HIGHLIGHT_PAGES.labels(cache="miss")
+_PAGES_NOT_MODIFIED = HIGHLIGHT_PAGES.labels(cache="not_modified")
+_RENDERS_IN_FLIGHT = IN_FLIGHT.labels(operation="highlight_render")
+
+
+class RenderOptions(BaseModel):
+    dpi: int = Field(150, ge=36, le=300)
+    format: Literal["png", "jpeg", "webp"] = "png"
+    quality: int = Field(80, ge=1, le=100, description="JPEG/WebP quality")
+    max_width: Optional[int] = Field(None, ge=64, le=4096, description="Downscale to at most this width (px)")
+    crop: bool = Field(False, description="Crop to the highlighted hits plus margin")
+    margin: float = Field(24, ge=0, le=500, description="Crop margin in PDF points")
+
+    def cache_options(self) -> dict:
+        """Options that shape the image (part of the cache key); irrelevant ones are left out."""
+        options = {"dpi": self.dpi, "format": self.format, "max_width": self.max_width, "crop": self.crop}
+        if self.format != "png":
+            options["quality"] = self.quality
+        if self.crop:
+            options["margin"] = self.margin
+        return options
+
+    def render_kwargs(self) -> dict:
+        return {"dpi": self.dpi, "fmt": self.format, "quality": self.quality,
+                "max_width": self.max_width, "crop": self.crop, "margin": self.margin}
+
+
+class HighlightRequest(RenderOptions):
     pdf_path: str
     page_num: int
     snippet: str
+    chunk_id: Optional[str] = Field(None, description="Highlight this chunk's stored word boxes")
+
+
+class BatchHighlightRequest(BaseModel):
+    items: List[HighlightRequest]
+
+
+def _cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": f"private, max-age={RENDER_CACHE_MAX_AGE}"}
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _page_key(pdf_path: str, page_num: int, targets: List[Tuple[str, Optional[str]]],
+              options: RenderOptions) -> str:
+    #a single (snippet, chunk_id) keys the same way as /pdf/highlight, so both share cache entries
+    target_key = list(targets[0]) if len(targets) == 1 else sorted(set(targets), key=str)
+    return render_key(file_content_hash(pdf_path), page_num, target_key, options.cache_options())
+
+
+def _render_cached(pdf_path: str, page_num: int, targets: List[Tuple[str, Optional[str]]],
+                   options: RenderOptions, key: str) -> Tuple[bytes, str]:
+    """Rendered page from the cache, rasterizing (all snippets at once) on a miss."""
+    cached = render_cache.get(key)
+    if cached is not None:
+        _PAGES_CACHED.inc()
+        return cached
+    snippets = [snippet for snippet, _ in targets]
+    chunk_ids = [chunk_id for _, chunk_id in targets]
+    with _RENDERS_IN_FLIGHT.track(), _RENDER_SECONDS.time():
+        img_bytes = render_page_highlight(pdf_path, page_num, snippets, chunk_ids=chunk_ids,
+                                          **options.render_kwargs())
+    _PAGES_RENDERED.inc()
+    media_type = MEDIA_TYPES[options.format]
+    render_cache.put(key, img_bytes, media_type)
+    return img_bytes, media_type
 
 
 @router.post("/highlight")
-def render_highlight(req: HighlightRequest):
+def render_highlight(req: HighlightRequest, request: Request):
     """
-    Given a PDF path, page number, and text snippet,
-    highlights that snippet on the page and returns the rendered image (PNG).
+    Given a PDF path, page number, and text snippet (and optionally its chunk_id),
+    highlights it on the page and returns the rendered image.
+    Render options (dpi, format, quality, max_width, crop, margin) default to a full-page 150 DPI PNG.
+    Supports conditional requests through If-None-Match.
     """
     logger.info(f"Rendering highlight for {req.pdf_path}, page {req.page_num}")
+    with _SINGLE_SECONDS.time():
+        return _render_single(req, request)
+
 
+def _render_single(req: HighlightRequest, request: Request) -> Response:
     try:
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-        highlight_text_on_page(req.pdf_path, req.page_num, req.snippet, tmp.name)
-        with open(tmp.name, "rb") as f:
-            img_bytes = f.read()
-        os.remove(tmp.name)
-        return Response(content=img_bytes, media_type="image/png")
+        targets = [(req.snippet, req.chunk_id)]
+        key = _page_key(req.pdf_path, req.page_num, targets, req)
+        etag = f'"{key}"'
+        headers = _cache_headers(etag)
+        if _etag_matches(request, etag):
+            _PAGES_NOT_MODIFIED.inc()
+            return Response(status_code=304, headers=headers)
+
+        img_bytes, media_type = _render_cached(req.pdf_path, req.page_num, targets, req, key)
+        return Response(content=img_bytes, media_type=media_type, headers=headers)
+    except ValueError as e:
+        logger.error(f"Invalid highlight render request: {e}")
+        return Response(content=str(e), media_type="text/plain", status_code=400)
     except Exception as e:
         logger.error(f"Error rendering highlight: {e}")
         return Response(content=str(e), media_type="text/plain", status_code=500)
+
+
+@router.post("/highlight/batch")
+def render_highlight_batch(req: BatchHighlightRequest):
+    """
+    Render highlights for many chunks in one request.
+    Snippets on the same page (with the same render options) are drawn in a
+    single rasterization, and distinct pages are rendered in parallel on the
+    render worker pool.
+
+    Returns:
+        {"pages": [{"pdf_path", "page_num", "items": [indices into req.items],
+                    "media_type", "etag", "image": base64} | {..., "error": str}]}
+    """
+    with _BATCH_SECONDS.time():
+        return _render_batch(req)
+
+
+def _render_batch(req: BatchHighlightRequest) -> dict:
+    groups = OrderedDict()
+    for index, item in enumerate(req.items):
+        options_key = tuple(sorted(item.cache_options().items()))
+        groups.setdefault((item.pdf_path, item.page_num, options_key), []).append(index)
+    logger.info(f"Rendering {len(req.items)} highlights on {len(groups)} pages")
+
+    def render_group(indices: List[int]):
+        first = req.items[indices[0]]
+        targets = [(req.items[i].snippet, req.items[i].chunk_id) for i in indices]
+        key = _page_key(first.pdf_path, first.page_num, targets, first)
+        img_bytes, media_type = _render_cached(first.pdf_path, first.page_num, targets, first, key)
+        return img_bytes, media_type, f'"{key}"'
+
+    futures = {group: _render_pool.submit(render_group, indices) for group, indices in groups.items()}
+
+    pages = []
+    for group, indices in groups.items():
+        pdf_path, page_num, _ = group
+        entry = {"pdf_path": pdf_path, "page_num": page_num, "items": indices}
+        try:
+            img_bytes, media_type, etag = futures[group].result()
+            entry.update({
+                "media_type": media_type,
+                "etag": etag,
+                "image": base64.b64encode(img_bytes).decode("ascii"),
+            })
+        except Exception as e:
+            logger.error(f"Error rendering highlight for {pdf_path}, page {page_num}: {e}")
+            entry["error"] = str(e)
+        pages.append(entry)
+    return {"pages": pages}
+
+
+@router.get("/cache/stats")
+def render_cache_stats():
+    """Render cache and open-document pool statistics."""
+    return {**render_cache.stats(), "document_pool": document_pool.stats()}
@@ -3,22 +3,32 @@ router/pdf_upload.py
 
 Handles PDF upload, chunking, embedding, and storage in Neo4j + MongoDB.
 Implements an OOP-based class (PDFUploader) with FastAPI route defined here itself.
+Uploads are processed as background ingestion jobs (see services/jobs.py).
 """
 
 import os
-import fitz
+import time
+import hashlib
 import tempfile
 import logging
 import pytz
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional
 
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
 
-from services.chunking import DocumentChunker
+from services.chunking import ChunkedPDF, DocumentChunker
+from services.jobs import IngestionJob, JobManager
+from services.lifecycle import Lazy
+from services.metrics import IN_FLIGHT, INGEST_CHUNKS, INGEST_PDF_SECONDS, INGEST_PDFS, INGEST_STAGE_SECONDS
+from services.pipeline import batched, pipelined
+from services.querying import semantic_cache
 from utils.embeddings import OllamaEmbedder
+from services.pdf_analysis import sidecar_path
 from services.storage import Neo4jStorage, MongoMetadata
+from services.vector_index import get_local_index
 
 
 # Logging Configuration
@@ -32,150 +42,425 @@ IST = pytz.timezone("Asia/Kolkata")
 UPLOAD_DIR= Path("uploaded_pdfs")
 UPLOAD_DIR.mkdir(exist_ok=True)
 
+#read size used when streaming uploads to disk
+UPLOAD_CHUNK_SIZE= int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+#capacity (in embedding batches) of the queues between ingest stages
+PIPELINE_QUEUE_SIZE= int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+
+#ingest metrics (served by /metrics)
+_EMBED_BATCH_SECONDS= INGEST_STAGE_SECONDS.labels(stage= "embedding_batch")
+_NEO4J_WRITE_SECONDS= INGEST_STAGE_SECONDS.labels(stage= "neo4j_write")
+_MONGO_WRITE_SECONDS= INGEST_STAGE_SECONDS.labels(stage= "mongo_write")
+_CHUNKS_EMBEDDED= INGEST_CHUNKS.labels(result= "embedded")
+_CHUNKS_EMBED_FAILED= INGEST_CHUNKS.labels(result= "embed_failed")
+_CHUNKS_WRITTEN= INGEST_CHUNKS.labels(result= "written")
+_CHUNKS_WRITE_FAILED= INGEST_CHUNKS.labels(result= "write_failed")
+_PDFS_INGESTING= IN_FLIGHT.labels(operation= "ingest_pdf")
+_PDFS_DONE= INGEST_PDFS.labels(outcome= "done")
+_PDFS_FAILED= INGEST_PDFS.labels(outcome= "failed")
+_PDFS_SKIPPED= INGEST_PDFS.labels(outcome= "skipped")
+
 # PDFUploader Class
 class PDFUploader:
     """
     A class that encapsulates the end-to-end PDF upload and processing flow:
     1. Save uploaded PDFs permanently.
-    2. Extract text chunks using DocumentChunker.
+    2. Extract text chunks using DocumentChunker (one pass per PDF, which also
+       writes the page text / word-box sidecar used for highlighting).
     3. Generate embeddings using OllamaEmbedder.
     4. Store metadata + graph structure in Neo4j & MongoDB.
+    Steps 2-4 run as a streaming pipeline connected by bounded queues.
     """
 
     def __init__(self, timezone: str = "Asia/Kolkata"):
         """Initialize core services and timezone."""
         self.chunker = DocumentChunker()
         self.embedder = OllamaEmbedder()
-        self.storage = Neo4jStorage()
+        self.local_index = get_local_index()
+        self.storage = Neo4jStorage(mirror= self.local_index)
         self.mongo= MongoMetadata()
         self.ist = pytz.timezone(timezone)
         logger.info("PDFUploader initialized with timezone: %s", timezone)
 
     # Helper Methods
-    def _save_pdf_permanent(self, file: UploadFile, project_name: str) -> str:
-        """Save uploaded PDF to a permanet filefolder and return its path."""
+    def _save_pdf_permanent(self, file: UploadFile, project_name: str, seen_hashes: Optional[Dict[str, str]]= None) -> Dict:
+        """
+        Stream an uploaded PDF to a permanet filefolder in fixed-size chunks,
+        computing its SHA-256 on the fly.
+
+        If a completely ingested PDF with the same content hash already exists
+        in the project (or earlier in the same upload batch), the new copy is discarded and the
+        upload is marked as a duplicate so it skips chunking, embedding and
+        graph writes.
+
+        Returns:
+            Dict: {"filename", "path", "content_hash", "duplicate_of"}
+        """
+        tmp_path= None
         try:
             project_dir= UPLOAD_DIR/project_name
             project_dir.mkdir(exist_ok= True)
-
             pdf_path= project_dir/file.filename
-            with open(pdf_path, "wb") as f:
-                f.write(file.file.read())
-            logger.info(f"Saved uploaded PDF Permanently at: {pdf_path}")
-            return str(pdf_path)
+
+            sha256= hashlib.sha256()
+            with tempfile.NamedTemporaryFile(dir= project_dir, suffix= ".part", delete= False) as f:
+                tmp_path= f.name
+                while True:
+                    block= file.file.read(UPLOAD_CHUNK_SIZE)
+                    if not block:
+                        break
+                    sha256.update(block)
+                    f.write(block)
+            content_hash= sha256.hexdigest()
+
+            duplicate_of= (seen_hashes or {}).get(content_hash) or self.storage.find_pdf_by_hash(project_name, content_hash)
+            if duplicate_of:
+                os.remove(tmp_path)
+                logger.info(f"Skipping '{file.filename}': identical content already stored as '{duplicate_of}'.")
+                return {"filename": file.filename, "path": str(project_dir/duplicate_of),
+                        "content_hash": content_hash, "duplicate_of": duplicate_of}
+
+            os.replace(tmp_path, pdf_path)
+            logger.info(f"Saved uploaded PDF Permanently at: {pdf_path} (sha256= {content_hash[:12]})")
+            return {"filename": file.filename, "path": str(pdf_path),
+                    "content_hash": content_hash, "duplicate_of": None}
         except Exception as e:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
             logger.error("Failed to save Permanent PDF: %s", e)
             raise
 
-    def _get_pdf_page_count(self, pdf_path: str) -> int:
-        """Return the number of pages in the given PDF."""
+    def _save_analysis(self, pdf: ChunkedPDF):
+        """Persist the page text / chunk offset / word-box sidecar next to the PDF."""
         try:
-            doc = fitz.open(pdf_path)
-            pages = len(doc)
-            logger.info("PDF '%s' has %d pages", pdf_path, pages)
-            return pages
+            pdf.analysis.save(sidecar_path(pdf.pdf_path))
         except Exception as e:
-            logger.error("Error reading PDF '%s': %s", pdf_path, e)
-            raise
+            logger.error("PDF analysis save failed for %s: %s", pdf.pdf_path, e)
 
-    def _chunk_and_embed(self, pdf_path: str, pdf_name: str) -> List[Dict]:
-        """Chunk PDF text and generate embeddings for each chunk."""
+    def _embed_batch(self, batch: List[Dict])-> List[Dict]:
+        """Embed one batch of chunk dictionaries in place (failed chunks get an empty vector)."""
         try:
-            chunks = self.chunker.chunk_pdf(pdf_path)
-            if not chunks:
-                raise ValueError("No text chunks extracted from PDF.")
-            logger.info("Extracted %d chunks from %s", len(chunks), pdf_name)
+            with _EMBED_BATCH_SECONDS.time():
+                embeddings= self.embedder.embed_documents([c["text"] for c in batch])
+        except Exception as e:
+            logger.warning("Batch embedding failed for %d chunks: %s", len(batch), e)
+            embeddings= [[] for _ in batch]
+        for c, embedding in zip(batch, embeddings):
+            c["embedding"]= embedding
+        embedded= sum(1 for c in batch if c["embedding"])
+        _CHUNKS_EMBEDDED.inc(embedded)
+        _CHUNKS_EMBED_FAILED.inc(len(batch) - embedded)
+        return batch
+
+    def _ingest_pdf(self, project_name: str, pdf_path: str, pdf_name: str,
+                    previous_hashes: Optional[Dict[int, str]]= None,
+                    job: Optional[IngestionJob]= None,
+                    source: Optional[ChunkedPDF]= None) -> Dict:
+        """
+        Stream one PDF through chunking -> embedding -> Neo4j writes.
+
+        Chunks are yielded by the chunker page by page, embedded in batches on
+        `max_in_flight` threads and written to Neo4j as soon as a write batch is
+        full; stages are connected by bounded queues, so memory stays flat for
+        large PDFs and early chunks are searchable before the file finishes.
+        The PDF node must already exist (see Neo4jStorage.store_pdfs).
+
+        Pages whose text hash matches `previous_hashes` (the last ingested
+        revision) are left out, so only changed pages are re-embedded.
+        `source` is an already opened pass over the PDF (DocumentChunker.open);
+        without it the PDF is opened here.
 
+        Returns:
+            Dict: {"page_hashes": {page_num: hash}, "written_ids": chunk ids written,
+                   "chunks_written", "chunks_failed", "failed_pages", "unchanged_pages", "write_seconds"}
+        """
+        previous_hashes= previous_hashes or {}
+        page_hashes: Dict[int, str]= {}
+        unchanged= set()
+
+        def changed_chunks():
+            chunks= source.chunks() if source is not None else self.chunker.chunk_pdf(pdf_path)
             for c in chunks:
-                try:
-                    c["embedding"]= self.embedder.embed_query(c["text"])
-                    c["pdf_name"]= pdf_name
-                    c["pdf_path"]= pdf_path 
-                except Exception as e:
-                    logger.warning("Embedding failed for chunk in %s: %s", pdf_name, e)
-                    c["embedding"] = []
-            return chunks
+                page_hashes[c["page_num"]]= c["page_hash"]
+                if previous_hashes.get(c["page_num"]) == c["page_hash"]:
+                    unchanged.add(c["page_num"])
+                    continue
+                c["project"]= project_name
+                c["pdf_name"]= pdf_name
+                c["pdf_path"]= pdf_path
+                yield c
+
+        written_ids= []
+        failed_pages= set()
+        written= failed= 0
+        write_seconds= 0.0
+        buffer= []
+
+        def flush():
+            nonlocal written, failed, write_seconds, buffer
+            with _NEO4J_WRITE_SECONDS.time() as timer:
+                ok, bad= self.storage.store_chunks(buffer)
+            write_seconds+= timer.elapsed
+            written+= ok
+            failed+= bad
+            _CHUNKS_WRITTEN.inc(ok)
+            _CHUNKS_WRITE_FAILED.inc(bad)
+            if job:
+                job.add_processed(pdf_name, len(buffer))
+            buffer= []
+
+        try:
+            embedded= pipelined(
+                batched(changed_chunks(), self.embedder.batch_size),
+                self._embed_batch,
+                workers= self.embedder.max_in_flight,
+                queue_size= PIPELINE_QUEUE_SIZE,
+            )
+            for batch in embedded:
+                _report(job, pdf_name, stage= "embedding")
+                for c in batch:
+                    written_ids.append(c["chunk_id"])
+                    if not c["embedding"]:
+                        failed_pages.add(c["page_num"])
+                buffer.extend(batch)
+                if len(buffer) >= self.storage.write_batch_size:
+                    flush()
+            if buffer:
+                flush()
         except Exception as e:
             logger.error("Chunking/embedding failed for %s: %s", pdf_name, e)
             raise
 
-    def _store_metadata(self, project_name: str, pdf_name: str, pages: int):
+        if not page_hashes:
+            raise ValueError("No text chunks extracted from PDF.")
+        if unchanged:
+            logger.info("%d of %d pages unchanged in %s; re-embedded %d chunks",
+                        len(unchanged), len(page_hashes), pdf_name, len(written_ids))
+        if failed_pages:
+            logger.warning("Embedding failed on %d pages of %s", len(failed_pages), pdf_name)
+            #forget the hash of these pages so the next upload re-embeds them
+            for page in failed_pages:
+                page_hashes[page]= ""
+
+        return {
+            "page_hashes": page_hashes,
+            "written_ids": written_ids,
+            "chunks_written": written,
+            "chunks_failed": failed,
+            "failed_pages": sorted(failed_pages),
+            "unchanged_pages": len(unchanged),
+            "write_seconds": write_seconds,
+        }
+
+    def _finalize_revision(self, project_name: str, pdf_name: str, pages: int, previous_hashes: Dict[int, str],
+                           page_hashes: Dict[int, str], written_ids: List[str]):
+        """
+        Remove chunks left over from the previous revision of a PDF and
+        record the page hashes of the revision that was just written.
+        """
+        if previous_hashes:
+            #pages that changed or disappeared; unchanged pages keep their chunks
+            stale_pages= sorted(p for p, h in previous_hashes.items() if page_hashes.get(p) != h)
+            self.storage.delete_stale_chunks(project_name, pdf_name, written_ids, pages= stale_pages)
+        else:
+            #unknown previous revision: everything written now is the full set
+            self.storage.delete_stale_chunks(project_name, pdf_name, written_ids)
+        self.storage.set_page_hashes(project_name, pdf_name, [page_hashes.get(p, "") for p in range(1, pages + 1)])
+
+    def _store_metadata(self, project_name: str, pdf_name: str, pages: int, content_hash: Optional[str]= None):
         """Store PDF metadata into MongoDB via storage helper."""
         try:
             metadata = {
                 "project": project_name,
                 "pdf_name": pdf_name,
                 "num_pages": pages,
+                "content_hash": content_hash,
                 "upload_time": datetime.now(self.ist).isoformat(),
             }
-            self.mongo.store_metadata(metadata)
+            with _MONGO_WRITE_SECONDS.time():
+                self.mongo.store_metadata(metadata)
             logger.info("Stored metadata for %s", pdf_name)
         except Exception as e:
             logger.error("MongoDB metadata insertion failed: %s", e)
             raise
 
     # Main Processing Logic
-    def process_pdfs(self, files: List[UploadFile], project_name: str = "default_project") -> dict:
+    def save_uploads(self, files: List[UploadFile], project_name: str)-> List[Dict]:
         """
-        Orchestrate the full PDF upload + processing flow.
+        Persist uploaded files to disk so they can be processed after the request ends.
 
-        Args:
-            files (List[UploadFile]): Uploaded PDF files.
-            project_name (str): Name of the project.
+        Returns:
+            List[Dict]: One entry per file from _save_pdf_permanent.
+        """
+        saved= []
+        seen_hashes= {}
+        for f in files:
+            entry= self._save_pdf_permanent(f, project_name, seen_hashes)
+            seen_hashes.setdefault(entry["content_hash"], entry["duplicate_of"] or entry["filename"])
+            saved.append(entry)
+        return saved
+
+    def process_saved_pdfs(self, saved: List[Dict], project_name: str= "default_project",
+                           job: Optional[IngestionJob]= None)-> dict:
+        """
+        Chunk, embed and store PDFs that are already saved on disk.
+        Uploads marked as duplicates are skipped entirely.
+
+        Arguments:
+            saved ---> List[Dict]: Entries returned by save_uploads.
+            project_name ---> str: Name of the project.
+            job ---> IngestionJob: Optional job that receives per-file progress.
 
         Returns:
             dict: Summary of processing result.
         """
         uploaded_files = []
-        all_chunks = []
-        pdf_metadata = []
+        skipped_files = []
+        total_chunks = 0
+        chunks_written = 0
+        write_seconds = 0.0
 
-        for f in files:
-            logger.info("Processing PDF: %s", f.filename)
-            perm_path = self._save_pdf_permanent(f, project_name)
+        #start extracting every new file on the chunker's process pool up front
+        self.chunker.prefetch([e["path"] for e in saved if not e.get("duplicate_of")], analyze= True)
+        #indexes and migrations on the first upload only (no-op afterwards, retried if Neo4j was down)
+        self.storage.ensure_index()
+
+        for entry in saved:
+            filename, perm_path = entry["filename"], entry["path"]
+            if entry.get("duplicate_of"):
+                skipped_files.append(filename)
+                _report(job, filename, stage= "skipped", error= f"duplicate of {entry['duplicate_of']}")
+                _PDFS_SKIPPED.inc()
+                continue
+            logger.info("Processing PDF: %s", filename)
 
+            _PDFS_INGESTING.inc()
+            started = time.perf_counter()
             try:
-                pages = self._get_pdf_page_count(perm_path)
-                chunks = self._chunk_and_embed(perm_path, f.filename)
+                _report(job, filename, stage= "extracting")
+                #single pass: page count, chunks, page text and word boxes from one open
+                with self.chunker.open(perm_path) as pdf:
+                    pages = pdf.page_count
+                    _report(job, filename, pages= pages)
+                    previous_hashes = self.storage.get_page_hashes(project_name, filename)
 
-                uploaded_files.append(f.filename)
-                pdf_metadata.append({
-                    "pdf_name": f.filename,
-                    "pages": pages,
-                    "uploaded_at": datetime.now(self.ist).isoformat(),
-                })
-                all_chunks.extend(chunks)
+                    #PDF node first, so chunk batches can be attached as they are written;
+                    #its content hash is cleared until this revision is stored completely
+                    self.storage.store_pdfs(project_name, [{
+                        "pdf_name": filename,
+                        "pages": pages,
+                        "content_hash": None,
+                    }])
+                    result = self._ingest_pdf(project_name, perm_path, filename, previous_hashes, job, pdf)
+                self._save_analysis(pdf)
 
-                self._store_metadata(project_name, f.filename, pages)
+                _report(job, filename, stage= "storing", chunks_total= len(result["written_ids"]),
+                        unchanged_pages= result["unchanged_pages"])
+                if result["chunks_failed"]:
+                    logger.warning("Some chunks of %s failed to store; page hashes and content hash not "
+                                   "updated so the next upload of the same file retries them.", filename)
+                else:
+                    self._finalize_revision(project_name, filename, pages, previous_hashes,
+                                            result["page_hashes"], result["written_ids"])
+                    if not result["failed_pages"]:
+                        #only a complete revision makes re-uploads of these bytes duplicates
+                        self.storage.set_content_hash(project_name, filename, entry.get("content_hash"))
+
+                self._store_metadata(project_name, filename, pages, entry.get("content_hash"))
+                #persist the local index mirror of the chunks just written
+                if self.local_index is not None:
+                    try:
+                        self.local_index.save()
+                    except Exception as e:
+                        logger.error("Local vector index save failed: %s", e)
+                #cached answers of this project may now be outdated
+                semantic_cache.invalidate(project_name)
+
+                uploaded_files.append(filename)
+                total_chunks += len(result["written_ids"])
+                chunks_written += result["chunks_written"]
+                write_seconds += result["write_seconds"]
+                _report(job, filename, stage= "done")
+                _PDFS_DONE.inc()
 
             except Exception as e:
-                logger.error(f"Failed to process PDF {f.filename}: {e}")
+                logger.error(f"Failed to process PDF {filename}: {e}")
+                _report(job, filename, stage= "failed", error= str(e))
+                _PDFS_FAILED.inc()
+            finally:
+                _PDFS_INGESTING.dec()
+                INGEST_PDF_SECONDS.observe(time.perf_counter() - started)
 
-        try:
-            self.storage.ensure_index()
-            self.storage.store_project(project_name, pdf_metadata, all_chunks)
-            logger.info("Stored project '%s' successfully in Neo4j.", project_name)
-        except Exception as e:
-            logger.error("Neo4j storage failed for project '%s': %s", project_name, e)
-            raise
+        if not uploaded_files:
+            return {
+                "project": project_name,
+                "uploaded_files": uploaded_files,
+                "skipped_files": skipped_files,
+                "total_chunks": 0,
+                "status": "Nothing new to process.",
+            }
 
+        logger.info("Stored project '%s' successfully in Neo4j.", project_name)
         return {
             "project": project_name,
             "uploaded_files": uploaded_files,
-            "total_chunks": len(all_chunks),
+            "skipped_files": skipped_files,
+            "total_chunks": total_chunks,
+            "neo4j_chunks_per_second": round(chunks_written / write_seconds, 1) if write_seconds > 0 else 0.0,
             "status": "Successfully processed and stored in Neo4j + MongoDB.",
         }
 
+    def close(self):
+        """Shut down the chunker pool and close the Neo4j and MongoDB connections."""
+        self.chunker.close()
+        self.storage.close()
+        self.mongo.close()
+
+    def process_pdfs(self, files: List[UploadFile], project_name: str = "default_project") -> dict:
+        """
+        Orchestrate the full PDF upload + processing flow synchronously.
+
+        Args:
+            files (List[UploadFile]): Uploaded PDF files.
+            project_name (str): Name of the project.
+
+        Returns:
+            dict: Summary of processing result.
+        """
+        return self.process_saved_pdfs(self.save_uploads(files, project_name), project_name)
+
+
+def _report(job: Optional[IngestionJob], filename: str, **fields):
+    """Forward per-file progress to the ingestion job, if there is one."""
+    if job:
+        job.update_file(filename, **fields)
+
+
 # FastAPI Endpoint
-pdf_uploader = PDFUploader()
+#built on first use (or by the app's startup task), not at import time
+pdf_uploader = Lazy("pdf_uploader", PDFUploader)
+job_manager = JobManager()
+
 
-@router.post("/upload", tags= ["PDF Uploader"])
+def get_pdf_uploader() -> PDFUploader:
+    """FastAPI dependency: the shared PDFUploader (503 while the startup task is still building it)."""
+    try:
+        return pdf_uploader.get()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"PDF ingestion is unavailable: {e}")
+
+
+@router.post("/upload", tags= ["PDF Uploader"], status_code= 202)
 async def upload_pdfs(
     files: List[UploadFile] = File(..., description="Upload up to 5 PDF files"),
-    project_name: str = Form("default_project")
+    project_name: str = Form("default_project"),
+    uploader: PDFUploader = Depends(get_pdf_uploader)
 ):
     """
-    FastAPI endpoint to handle PDF uploads and trigger processing.
+    FastAPI endpoint to handle PDF uploads.
+    Files are saved to disk and an ingestion job is queued on the worker pool;
+    the job id is returned immediately. Poll `GET /api/jobs/{job_id}` for progress.
     """
     try:
         if not files:
@@ -183,12 +468,33 @@ async def upload_pdfs(
         if len(files) > 5:
             raise HTTPException(status_code=400, detail="Limit: 5 PDFs only.")
 
-        result = pdf_uploader.process_pdfs(files, project_name)
-        return result
+        saved = await run_in_threadpool(uploader.save_uploads, files, project_name)
+        job = job_manager.submit(
+            project_name,
+            [entry["filename"] for entry in saved],
+            lambda j: uploader.process_saved_pdfs(saved, project_name, job= j)
+        )
+        return {
+            "job_id": job.id,
+            "project": project_name,
+            "status": job.status,
+            "status_url": f"/api/jobs/{job.id}",
+        }
 
     except HTTPException as e:
         logger.error("HTTP error during upload: %s", e.detail)
         raise
     except Exception as e:
         logger.exception("Unexpected error during PDF upload: %s", e)
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/jobs/{job_id}", tags= ["PDF Uploader"])
+def get_job(job_id: str):
+    """
+    Report the status of an ingestion job: per-file stage, chunks processed and throughput.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job id: {job_id}")
+    return job.to_dict()
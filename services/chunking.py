@@ -2,80 +2,378 @@
 services/chunking.py
 
 DocumentChunker: PDF reading and text chunkking and logging support.
+Optionally spreads page ranges (and whole files) across a process pool,
+since PyMuPDF extraction and text splitting are CPU-bound.
+DocumentChunker.open() reads a PDF in a single pass that also records the
+page text, chunk offsets and word boxes (see services/pdf_analysis.py).
 """
 
+import os
+import time
 import fitz
+import hashlib
 import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from typing import List, Dict
+from typing import Iterator, List, Dict, Optional, Tuple
+from services.pdf_analysis import PDFAnalysis, chunk_spans, extract_page, file_stamp, page_record
+from services.metrics import INGEST_STAGE_SECONDS
 
 
 #configure Logging
 logger= logging.getLogger(__name__)
 
+#parallel extraction tuning (overridable from .env)
+CHUNKER_WORKERS= int(os.getenv("CHUNKER_WORKERS", "1"))
+CHUNKER_PAGES_PER_TASK= int(os.getenv("CHUNKER_PAGES_PER_TASK", "16"))
+#page-range tasks of one PDF submitted but not yet consumed (0 = twice the worker count)
+CHUNKER_MAX_PENDING_TASKS= int(os.getenv("CHUNKER_MAX_PENDING_TASKS", "0"))
+
+#ingest stage metrics (served by /metrics)
+_OPEN_SECONDS= INGEST_STAGE_SECONDS.labels(stage= "pdf_open")
+_EXTRACTION_SECONDS= INGEST_STAGE_SECONDS.labels(stage= "extraction")
+_CHUNKING_SECONDS= INGEST_STAGE_SECONDS.labels(stage= "chunking")
+
+
+def _page_hash(text: str, chunk_size: int, chunk_overlap: int)-> str:
+    """Hash of a page's text together with the splitter settings."""
+    key= f"{chunk_size}:{chunk_overlap}:{text}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _observe_page_timings(timings: List[Tuple[float, float]]):
+    """Record per-page (extraction, chunking) seconds, which may come from a worker process."""
+    for extract_seconds, split_seconds in timings:
+        _EXTRACTION_SECONDS.observe(extract_seconds)
+        _CHUNKING_SECONDS.observe(split_seconds)
+
+
+def _chunk_page(page, page_number: int, splitter, pdf_path: str, chunk_size: int, chunk_overlap: int,
+                records: Optional[List[Dict]]= None,
+                timings: Optional[List[Tuple[float, float]]]= None)-> List[Dict]:
+    """
+    Extract and split a single page into chunk dictionaries.
+    With `records`, the page analysis (text, chunk offsets, word boxes) is appended to it;
+    with `timings`, the page's (extraction, chunking) seconds.
+    """
+    start= time.perf_counter()
+    if records is None:
+        text= page.get_text("text").strip()
+    else:
+        text, boxes, spans, lines= extract_page(page)
+    extracted= time.perf_counter()
+    if not text:
+        logger.warning(f"Page {page_number} is empty. Skipping")
+        return []
+    page_chunks= splitter.split_text(text)
+    page_hash= _page_hash(text, chunk_size, chunk_overlap)
+    if records is not None:
+        records.append(page_record(page_number, text, boxes, spans, lines, chunk_spans(text, page_chunks)))
+    if timings is not None:
+        timings.append((extracted - start, time.perf_counter() - extracted))
+    logger.info(f"Processed Page {page_number}>>>{len(page_chunks)} chunks created.")
+    return [
+        {
+            "chunk_id": f"{page_number}_{i}",
+            "page_num": page_number,
+            "text": chunk_text,
+            "pdf_path": pdf_path,
+            "page_hash": page_hash
+        }
+        for i, chunk_text in enumerate(page_chunks)
+    ]
+
+
+def _chunk_page_range(pdf_path: str, start: int, end: int, chunk_size: int, chunk_overlap: int,
+                      analyze: bool= False)-> Tuple[List[Dict], List[Dict], List[Tuple[float, float]]]:
+    """
+    Process-pool worker: chunk pages [start, end) (0-indexed) of a PDF.
+    Runs in a separate process, so it opens its own document and splitter.
+    Returns (chunks, page analysis records, per-page timings); records stay empty unless `analyze`.
+    """
+    splitter= RecursiveCharacterTextSplitter(chunk_size= chunk_size, chunk_overlap= chunk_overlap)
+    chunks= []
+    records= [] if analyze else None
+    timings= []
+    with fitz.open(pdf_path) as docs:
+        for index in range(start, min(end, len(docs))):
+            page_number= index + 1
+            try:
+                chunks.extend(_chunk_page(docs[index], page_number, splitter, pdf_path,
+                                          chunk_size, chunk_overlap, records, timings))
+            except Exception as e:
+                logger.error(f"Error Reading Page {page_number}: {e}")
+    return chunks, records or [], timings
+
+
+class _PageRangeTasks:
+    """
+    Page-range tasks of one PDF on the process pool, in page order, through a
+    bounded window: at most `window` ranges are running or finished but not yet
+    consumed, and the next range is submitted as each result is taken. Results
+    (chunks and word boxes) therefore never pile up faster than the embedding
+    stage consumes them, however large the PDF.
+    """
+
+    def __init__(self, pool: ProcessPoolExecutor, pdf_path: str, page_count: int, pages_per_task: int,
+                 chunk_size: int, chunk_overlap: int, analyze: bool, window: int):
+        self.pdf_path= pdf_path
+        self.analyze= analyze
+        self._pool= pool
+        self._args= (chunk_size, chunk_overlap, analyze)
+        self._pages_per_task= pages_per_task
+        self._starts= iter(range(0, page_count, pages_per_task))
+        self._window= max(1, window)
+        self._futures: "deque[Tuple[int, Future]]"= deque()
+        self._fill()
+
+    def _fill(self):
+        while len(self._futures) < self._window:
+            start= next(self._starts, None)
+            if start is None:
+                return
+            future= self._pool.submit(_chunk_page_range, self.pdf_path, start, start + self._pages_per_task, *self._args)
+            self._futures.append((start, future))
+
+    def __iter__(self)-> Iterator[Tuple[int, Future]]:
+        """Yield (first page index, future) in page order, topping the window up before each one."""
+        while self._futures:
+            item= self._futures.popleft()
+            try:
+                self._fill()
+            except RuntimeError as e:
+                #pool shut down (chunker closed): no more ranges
+                logger.error(f"Stopped submitting page ranges of {self.pdf_path}: {e}")
+                self._starts= iter(())
+            yield item
+
+    def cancel(self):
+        """Cancel the queued ranges and stop submitting new ones."""
+        self._starts= iter(())
+        while self._futures:
+            self._futures.popleft()[1].cancel()
+
+
+class ChunkedPDF:
+    """
+    A single pass over one PDF. The page count is known once it is open;
+    chunks() yields chunk dictionaries page by page and, when analyzing,
+    fills `analysis` (page text, chunk offsets, word boxes) as it goes.
+    In serial mode the document is opened exactly once; in parallel mode each
+    worker process opens its own handle for its page range.
+    """
+
+    def __init__(self, chunker: "DocumentChunker", pdf_path: str, analyze: bool= True):
+        self.chunker= chunker
+        self.pdf_path= pdf_path
+        self.analyze= analyze
+        self._docs= None
+        self._tasks: Optional[_PageRangeTasks]= None
+        with _OPEN_SECONDS.time():
+            if chunker.workers > 1:
+                self.page_count, self._tasks= chunker._take_pending(pdf_path, analyze)
+            else:
+                self._docs= fitz.open(pdf_path)
+                self.page_count= len(self._docs)
+        self.analysis= PDFAnalysis(self.page_count, file_stamp(pdf_path)) if analyze else None
+        logger.info(f"PDF '{pdf_path}' has {self.page_count} pages")
+
+    def chunks(self)-> Iterator[Dict]:
+        """Yield the PDF's chunk dictionaries in page order."""
+        if self._tasks is not None:
+            yield from self._chunks_parallel()
+        else:
+            yield from self._chunks_serial()
+
+    def _chunks_serial(self)-> Iterator[Dict]:
+        records= [] if self.analyze else None
+        timings= []
+        for page_number, page in enumerate(self._docs, start=1):
+            try:
+                page_chunks= _chunk_page(page, page_number, self.chunker.splitter, self.pdf_path,
+                                         self.chunker.chunk_size, self.chunker.chunk_overlap, records, timings)
+            except Exception as e:
+                logger.error(f"Error Reading Page {page_number}: {e}")
+                continue
+            _observe_page_timings(timings)
+            timings.clear()
+            if records:
+                self.analysis.add_page(records.pop())
+            yield from page_chunks
+
+    def _chunks_parallel(self)-> Iterator[Dict]:
+        pages_per_task= self.chunker.pages_per_task
+        #collect in submission order so chunk ordering stays deterministic
+        for start, future in self._tasks:
+            try:
+                range_chunks, records, timings= future.result()
+            except Exception as e:
+                first= start + 1
+                logger.error(f"Error Reading Pages {first}-{first + pages_per_task - 1} of {self.pdf_path}: {e}")
+                continue
+            _observe_page_timings(timings)
+            if self.analysis is not None:
+                for record in records:
+                    self.analysis.add_page(record)
+            yield from range_chunks
+
+    def close(self):
+        if self._docs is not None:
+            self._docs.close()
+            self._docs= None
+        if self._tasks is not None:
+            #left early (e.g. an ingest error): drop the ranges still queued
+            self._tasks.cancel()
+
+    def __enter__(self)-> "ChunkedPDF":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
 class DocumentChunker:
     """
     A utility class for chunking PDF Documents into smaller text segments/chunks
     which is good for embedding and retrival
     """
 
-    def __init__(self, chunk_size: int= 1000, chunk_overlap: int= 100):
+    def __init__(self, chunk_size: int= 1000, chunk_overlap: int= 100,
+                 workers: int= CHUNKER_WORKERS, pages_per_task: int= CHUNKER_PAGES_PER_TASK,
+                 max_pending_tasks: int= CHUNKER_MAX_PENDING_TASKS):
         """
         Initializing DocumentChunker.
 
         Arguments:
                     chunk_size---> int: The Maximum size of each text chunk.
                     chunk_overlap---> int: The Overlap between consecutive chunks.
-        
+                    workers---> int: Worker processes used for extraction (1 = in-process).
+                    pages_per_task---> int: Pages handed to a worker per task.
+                    max_pending_tasks---> int: Page-range tasks of one PDF in flight at once (0 = 2 x workers).
+
         """
         self.chunk_size= chunk_size
         self.chunk_overlap= chunk_overlap
+        self.workers= max(1, workers)
+        self.pages_per_task= max(1, pages_per_task)
+        self.max_pending_tasks= max_pending_tasks if max_pending_tasks > 0 else 2 * self.workers
         self.splitter= RecursiveCharacterTextSplitter(
             chunk_size= self.chunk_size,
             chunk_overlap= self.chunk_overlap
         )
+        self._pool: Optional[ProcessPoolExecutor]= None
+        self._pending: Dict[str, Tuple[int, _PageRangeTasks]]= {}
+        self._lock= threading.Lock()
         logger.info(
             f"DocumentChunker Initialized with chunk_size= {self.chunk_size},"
-            f"chunk_overlap= {self.chunk_overlap}"
+            f"chunk_overlap= {self.chunk_overlap}, workers= {self.workers}"
         )
 
-    def chunk_pdf(self, pdf_path: str):
+    def page_hash(self, text: str)-> str:
+        """
+        Hash of a page's text together with the splitter settings,
+        so changing chunk_size/chunk_overlap also counts as a change.
+        """
+        return _page_hash(text, self.chunk_size, self.chunk_overlap)
+
+    def _get_pool(self)-> ProcessPoolExecutor:
+        """Create the worker pool on first use (spawned, so it is safe alongside server threads)."""
+        with self._lock:
+            if self._pool is None:
+                self._pool= ProcessPoolExecutor(
+                    max_workers= self.workers,
+                    mp_context= multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def _submit(self, pdf_path: str, analyze: bool= False)-> Tuple[int, _PageRangeTasks]:
+        """
+        Start the page-range tasks of the PDF (the first `max_pending_tasks` ranges;
+        the rest are submitted as results are consumed). Returns (page count, tasks).
+        """
+        with fitz.open(pdf_path) as docs:
+            page_count= len(docs)
+        tasks= _PageRangeTasks(self._get_pool(), pdf_path, page_count, self.pages_per_task,
+                               self.chunk_size, self.chunk_overlap, analyze, self.max_pending_tasks)
+        return page_count, tasks
+
+    def _take_pending(self, pdf_path: str, analyze: bool)-> Tuple[int, _PageRangeTasks]:
+        """Prefetched (page count, tasks) for a PDF, submitting it now if there are none."""
+        with self._lock:
+            pending= self._pending.pop(pdf_path, None)
+        if pending is not None:
+            page_count, tasks= pending
+            if tasks.analyze or not analyze:
+                return page_count, tasks
+            tasks.cancel()
+        return self._submit(pdf_path, analyze)
+
+    def prefetch(self, pdf_paths: List[str], analyze: bool= False):
         """
-        Read a PDF from Disk and return a list of chunk dictionaries:
-            {"chunk_id": "page_index", "page": int, "text": str, "pdf_path": str}
+        Start extracting several PDFs on the process pool right away, so files
+        are chunked in parallel while earlier ones are embedded and stored.
+        Only the first `max_pending_tasks` page ranges of each file are started;
+        the rest follow as the file's chunks are consumed.
+        A later open(path) / chunk_pdf(path) call picks up the prefetched result.
+        No-op when running with a single worker.
+        Arguments:
+            pdf_paths ---> List[str]: PDFs to extract.
+            analyze ---> bool: Also record page text, chunk offsets and word boxes.
+        """
+        if self.workers <= 1:
+            return
+        for pdf_path in pdf_paths:
+            try:
+                pending= self._submit(pdf_path, analyze)
+            except Exception as e:
+                logger.error(f"Failed to open PDF File {pdf_path}: {e}")
+                continue
+            with self._lock:
+                self._pending[pdf_path]= pending
+
+    def open(self, pdf_path: str, analyze: bool= True)-> ChunkedPDF:
+        """
+        Open a PDF for a single chunking pass (use as a context manager).
         Arguments:
             pdf_path ---> str: Path to input for PDF File
-        Returns:
-            List ---> Dict: List of Chunk metadata and text. 
+            analyze ---> bool: Record page text, chunk offsets and word boxes in `.analysis`.
+        """
+        return ChunkedPDF(self, pdf_path, analyze)
+
+    def chunk_pdf(self, pdf_path: str)-> Iterator[Dict]:
+        """
+        Read a PDF from Disk and yield chunk dictionaries page by page:
+            {"chunk_id": "page_index", "page_num": int, "text": str, "pdf_path": str, "page_hash": str}
+        `page_hash` identifies the page text (and splitter settings), so a later
+        revision of the PDF can re-embed only the pages that changed.
+        Chunks are yielded as soon as their page (or page range) is extracted, so
+        callers can start embedding before the whole file is read.
+        Chunk order and chunk_ids are the same in serial and parallel mode.
+        Arguments:
+            pdf_path ---> str: Path to input for PDF File
+        Yields:
+            Dict: Chunk metadata and text.
         """
         logger.info(f"starting PDF Chunking for file: {pdf_path}")
-        chunks= []
-        
         try:
-            docs= fitz.open(pdf_path)
+            pdf= self.open(pdf_path, analyze= False)
         except Exception as e:
             logger.error(f"Failed to open PDF File {pdf_path}: {e}")
-            return chunks
+            return
+        count= 0
+        with pdf:
+            for chunk in pdf.chunks():
+                count+= 1
+                yield chunk
+        logger.info(f"Total Chunks Created from PDF: {count}")
 
-        for page_number, page in enumerate(docs, start=1):
-            try:
-                text= page.get_text("text").strip()
-                if not text:
-                    logger.warning(f"Page {page_number} is empty. Skipping")
-                    continue
-                page_chunks= self.splitter.split_text(text)
-                for i, chunk_text in enumerate(page_chunks):
-                    chunks.append({
-                        "chunk_id": f"{page_number}_{i}",
-                            "page_num": page_number, 
-                            "text": chunk_text,
-                            "pdf_path": pdf_path 
-                    })
-                
-                logger.info(
-                    f"Processed Page {page_number}>>>{len(page_chunks)} chunks created."
-                )
-            except Exception as e:
-                logger.error(f"Error Reading Page {page_number}: {e}")
-        logger.info(f"Total Chunks Created from PDF: {len(chunks)}")
-        return chunks
\ No newline at end of file
+    def close(self):
+        """Shut down the worker pool, if one was started."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures= True)
+                self._pool= None
+            self._pending.clear()
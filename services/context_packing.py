@@ -0,0 +1,230 @@
+"""
+services/context_packing.py
+
+ContextPacker: turns the retrieved chunks into the context block of the prompt.
+
+Retrieved chunks repeat text (DocumentChunker uses chunk_overlap) and several
+of them often come from the same page, so joining raw `page_content` pays LLM
+prefill for duplicate tokens. Packing:
+    1. merges adjacent chunks of the same page, dropping the overlapping span,
+    2. drops near-duplicate passages (cosine over hashed word-shingle vectors),
+    3. keeps passages in retrieval-rank order until the token budget is used,
+       trimming the last one at a word boundary.
+"""
+
+import os
+import re
+import zlib
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+#logging configuration
+logger= logging.getLogger(__name__)
+
+#packing settings (overridable from .env)
+CONTEXT_PACKING= os.getenv("CONTEXT_PACKING", "true").lower() in ("1", "true", "yes")
+CONTEXT_TOKEN_BUDGET= int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_CHARS_PER_TOKEN= float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "4"))
+CONTEXT_DEDUP_THRESHOLD= float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.9"))
+CONTEXT_MAX_OVERLAP= int(os.getenv("CONTEXT_MAX_OVERLAP", "200"))
+
+#smallest shared prefix/suffix treated as chunk overlap (shorter matches are coincidence)
+MIN_OVERLAP_CHARS= 20
+#dimension of the hashed shingle vectors used for near-duplicate checks
+SHINGLE_DIM= 2048
+
+_WORD= re.compile(r"\w+")
+
+
+def _chunk_index(doc: Document)-> Optional[int]:
+    """Position of the chunk on its page, from chunk_id "<page>_<i>"."""
+    chunk_id= str((doc.metadata or {}).get("chunk_id") or "")
+    _, _, index= chunk_id.rpartition("_")
+    return int(index) if index.isdigit() else None
+
+
+def merge_overlap(left: str, right: str, max_overlap: int= CONTEXT_MAX_OVERLAP)-> str:
+    """
+    Concatenate two consecutive chunks, removing the longest suffix of `left`
+    that is repeated at the start of `right`.
+    """
+    longest= min(len(left), len(right), max_overlap)
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    #splitter overlap may differ in leading/trailing whitespace
+    stripped= right.lstrip()
+    for size in range(min(len(left), len(stripped), max_overlap), MIN_OVERLAP_CHARS - 1, -1):
+        if left.rstrip().endswith(stripped[:size]):
+            return left.rstrip() + stripped[size:]
+    return left + "\n" + right
+
+
+def shingle_vectors(texts: List[str], dim: int= SHINGLE_DIM)-> np.ndarray:
+    """L2-normalized hashed word-bigram count vectors, one row per text."""
+    matrix= np.zeros((len(texts), dim), dtype= np.float32)
+    for row, text in enumerate(texts):
+        words= _WORD.findall(text.lower())
+        grams= [f"{a} {b}" for a, b in zip(words, words[1:])] or words
+        if grams:
+            buckets= np.fromiter((zlib.crc32(g.encode("utf-8")) % dim for g in grams), dtype= np.int64, count= len(grams))
+            np.add.at(matrix[row], buckets, 1.0)
+    norms= np.linalg.norm(matrix, axis= 1, keepdims= True)
+    norms[norms == 0]= 1.0
+    return matrix / norms
+
+
+class ContextPacker:
+    """
+    Builds a compact, de-duplicated context from retrieved documents
+    within a token budget (estimated as characters / chars_per_token).
+    """
+
+    def __init__(self, token_budget: int= CONTEXT_TOKEN_BUDGET,
+                 chars_per_token: float= CONTEXT_CHARS_PER_TOKEN,
+                 dedup_threshold: float= CONTEXT_DEDUP_THRESHOLD,
+                 max_overlap: int= CONTEXT_MAX_OVERLAP):
+        """
+        Arguments:
+            token_budget ---> int: Maximum estimated tokens of packed context.
+            chars_per_token ---> float: Characters per token used for the estimate.
+            dedup_threshold ---> float: Cosine similarity above which a passage is a near-duplicate.
+            max_overlap ---> int: Longest span (chars) checked when merging adjacent chunks.
+        """
+        self.token_budget= max(1, token_budget)
+        self.chars_per_token= max(0.5, chars_per_token)
+        self.dedup_threshold= dedup_threshold
+        self.max_overlap= max_overlap
+        self._lock= threading.Lock()
+        self.packed= 0
+        self.chars_in= 0
+        self.chars_out= 0
+        self.merged= 0
+        self.duplicates= 0
+        self.trimmed= 0
+
+    def estimate_tokens(self, text: str)-> int:
+        return int(len(text) / self.chars_per_token) + 1
+
+    def _merge_adjacent(self, docs: List[Document])-> Tuple[List[Document], int]:
+        """
+        Merge runs of consecutive chunks from the same page into one passage.
+        A passage keeps the rank of its best chunk.
+        """
+        groups: Dict[tuple, List[Tuple[int, int, Document]]]= {}
+        passages: List[Tuple[int, Document]]= []
+        for rank, doc in enumerate(docs):
+            meta= doc.metadata or {}
+            index= _chunk_index(doc)
+            if index is None or meta.get("page_num") is None:
+                passages.append((rank, doc))
+                continue
+            #chunks are project scoped: the same pdf_name in two projects is two documents
+            page_key= (meta.get("project"), meta.get("pdf_name") or meta.get("pdf_path"), meta.get("page_num"))
+            groups.setdefault(page_key, []).append((index, rank, doc))
+
+        for members in groups.values():
+            members.sort(key= lambda m: m[0])
+            run= [members[0]]
+            for member in members[1:]:
+                if member[0] == run[-1][0]:
+                    continue
+                if member[0] == run[-1][0] + 1:
+                    run.append(member)
+                    continue
+                passages.append(self._join_run(run))
+                run= [member]
+            passages.append(self._join_run(run))
+        passages.sort(key= lambda p: p[0])
+        return [p[1] for p in passages], len(docs) - len(passages)
+
+    def _join_run(self, run: List[Tuple[int, int, Document]])-> Tuple[int, Document]:
+        text= run[0][2].page_content
+        for _, _, doc in run[1:]:
+            text= merge_overlap(text, doc.page_content, self.max_overlap)
+        first= run[0][2]
+        metadata= dict(first.metadata or {})
+        if len(run) > 1:
+            metadata["chunk_ids"]= [doc.metadata.get("chunk_id") for _, _, doc in run]
+        return min(rank for _, rank, _ in run), Document(page_content= text, metadata= metadata)
+
+    def _drop_near_duplicates(self, passages: List[Document])-> Tuple[List[Document], int]:
+        """Greedy, in rank order: drop a passage too similar to one already kept."""
+        if len(passages) < 2:
+            return passages, 0
+        vectors= shingle_vectors([p.page_content for p in passages])
+        similarity= vectors @ vectors.T
+        kept: List[int]= []
+        for i in range(len(passages)):
+            if kept and float(similarity[i, kept].max()) >= self.dedup_threshold:
+                continue
+            kept.append(i)
+        return [passages[i] for i in kept], len(passages) - len(kept)
+
+    def _fit_budget(self, passages: List[Document])-> Tuple[List[str], bool]:
+        """Keep passages in order until the budget is used, trimming the last one at a word boundary."""
+        budget_chars= int(self.token_budget * self.chars_per_token)
+        out: List[str]= []
+        used= 0
+        for passage in passages:
+            text= passage.page_content.strip()
+            if not text:
+                continue
+            if used + len(text) <= budget_chars:
+                out.append(text)
+                used+= len(text) + 2
+                continue
+            remaining= budget_chars - used
+            #not worth adding a tiny fragment
+            if remaining >= 200:
+                cut= text.rfind(" ", 0, remaining)
+                out.append(text[:cut if cut > 0 else remaining].rstrip() + " ...")
+            return out, True
+        return out, False
+
+    def pack(self, docs: List[Document])-> str:
+        """
+        Build the context string from documents in retrieval-rank order.
+        Arguments:
+            docs ---> List[Document]: Retrieved chunks, best first.
+        Returns:
+            str: Packed context (passages separated by blank lines).
+        """
+        if not docs:
+            return ""
+        chars_in= sum(len(d.page_content) for d in docs)
+        passages, merged= self._merge_adjacent(docs)
+        passages, duplicates= self._drop_near_duplicates(passages)
+        texts, trimmed= self._fit_budget(passages)
+        context= "\n\n".join(texts)
+
+        with self._lock:
+            self.packed+= 1
+            self.chars_in+= chars_in
+            self.chars_out+= len(context)
+            self.merged+= merged
+            self.duplicates+= duplicates
+            self.trimmed+= int(trimmed)
+        logger.info(
+            f"Context packed: {len(docs)} chunks -> {len(texts)} passages, "
+            f"~{self.estimate_tokens(''.join(d.page_content for d in docs))} -> ~{self.estimate_tokens(context)} tokens "
+            f"({merged} merged, {duplicates} near-duplicates, trimmed= {trimmed})"
+        )
+        return context
+
+    def stats(self)-> dict:
+        with self._lock:
+            return {
+                "packed": self.packed,
+                "token_budget": self.token_budget,
+                "chars_in": self.chars_in,
+                "chars_out": self.chars_out,
+                "reduction": round(1 - self.chars_out / self.chars_in, 3) if self.chars_in else 0.0,
+                "merged_chunks": self.merged,
+                "near_duplicates": self.duplicates,
+                "trimmed": self.trimmed,
+            }
@@ -0,0 +1,216 @@
+"""
+services/jobs.py
+
+Background ingestion jobs for the PDF upload flow.
+
+An upload is turned into an IngestionJob that runs on a bounded worker pool,
+so the FastAPI event loop (and every concurrent /query) stays responsive while
+chunking, embedding and graph writes happen in the background.
+
+Each job keeps per-file progress (stage, chunks processed) and reports overall
+throughput, which is served by `GET /api/jobs/{job_id}`.
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import pytz
+
+#logging configuration
+logger= logging.getLogger(__name__)
+
+ist= pytz.timezone("Asia/Kolkata")
+
+#worker pool tuning (overridable from .env)
+INGEST_WORKERS= int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_JOBS_RETAINED= int(os.getenv("INGEST_JOBS_RETAINED", "200"))
+#seconds the app shutdown waits for running jobs before closing the ingest clients
+INGEST_SHUTDOWN_TIMEOUT= float(os.getenv("INGEST_SHUTDOWN_TIMEOUT", "60"))
+
+#job statuses after which a job no longer changes
+FINISHED_STATUSES= ("completed", "completed_with_errors", "failed", "cancelled")
+
+
+class IngestionJob:
+    """
+    State of one background ingestion run.
+
+    Per-file stages move through:
+        queued -> extracting -> embedding -> storing -> done
+    or end in `skipped` / `failed`.
+
+    The job status goes queued -> running and then, from the per-file stages:
+    `completed` (no file failed), `completed_with_errors` (some files failed)
+    or `failed` (every file failed, or the run itself raised). A job still
+    queued when the server shuts down ends `cancelled`.
+    """
+
+    def __init__(self, project_name: str, filenames: List[str]):
+        self.id= uuid.uuid4().hex
+        self.project_name= project_name
+        self.status= "queued"
+        self.error: Optional[str]= None
+        self.result: Optional[dict]= None
+        self.created_at= datetime.now(ist).isoformat()
+        self.started_at: Optional[float]= None
+        self.finished_at: Optional[float]= None
+        self.files: Dict[str, dict]= {
+            name: {"stage": "queued", "pages": 0, "chunks_total": 0, "chunks_processed": 0, "error": None}
+            for name in filenames
+        }
+        self._lock= threading.Lock()
+
+    def update_file(self, filename: str, **fields):
+        """Update progress fields (stage, pages, chunks_total, error...) of one file."""
+        with self._lock:
+            self.files.setdefault(filename, {"stage": "queued", "pages": 0, "chunks_total": 0,
+                                             "chunks_processed": 0, "error": None}).update(fields)
+
+    def add_processed(self, filename: str, count: int):
+        """Increment the number of chunks fully processed for a file."""
+        with self._lock:
+            self.files[filename]["chunks_processed"]+= count
+
+    def final_status(self)-> str:
+        """Status of a finished run, derived from the per-file stages."""
+        with self._lock:
+            failed= [name for name, info in self.files.items() if info["stage"] == "failed"]
+            total= len(self.files)
+        if failed and len(failed) == total:
+            return "failed"
+        if failed:
+            return "completed_with_errors"
+        return "completed"
+
+    def failed_files(self)-> Dict[str, Optional[str]]:
+        """{filename: error} of the files that failed."""
+        with self._lock:
+            return {name: info["error"] for name, info in self.files.items() if info["stage"] == "failed"}
+
+    def to_dict(self)-> dict:
+        """Serializable snapshot of the job, including throughput."""
+        with self._lock:
+            processed= sum(f["chunks_processed"] for f in self.files.values())
+            if self.started_at is not None:
+                elapsed= (self.finished_at or time.time()) - self.started_at
+            else:
+                elapsed= 0.0
+            return {
+                "job_id": self.id,
+                "project": self.project_name,
+                "status": self.status,
+                "created_at": self.created_at,
+                "elapsed_seconds": round(elapsed, 2),
+                "chunks_processed": processed,
+                "chunks_per_second": round(processed / elapsed, 2) if elapsed > 0 else 0.0,
+                "files": {name: dict(info) for name, info in self.files.items()},
+                "result": self.result,
+                "error": self.error,
+            }
+
+
+class JobManager:
+    """
+    Runs ingestion jobs on a bounded thread pool and keeps the most recent
+    jobs in memory so their status can be polled.
+    """
+
+    def __init__(self, max_workers: int= INGEST_WORKERS, max_retained: int= INGEST_JOBS_RETAINED):
+        """
+        Arguments:
+            max_workers ---> int: Number of ingestion jobs that may run at once.
+            max_retained ---> int: Number of finished jobs kept for status queries.
+        """
+        self.max_retained= max(1, max_retained)
+        self._executor= ThreadPoolExecutor(max_workers= max(1, max_workers), thread_name_prefix= "ingest")
+        self._jobs: "OrderedDict[str, IngestionJob]"= OrderedDict()
+        #job id -> future, while the job is queued or running
+        self._futures: Dict[str, Future]= {}
+        self._lock= threading.Lock()
+        logger.info(f"JobManager initialized with {max_workers} ingestion workers.")
+
+    def submit(self, project_name: str, filenames: List[str], work: Callable[[IngestionJob], dict])-> IngestionJob:
+        """
+        Queue `work(job)` on the worker pool and return the job immediately.
+        """
+        job= IngestionJob(project_name, filenames)
+        with self._lock:
+            self._jobs[job.id]= job
+            self._trim()
+            self._futures[job.id]= self._executor.submit(self._run, job, work)
+        logger.info(f"Queued ingestion job {job.id} for project '{project_name}' ({len(filenames)} files).")
+        return job
+
+    def _run(self, job: IngestionJob, work: Callable[[IngestionJob], dict]):
+        job.status= "running"
+        job.started_at= time.time()
+        try:
+            job.result= work(job)
+            job.status= job.final_status()
+            failed= job.failed_files()
+            if failed:
+                job.error= "; ".join(f"{name}: {error}" for name, error in failed.items())
+                logger.warning(f"Ingestion job {job.id} {job.status}: {len(failed)} of {len(job.files)} files failed.")
+            else:
+                logger.info(f"Ingestion job {job.id} completed.")
+        except Exception as e:
+            job.status= "failed"
+            job.error= str(e)
+            logger.exception(f"Ingestion job {job.id} failed: {e}")
+        finally:
+            job.finished_at= time.time()
+            with self._lock:
+                self._futures.pop(job.id, None)
+
+    def _trim(self):
+        """Forget the oldest finished jobs once more than max_retained are kept. Caller holds the lock."""
+        if len(self._jobs) <= self.max_retained:
+            return
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.max_retained:
+                break
+            if self._jobs[job_id].status in FINISHED_STATUSES:
+                del self._jobs[job_id]
+
+    def get(self, job_id: str)-> Optional[IngestionJob]:
+        """Return the job with the given id, or None if unknown/expired."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self, timeout: Optional[float]= INGEST_SHUTDOWN_TIMEOUT)-> bool:
+        """
+        Stop accepting jobs, cancel the queued ones and wait for the running ones.
+        Call it before closing the clients the jobs use.
+
+        Arguments:
+            timeout ---> float: Seconds to wait for running jobs (None = until they finish).
+        Returns:
+            bool: Whether every running job finished in time.
+        """
+        self._executor.shutdown(wait= False, cancel_futures= True)
+        with self._lock:
+            pending= dict(self._futures)
+        running= []
+        for job_id, future in pending.items():
+            if future.cancelled():
+                job= self._jobs.get(job_id)
+                if job is not None:
+                    job.status= "cancelled"
+                    job.error= "Server shut down before the job started; upload the files again."
+                with self._lock:
+                    self._futures.pop(job_id, None)
+            else:
+                running.append(future)
+        if running:
+            logger.info(f"Waiting up to {timeout}s for {len(running)} running ingestion jobs...")
+        _, not_done= wait(running, timeout= timeout)
+        if not_done:
+            logger.warning(f"{len(not_done)} ingestion jobs still running at shutdown; their clients are closed under them.")
+        return not not_done
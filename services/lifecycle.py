@@ -0,0 +1,167 @@
+"""
+services/lifecycle.py
+
+Lazy application dependencies, model warm-up and readiness.
+
+Heavy objects (RAGPipeline, PDFUploader -> Neo4j, MongoDB, Langfuse and Ollama
+clients) are built on first use through `Lazy` providers instead of at import
+time, so a worker boots quickly and answers liveness probes even while a
+dependency is slow. On startup the app builds them in the background and
+preloads the Ollama models with a keep-alive; `readiness` reports when every
+required component is up, so a new replica only takes traffic once it is warm.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Callable, Dict, Generic, Optional, TypeVar
+
+from ollama import AsyncClient
+
+#seconds Ollama keeps a model loaded after each request (OLLAMA_MODEL_KEEP_ALIVE, -1 = until the server stops)
+from utils.embeddings import KEEP_ALIVE as OLLAMA_KEEP_ALIVE
+
+#logging configuration
+logger= logging.getLogger(__name__)
+
+#preload the LLM and embedding model before reporting ready
+WARMUP_ON_STARTUP= os.getenv("WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+WARMUP_TIMEOUT= float(os.getenv("WARMUP_TIMEOUT", "300"))
+#delay between startup attempts while a dependency is down
+STARTUP_RETRY_INTERVAL= float(os.getenv("STARTUP_RETRY_INTERVAL", "10"))
+
+T= TypeVar("T")
+
+
+class Unavailable(RuntimeError):
+    """A lazy dependency is not built yet and is not being built on this call."""
+
+
+class Lazy(Generic[T]):
+    """
+    Process-wide instance built by `factory` (thread safe). A failed build is not cached.
+
+    Standalone, the first `get()` builds it; after a failure `get()` fails fast
+    for `retry_interval` seconds instead of re-running the factory on every call.
+    Once `managed` (set by the app's startup task, which calls `build()` until it
+    succeeds), `get()` never builds inline and raises `Unavailable` until the
+    instance exists, so requests are not held up by a dependency that is down.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], T], retry_interval: float= STARTUP_RETRY_INTERVAL):
+        """
+        Arguments:
+            name ---> str: Name used in logs and readiness.
+            factory ---> Callable: Builds the instance.
+            retry_interval ---> float: Seconds `get()` fails fast after a failed build.
+        """
+        self.name= name
+        self._factory= factory
+        self.retry_interval= retry_interval
+        self.managed= False
+        self._instance: Optional[T]= None
+        self._lock= threading.Lock()
+        self._failed_at: Optional[float]= None
+        self.last_error: Optional[str]= None
+
+    def get(self)-> T:
+        """The instance; built here only when standalone and not in back-off (else raises Unavailable)."""
+        instance= self._instance
+        if instance is not None:
+            return instance
+        if self.managed:
+            raise Unavailable(f"{self.name} is starting ({self.last_error or 'pending'})")
+        failed_at= self._failed_at
+        if failed_at is not None and time.monotonic() - failed_at < self.retry_interval:
+            raise Unavailable(f"{self.name} is unavailable ({self.last_error})")
+        return self.build()
+
+    def build(self)-> T:
+        """Build the instance now unless it exists (ignores the back-off; used by the startup task)."""
+        with self._lock:
+            if self._instance is None:
+                start= time.perf_counter()
+                try:
+                    self._instance= self._factory()
+                except Exception as e:
+                    self.last_error= str(e)
+                    self._failed_at= time.monotonic()
+                    logger.error(f"Failed to initialize {self.name}: {e}")
+                    raise
+                self.last_error= None
+                self._failed_at= None
+                logger.info(f"{self.name} initialized in {round(time.perf_counter() - start, 2)}s.")
+            return self._instance
+
+    def peek(self)-> Optional[T]:
+        """The instance if it has been built, without building it."""
+        return self._instance
+
+    def reset(self)-> Optional[T]:
+        """Forget the instance (returned so the caller can close it)."""
+        with self._lock:
+            instance, self._instance= self._instance, None
+        return instance
+
+
+class Readiness:
+    """Startup state of the components a replica needs before taking traffic."""
+
+    def __init__(self):
+        self._components: Dict[str, dict]= {}
+        self._lock= threading.Lock()
+
+    def require(self, *names: str):
+        """Register components that must be ready (initially pending)."""
+        with self._lock:
+            for name in names:
+                self._components.setdefault(name, {"ready": False, "detail": "pending", "since": time.time()})
+
+    def mark(self, name: str, ready: bool, detail: Optional[str]= None):
+        with self._lock:
+            self._components[name]= {"ready": ready, "detail": detail, "since": time.time()}
+
+    def is_ready(self)-> bool:
+        with self._lock:
+            return bool(self._components) and all(c["ready"] for c in self._components.values())
+
+    def snapshot(self)-> dict:
+        with self._lock:
+            components= {name: dict(state) for name, state in self._components.items()}
+        return {"ready": bool(components) and all(c["ready"] for c in components.values()),
+                "components": components}
+
+
+readiness= Readiness()
+
+
+async def warm_up_models(llm_model: str, embedding_model: str, keep_alive: int= OLLAMA_KEEP_ALIVE,
+                         host: Optional[str]= None)-> Dict[str, float]:
+    """
+    Load the LLM and the embedding model into Ollama and keep them resident,
+    so the first query does not pay the model cold-load.
+
+    Arguments:
+        llm_model ---> str: Generation model (loaded with an empty prompt, nothing is generated).
+        embedding_model ---> str: Embedding model (loaded by embedding one short text).
+        keep_alive ---> int: Seconds Ollama keeps the models loaded.
+        host ---> str: Ollama URL (default: OLLAMA_HOST).
+    Returns:
+        Dict[str, float]: Seconds taken to load each model.
+    """
+    client= AsyncClient(host= host)
+
+    async def timed(call):
+        start= time.perf_counter()
+        await call
+        return round(time.perf_counter() - start, 3)
+
+    llm_seconds, embedding_seconds= await asyncio.gather(
+        timed(client.generate(model= llm_model, prompt= "", keep_alive= keep_alive)),
+        timed(client.embed(model= embedding_model, input= "warm-up", keep_alive= keep_alive)),
+    )
+    logger.info(f"Warmed up Ollama models: {llm_model} in {llm_seconds}s, {embedding_model} in {embedding_seconds}s "
+                f"(keep_alive= {keep_alive}s).")
+    return {"llm": llm_seconds, "embedding": embedding_seconds}
@@ -0,0 +1,346 @@
+"""
+services/metrics.py
+
+Minimal in-process metrics registry rendered in the Prometheus text format
+(served by `GET /metrics`). Counters, gauges and histograms with labels; no
+external dependency.
+
+Hot-path cost is one lock and a bisect per observation: bind label values once
+(`HIST.labels(stage= "x")`) at import time and reuse the child, e.g.
+
+    _EMBED_SECONDS= QUERY_STAGE_SECONDS.labels(stage= "query_embedding")
+    with _EMBED_SECONDS.time():
+        ...
+"""
+
+import time
+import logging
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+#logging configuration
+logger= logging.getLogger(__name__)
+
+#minimum seconds between two logged failures of the same collector
+COLLECTOR_ERROR_LOG_INTERVAL= 300.0
+
+#latency buckets (seconds) covering cache hits up to slow LLM generations
+DEFAULT_BUCKETS= (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str)-> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]]= None)-> str:
+    pairs= [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float)-> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, "_Metric"]= {}
+        self._collectors: List[Callable[[], None]]= []
+        #collector -> time its last failure was logged
+        self._collector_errors: Dict[Callable[[], None], float]= {}
+        self._lock= threading.Lock()
+
+    def register(self, metric: "_Metric"):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name]= metric
+
+    def add_collector(self, collect: Callable[[], None]):
+        """Callback run before each render, e.g. to set gauges from state sampled on demand."""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def _collector_failed(self, collect: Callable[[], None], error: Exception):
+        """Log a collector failure (at most once per COLLECTOR_ERROR_LOG_INTERVAL per collector)."""
+        now= time.monotonic()
+        with self._lock:
+            last= self._collector_errors.get(collect)
+            if last is not None and now - last < COLLECTOR_ERROR_LOG_INTERVAL:
+                return
+            self._collector_errors[collect]= now
+        name= getattr(collect, "__qualname__", repr(collect))
+        logger.warning(f"Metrics collector {name} failed; its gauges are stale: {error}", exc_info= error)
+
+    def render(self)-> str:
+        with self._lock:
+            metrics= list(self._metrics.values())
+            collectors= list(self._collectors)
+        for collect in collectors:
+            try:
+                collect()
+            except Exception as e:
+                self._collector_failed(collect, e)
+        lines= []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY= MetricsRegistry()
+
+
+class _Metric:
+    kind= "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]= (),
+                 registry: Optional[MetricsRegistry]= REGISTRY):
+        """
+        Arguments:
+            name ---> str: Metric name.
+            documentation ---> str: HELP text.
+            labelnames ---> Sequence[str]: Label names; children are created with labels().
+            registry ---> MetricsRegistry: Registry to add the metric to (None = unregistered).
+        """
+        self.name= name
+        self.documentation= documentation
+        self.labelnames= tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object]= {}
+        self._lock= threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **kwargs):
+        """Child metric for one combination of label values (cached; bind it once and reuse)."""
+        if kwargs:
+            values= tuple(kwargs[name] for name in self.labelnames)
+        key= tuple(str(v) for v in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+        child= self._children.get(key)
+        if child is None:
+            with self._lock:
+                child= self._children.setdefault(key, self._new_child())
+        return child
+
+    def _items(self)-> List[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            return list(self._children.items())
+
+    def samples(self)-> Iterator[str]:
+        raise NotImplementedError
+
+
+class _Value:
+    def __init__(self):
+        self.value= 0.0
+        self._lock= threading.Lock()
+
+    def inc(self, amount: float= 1.0):
+        with self._lock:
+            self.value+= amount
+
+    def dec(self, amount: float= 1.0):
+        with self._lock:
+            self.value-= amount
+
+    def set(self, value: float):
+        with self._lock:
+            self.value= value
+
+    def track(self)-> "_InProgress":
+        """Context manager: +1 while the block runs (in-flight gauges)."""
+        return _InProgress(self)
+
+
+class _InProgress:
+    __slots__= ("gauge",)
+
+    def __init__(self, gauge: _Value):
+        self.gauge= gauge
+
+    def __enter__(self):
+        self.gauge.inc()
+        return self
+
+    def __exit__(self, *exc):
+        self.gauge.dec()
+
+
+class Counter(_Metric):
+    """Monotonically increasing count (name it with a `_total` suffix)."""
+    kind= "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float= 1.0):
+        self.labels().inc(amount)
+
+    def samples(self)-> Iterator[str]:
+        for key, child in self._items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+
+
+class Gauge(_Metric):
+    """Value that goes up and down (e.g. requests in flight)."""
+    kind= "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float= 1.0):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float= 1.0):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def track(self)-> _InProgress:
+        return self.labels().track()
+
+    def samples(self)-> Iterator[str]:
+        for key, child in self._items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+
+
+class _HistogramChild:
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds= bounds
+        self.counts= [0] * (len(bounds) + 1)
+        self.sum= 0.0
+        self._lock= threading.Lock()
+
+    def observe(self, value: float):
+        index= bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index]+= 1
+            self.sum+= value
+
+    def time(self)-> "_Timer":
+        """Context manager observing the duration of the block."""
+        return _Timer(self)
+
+    def snapshot(self)-> Tuple[List[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class _Timer:
+    __slots__= ("histogram", "start", "elapsed")
+
+    def __init__(self, histogram: _HistogramChild):
+        self.histogram= histogram
+        self.elapsed= 0.0
+
+    def __enter__(self):
+        self.start= time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed= time.perf_counter() - self.start
+        self.histogram.observe(self.elapsed)
+
+
+class Histogram(_Metric):
+    """Distribution of observations (latencies) in cumulative buckets."""
+    kind= "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]= (),
+                 buckets: Sequence[float]= DEFAULT_BUCKETS, registry: Optional[MetricsRegistry]= REGISTRY):
+        self.bounds= tuple(sorted(float(b) for b in buckets if b != float("inf")))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self)-> _Timer:
+        return self.labels().time()
+
+    def samples(self)-> Iterator[str]:
+        for key, child in self._items():
+            counts, total= child.snapshot()
+            cumulative= 0
+            for bound, count in zip(self.bounds + (float("inf"),), counts):
+                cumulative+= count
+                labels= _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels= _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+#query path
+QUERY_STAGE_SECONDS= Histogram(
+    "rag_query_stage_seconds",
+    "Latency of query pipeline stages (query_embedding, vector_search, fulltext_search, "
+    "prompt_fetch, prompt_build, llm_generation, llm_first_token).",
+    ["stage"],
+)
+QUERY_SECONDS= Histogram(
+    "rag_query_seconds",
+    "End-to-end latency of query requests.",
+    ["endpoint", "outcome"],
+)
+LLM_TOKENS= Counter("rag_llm_streamed_tokens_total", "Token chunks streamed from the LLM.")
+
+#ingest path
+INGEST_STAGE_SECONDS= Histogram(
+    "rag_ingest_stage_seconds",
+    "Latency of ingest stages (extraction and chunking per page, embedding_batch, neo4j_write, mongo_write).",
+    ["stage"],
+)
+INGEST_PDF_SECONDS= Histogram(
+    "rag_ingest_pdf_seconds",
+    "Time to ingest one PDF end to end.",
+    buckets= (1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+INGEST_CHUNKS= Counter("rag_ingest_chunks_total", "Chunks processed during ingest.", ["result"])
+INGEST_PDFS= Counter("rag_ingest_pdfs_total", "PDFs processed during ingest.", ["outcome"])
+
+#langfuse prompt template cache (age sampled when /metrics is rendered)
+PROMPT_TEMPLATE_AGE= Gauge("rag_prompt_template_age_seconds",
+                           "Age of the cached Langfuse prompt template (-1 while none is loaded).")
+PROMPT_TEMPLATE_REFRESHES= Counter("rag_prompt_template_refreshes_total",
+                                   "Langfuse prompt template fetches, by result (success, failure).", ["result"])
+PROMPT_TEMPLATE_STALE_SERVED= Counter("rag_prompt_template_stale_served_total",
+                                      "Queries served a prompt template older than its TTL.")
+
+#embedding cache (entries and time saved sampled when /metrics is rendered)
+EMBEDDING_CACHE_LOOKUPS= Counter("rag_embedding_cache_lookups_total", "Embedding cache lookups, by result (hit, miss).", ["result"])
+EMBEDDING_CACHE_EVICTIONS= Counter("rag_embedding_cache_evictions_total", "Embeddings evicted from the cache (least recently used).")
+EMBEDDING_CACHE_ENTRIES= Gauge("rag_embedding_cache_entries", "Embeddings stored in the cache.")
+EMBEDDING_CACHE_SECONDS_SAVED= Gauge("rag_embedding_cache_estimated_seconds_saved",
+                                     "Ollama embedding time saved by cache hits (hits x mean seconds per embedded text).")
+
+#highlight rendering
+HIGHLIGHT_SECONDS= Histogram(
+    "rag_highlight_seconds",
+    "Highlight latency: whole requests (single, batch) and page rasterizations on a cache miss (render).",
+    ["stage"],
+)
+HIGHLIGHT_PAGES= Counter("rag_highlight_pages_total", "Highlighted pages served, by render cache result.", ["cache"])
+
+#neo4j connection pools (sampled when /metrics is rendered)
+NEO4J_POOL_CONNECTIONS= Gauge("rag_neo4j_pool_connections", "Neo4j pool connections by state (in_use, idle, pending).",
+                              ["kind", "uri", "state"])
+NEO4J_POOL_MAX= Gauge("rag_neo4j_pool_max_connections", "Configured Neo4j pool size per server.", ["kind", "uri"])
+
+#work in progress
+IN_FLIGHT= Gauge("rag_in_flight", "Operations currently in progress.", ["operation"])
@@ -0,0 +1,186 @@
+"""
+services/neo4j_drivers.py
+
+Process-wide Neo4j drivers shared by ingestion (Neo4jStorage) and querying
+(Neo4jVector, the async query path). One sync and one async driver per
+(uri, user), so every component draws from the same connection pools instead
+of each opening its own.
+
+Pool settings come from .env:
+    NEO4J_MAX_POOL_SIZE             connections per driver (default 100)
+    NEO4J_ACQUISITION_TIMEOUT       seconds to wait for a free connection (default 60)
+    NEO4J_MAX_CONNECTION_LIFETIME   seconds before a connection is retired (default 3600)
+    NEO4J_LIVENESS_CHECK_TIMEOUT    idle seconds after which a connection is pinged
+                                    before reuse (default 30, negative disables)
+    NEO4J_CONNECTION_TIMEOUT        seconds to establish a connection (default 30)
+
+Pool utilization is served by `stats()` (GET /stats/neo4j) and as
+`rag_neo4j_pool_*` gauges on /metrics.
+"""
+
+import os
+import atexit
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from neo4j import AsyncGraphDatabase, GraphDatabase
+
+from services.metrics import NEO4J_POOL_CONNECTIONS, NEO4J_POOL_MAX, REGISTRY
+
+#logging configuration
+logger= logging.getLogger(__name__)
+
+#Environment set-up
+load_dotenv()
+
+#pool tuning (overridable from .env)
+NEO4J_MAX_POOL_SIZE= int(os.getenv("NEO4J_MAX_POOL_SIZE", "100"))
+NEO4J_ACQUISITION_TIMEOUT= float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "60"))
+NEO4J_MAX_CONNECTION_LIFETIME= float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600"))
+NEO4J_LIVENESS_CHECK_TIMEOUT= float(os.getenv("NEO4J_LIVENESS_CHECK_TIMEOUT", "30"))
+NEO4J_CONNECTION_TIMEOUT= float(os.getenv("NEO4J_CONNECTION_TIMEOUT", "30"))
+NEO4J_DATABASE= os.getenv("NEO4J_DATABASE", "neo4j")
+
+
+def pool_settings()-> dict:
+    """Driver keyword arguments for the configured pool settings."""
+    return {
+        "max_connection_pool_size": max(1, NEO4J_MAX_POOL_SIZE),
+        "connection_acquisition_timeout": NEO4J_ACQUISITION_TIMEOUT,
+        "max_connection_lifetime": NEO4J_MAX_CONNECTION_LIFETIME,
+        "liveness_check_timeout": NEO4J_LIVENESS_CHECK_TIMEOUT if NEO4J_LIVENESS_CHECK_TIMEOUT >= 0 else None,
+        "connection_timeout": NEO4J_CONNECTION_TIMEOUT,
+        "keep_alive": True,
+    }
+
+
+def _pool_usage(driver)-> Dict[str, int]:
+    """
+    Connections of a driver's pool by state. Reads driver internals, so it is a
+    best-effort snapshot (empty if the driver version does not expose them).
+    """
+    try:
+        pool= driver._pool
+        in_use= total= 0
+        for connections in list(pool.connections.values()):
+            connections= list(connections)
+            total+= len(connections)
+            in_use+= sum(1 for c in connections if c.in_use)
+        pending= sum(list(pool.connections_reservations.values()))
+        return {"in_use": in_use, "idle": total - in_use, "pending": pending}
+    except Exception:
+        return {}
+
+
+class SharedGraph:
+    """
+    Minimal stand-in for langchain_neo4j's Neo4jGraph so Neo4jVector(graph= ...)
+    uses a shared driver instead of opening its own (it only reads these two attributes).
+    """
+
+    def __init__(self, driver, database: str= NEO4J_DATABASE):
+        self._driver= driver
+        self._database= database
+
+
+class Neo4jDriverRegistry:
+    """Creates, shares and closes the process-wide Neo4j drivers."""
+
+    def __init__(self, settings: Optional[dict]= None):
+        """
+        Arguments:
+            settings ---> dict: Driver pool keyword arguments (defaults to pool_settings()).
+        """
+        self.settings= settings or pool_settings()
+        self._sync: Dict[Tuple[str, str, str], object]= {}
+        self._async: Dict[Tuple[str, str, str], object]= {}
+        self._lock= threading.Lock()
+
+    @staticmethod
+    def _key(uri: Optional[str], user: Optional[str], password: Optional[str])-> Tuple[str, str, str]:
+        return (uri or os.getenv("NEO4J_URI"), user or os.getenv("NEO4J_USER"),
+                password or os.getenv("NEO4J_PASSWORD"))
+
+    def get(self, uri: Optional[str]= None, user: Optional[str]= None, password: Optional[str]= None):
+        """
+        Shared sync driver for (uri, user); created on first use. Do not close it,
+        the registry does on shutdown.
+        Arguments:
+            uri ---> str: Neo4j URI (defaults to NEO4J_URI).
+            user ---> str: Neo4j user (defaults to NEO4J_USER).
+            password ---> str: Neo4j password (defaults to NEO4J_PASSWORD).
+        """
+        key= self._key(uri, user, password)
+        with self._lock:
+            driver= self._sync.get(key)
+            if driver is None:
+                driver= GraphDatabase.driver(key[0], auth= (key[1], key[2]), **self.settings)
+                self._sync[key]= driver
+                logger.info(f"Created shared Neo4j driver for {key[0]} "
+                            f"(pool size {self.settings['max_connection_pool_size']}).")
+            return driver
+
+    def get_async(self, uri: Optional[str]= None, user: Optional[str]= None, password: Optional[str]= None):
+        """Shared async driver for (uri, user), with the same pool settings as `get`."""
+        key= self._key(uri, user, password)
+        with self._lock:
+            driver= self._async.get(key)
+            if driver is None:
+                driver= AsyncGraphDatabase.driver(key[0], auth= (key[1], key[2]), **self.settings)
+                self._async[key]= driver
+                logger.info(f"Created shared async Neo4j driver for {key[0]}.")
+            return driver
+
+    def _drivers(self):
+        with self._lock:
+            return ([("sync", key, d) for key, d in self._sync.items()]
+                    + [("async", key, d) for key, d in self._async.items()])
+
+    def stats(self)-> dict:
+        """Pool settings and per-driver connection usage."""
+        drivers= []
+        max_size= self.settings["max_connection_pool_size"]
+        for kind, key, driver in self._drivers():
+            usage= _pool_usage(driver)
+            entry= {"kind": kind, "uri": key[0], "user": key[1], **usage}
+            if usage:
+                #the pool size applies per server; for a single bolt:// server this is the pool's utilization
+                entry["utilization"]= round(usage["in_use"] / max_size, 3)
+            drivers.append(entry)
+        return {"settings": dict(self.settings), "drivers": drivers}
+
+    def collect_metrics(self):
+        """Refresh the pool gauges (runs before every /metrics render)."""
+        max_size= self.settings["max_connection_pool_size"]
+        for kind, key, driver in self._drivers():
+            NEO4J_POOL_MAX.labels(kind= kind, uri= key[0]).set(max_size)
+            for state, count in _pool_usage(driver).items():
+                NEO4J_POOL_CONNECTIONS.labels(kind= kind, uri= key[0], state= state).set(count)
+
+    def close(self):
+        """Close the sync drivers (async drivers need `aclose`)."""
+        with self._lock:
+            drivers, self._sync= list(self._sync.values()), {}
+        for driver in drivers:
+            try:
+                driver.close()
+            except Exception as e:
+                logger.error(f"Neo4j driver close error: {e}")
+
+    async def aclose(self):
+        """Close every driver (call on application shutdown)."""
+        with self._lock:
+            drivers, self._async= list(self._async.values()), {}
+        for driver in drivers:
+            try:
+                await driver.close()
+            except Exception as e:
+                logger.error(f"Async Neo4j driver close error: {e}")
+        self.close()
+
+
+neo4j_drivers= Neo4jDriverRegistry()
+REGISTRY.add_collector(neo4j_drivers.collect_metrics)
+atexit.register(neo4j_drivers.close)
@@ -0,0 +1,267 @@
+"""
+services/pdf_analysis.py
+
+PDFAnalysis: what ingest learns about a PDF in its single extraction pass,
+persisted in a compact sidecar next to the PDF (`<name>.pdf.analysis.npz`):
+    - page count and the text of every page (as chunked),
+    - character offsets of each chunk in its page text,
+    - word bounding boxes with their character offsets and line ids.
+
+Highlighting looks up the stored boxes of a chunk (or of a snippet found in the
+stored page text) instead of running a full-page `search_for` on every render.
+A sidecar is only used while the PDF's (mtime, size) matches the one it was built from.
+"""
+
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+#logging configuration
+logger= logging.getLogger(__name__)
+
+ANALYSIS_SUFFIX= ".analysis.npz"
+ANALYSIS_VERSION= 1
+#parsed sidecars kept in memory (overridable from .env)
+ANALYSIS_CACHE_SIZE= int(os.getenv("PDF_ANALYSIS_CACHE_SIZE", "32"))
+
+Rect= Tuple[float, float, float, float]
+
+
+def sidecar_path(pdf_path: str)-> str:
+    return f"{pdf_path}{ANALYSIS_SUFFIX}"
+
+
+def file_stamp(path: str)-> Tuple[int, int]:
+    """(mtime_ns, size) identifying the revision of a file on disk."""
+    stat= os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def extract_page(page)-> Tuple[str, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Text and word boxes of a page from one text extraction.
+    Arguments:
+        page ---> fitz.Page: Page to extract.
+    Returns:
+        (text, boxes float32 (n, 4), spans int32 (n, 2), lines int32 (n,)):
+        the stripped page text, and for every word its rectangle, its
+        [start, end) character offsets in the text and a line id.
+    """
+    textpage= page.get_textpage()
+    text= page.get_text("text", textpage= textpage).strip()
+    words= page.get_text("words", textpage= textpage)
+
+    boxes, spans, lines= [], [], []
+    cursor= 0
+    line_id= -1
+    last_line= None
+    for x0, y0, x1, y1, word, block_no, line_no, _ in words:
+        start= text.find(word, cursor)
+        if start < 0:
+            continue
+        cursor= start + len(word)
+        if (block_no, line_no) != last_line:
+            line_id+= 1
+            last_line= (block_no, line_no)
+        boxes.append((x0, y0, x1, y1))
+        spans.append((start, cursor))
+        lines.append(line_id)
+    return (
+        text,
+        np.asarray(boxes, dtype= np.float32).reshape(-1, 4),
+        np.asarray(spans, dtype= np.int32).reshape(-1, 2),
+        np.asarray(lines, dtype= np.int32),
+    )
+
+
+def chunk_spans(text: str, chunks: List[str])-> np.ndarray:
+    """[index, start, end) of each chunk in the page text (start= -1 if not found)."""
+    rows= []
+    cursor= 0
+    for index, chunk in enumerate(chunks):
+        start= text.find(chunk, cursor)
+        if start < 0:
+            start= text.find(chunk)
+        if start < 0:
+            rows.append((index, -1, -1))
+            continue
+        rows.append((index, start, start + len(chunk)))
+        cursor= start + 1
+    return np.asarray(rows, dtype= np.int32).reshape(-1, 3)
+
+
+def page_record(page_num: int, text: str, boxes: np.ndarray, spans: np.ndarray,
+                lines: np.ndarray, chunks: np.ndarray)-> Dict:
+    """Picklable per-page analysis (returned by chunking workers)."""
+    return {"page_num": page_num, "text": text, "boxes": boxes, "spans": spans, "lines": lines, "chunks": chunks}
+
+
+class PDFAnalysis:
+    """
+    Page text, chunk offsets and word boxes of one PDF revision.
+    Built page by page during ingest (add_page) or loaded from a sidecar.
+    """
+
+    def __init__(self, page_count: int= 0, stamp: Optional[Tuple[int, int]]= None):
+        """
+        Arguments:
+            page_count ---> int: Number of pages in the PDF.
+            stamp ---> Tuple[int, int]: (mtime_ns, size) of the analyzed PDF.
+        """
+        self.page_count= page_count
+        self.stamp= tuple(stamp) if stamp else None
+        self._records: List[Dict]= []
+        self._arrays: Optional[Dict[str, np.ndarray]]= None
+        self._pages: Dict[int, int]= {}
+        self._chunks: Dict[Tuple[int, int], Tuple[int, int]]= {}
+
+    def add_page(self, record: Dict):
+        self._records.append(record)
+        self._arrays= None
+
+    def __len__(self)-> int:
+        return len(self._records) if self._arrays is None else len(self._arrays["page_nums"])
+
+    def _pack(self)-> Dict[str, np.ndarray]:
+        """Concatenate page records into flat arrays (the sidecar layout)."""
+        if self._arrays is not None:
+            return self._arrays
+        records= sorted(self._records, key= lambda r: r["page_num"])
+        texts= [r["text"].encode("utf-8") for r in records]
+        text_offsets= np.zeros(len(records) + 1, dtype= np.int64)
+        text_offsets[1:]= np.cumsum([len(t) for t in texts])
+        word_offsets= np.zeros(len(records) + 1, dtype= np.int64)
+        word_offsets[1:]= np.cumsum([len(r["spans"]) for r in records])
+        chunk_rows= [
+            np.column_stack([np.full(len(r["chunks"]), r["page_num"], dtype= np.int32), r["chunks"]])
+            for r in records
+        ]
+        self._arrays= {
+            "page_nums": np.asarray([r["page_num"] for r in records], dtype= np.int32),
+            "text": np.frombuffer(b"".join(texts), dtype= np.uint8),
+            "text_offsets": text_offsets,
+            "word_offsets": word_offsets,
+            "boxes": np.concatenate([r["boxes"] for r in records]) if records else np.zeros((0, 4), np.float32),
+            "spans": np.concatenate([r["spans"] for r in records]) if records else np.zeros((0, 2), np.int32),
+            "lines": np.concatenate([r["lines"] for r in records]) if records else np.zeros(0, np.int32),
+            "chunks": np.concatenate(chunk_rows) if chunk_rows else np.zeros((0, 4), np.int32),
+        }
+        self._index()
+        return self._arrays
+
+    def _index(self):
+        arrays= self._arrays
+        self._pages= {int(p): i for i, p in enumerate(arrays["page_nums"])}
+        self._chunks= {
+            (int(page), int(index)): (int(start), int(end))
+            for page, index, start, end in arrays["chunks"] if start >= 0
+        }
+
+    def save(self, path: str):
+        """Write the sidecar atomically."""
+        arrays= self._pack()
+        meta= {"version": ANALYSIS_VERSION, "page_count": self.page_count, "stamp": self.stamp}
+        tmp= f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, meta= np.frombuffer(json.dumps(meta).encode("utf-8"), dtype= np.uint8), **arrays)
+        os.replace(tmp, path)
+        logger.info(f"Saved PDF analysis ({len(self)} pages, {len(arrays['boxes'])} words) to {path}")
+
+    @classmethod
+    def load(cls, path: str)-> "PDFAnalysis":
+        with np.load(path, allow_pickle= False) as data:
+            meta= json.loads(data["meta"].tobytes().decode("utf-8"))
+            if meta.get("version") != ANALYSIS_VERSION:
+                raise ValueError(f"Unsupported PDF analysis version: {meta.get('version')}")
+            analysis= cls(meta["page_count"], meta.get("stamp"))
+            analysis._arrays= {key: data[key] for key in data.files if key != "meta"}
+        analysis._index()
+        return analysis
+
+    def page_text(self, page_num: int)-> Optional[str]:
+        arrays= self._pack()
+        i= self._pages.get(page_num)
+        if i is None:
+            return None
+        offsets= arrays["text_offsets"]
+        return arrays["text"][offsets[i]:offsets[i + 1]].tobytes().decode("utf-8")
+
+    def span_rects(self, page_num: int, start: int, end: int)-> List[Rect]:
+        """One rectangle per text line covering the words in [start, end) of the page text."""
+        arrays= self._pack()
+        i= self._pages.get(page_num)
+        if i is None or start < 0:
+            return []
+        lo, hi= arrays["word_offsets"][i], arrays["word_offsets"][i + 1]
+        spans= arrays["spans"][lo:hi]
+        hit= np.nonzero((spans[:, 0] < end) & (spans[:, 1] > start))[0]
+        if not len(hit):
+            return []
+        boxes= arrays["boxes"][lo:hi][hit]
+        lines= arrays["lines"][lo:hi][hit]
+        rects= []
+        for line in np.unique(lines):
+            line_boxes= boxes[lines == line]
+            rects.append((float(line_boxes[:, 0].min()), float(line_boxes[:, 1].min()),
+                          float(line_boxes[:, 2].max()), float(line_boxes[:, 3].max())))
+        return rects
+
+    def chunk_rects(self, page_num: int, chunk_id: str)-> List[Rect]:
+        """Stored boxes of a chunk ("<page>_<index>"), empty if unknown."""
+        self._pack()
+        _, _, index= str(chunk_id).rpartition("_")
+        if not index.isdigit():
+            return []
+        span= self._chunks.get((page_num, int(index)))
+        return self.span_rects(page_num, *span) if span else []
+
+    def snippet_rects(self, page_num: int, snippet: str)-> List[Rect]:
+        """Boxes of the first occurrence of a snippet in the stored page text."""
+        text= self.page_text(page_num)
+        snippet= (snippet or "").strip()
+        if not text or not snippet:
+            return []
+        start= text.find(snippet)
+        return self.span_rects(page_num, start, start + len(snippet)) if start >= 0 else []
+
+
+_loaded: "OrderedDict[str, PDFAnalysis]"= OrderedDict()
+_loaded_lock= threading.Lock()
+
+
+def load_analysis(pdf_path: str)-> Optional[PDFAnalysis]:
+    """
+    Sidecar analysis of a PDF, or None when there is none or it was built
+    from another revision of the file. Parsed sidecars are cached (LRU).
+    """
+    key= os.path.abspath(pdf_path)
+    try:
+        stamp= file_stamp(key)
+    except OSError:
+        return None
+    with _loaded_lock:
+        analysis= _loaded.get(key)
+        if analysis is not None and analysis.stamp == stamp:
+            _loaded.move_to_end(key)
+            return analysis
+    path= sidecar_path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        analysis= PDFAnalysis.load(path)
+    except Exception as e:
+        logger.warning(f"Could not read PDF analysis {path}: {e}")
+        return None
+    if analysis.stamp != stamp:
+        logger.info(f"PDF analysis {path} is stale; falling back to text search")
+        return None
+    with _loaded_lock:
+        _loaded[key]= analysis
+        while len(_loaded) > max(1, ANALYSIS_CACHE_SIZE):
+            _loaded.popitem(last= False)
+    return analysis
@@ -1,14 +1,262 @@
+"""
+services/pdf_utils.py
+
+PDF page rendering helpers for highlight previews.
+
+Open `fitz.Document` handles are kept in a small thread-safe pool (LRU, a few
+handles per file, reopened when the file's mtime/size changes), and rendered
+pages are encoded straight to bytes in memory.
+Highlight rectangles come from the word boxes stored at ingest
+(services/pdf_analysis.py); the page is only searched when no sidecar matches.
+"""
+
+import io
+import os
 import fitz
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple, Union
+from services.pdf_analysis import load_analysis
+
+try:
+    from PIL import Image
+except ImportError:  #optional, only needed for WebP output
+    Image= None
+
+#logging configuration
+logger= logging.getLogger(__name__)
+
+#document pool size (overridable from .env)
+PDF_POOL_SIZE= int(os.getenv("PDF_POOL_SIZE", "16"))
+#open handles per file, so different pages of one PDF can render in parallel
+PDF_POOL_HANDLES_PER_FILE= int(os.getenv("PDF_POOL_HANDLES_PER_FILE", "4"))
+
+
+class _PooledFile:
+    """Open handles of one PDF revision; each handle is used by one thread at a time."""
+
+    def __init__(self, path: str, stamp: Tuple[int, int], max_handles: int):
+        self.path= path
+        self.stamp= stamp
+        self.max_handles= max_handles
+        self.idle: List[fitz.Document]= []
+        self.in_use= 0
+        self.retired= False
+        self.cond= threading.Condition()
+
+    def acquire(self)-> Tuple[fitz.Document, bool]:
+        """Return (document, newly opened)."""
+        with self.cond:
+            while not self.idle and self.in_use >= self.max_handles:
+                self.cond.wait()
+            self.in_use+= 1
+            if self.idle:
+                return self.idle.pop(), False
+        try:
+            return fitz.open(self.path), True
+        except Exception:
+            with self.cond:
+                self.in_use-= 1
+                self.cond.notify()
+            raise
+
+    def release(self, doc: fitz.Document):
+        with self.cond:
+            self.in_use-= 1
+            if self.retired:
+                doc.close()
+            else:
+                self.idle.append(doc)
+            self.cond.notify()
+
+    def retire(self):
+        """Close idle handles now and in-use handles when they are released."""
+        with self.cond:
+            self.retired= True
+            for doc in self.idle:
+                doc.close()
+            self.idle.clear()
+            self.cond.notify_all()
+
+
+class DocumentPool:
+    """
+    Thread-safe pool of open fitz Documents keyed by path.
+    Up to `handles_per_file` handles are kept per file so pages of the same PDF
+    can be rendered concurrently. Least recently used files are closed beyond
+    `max_open`, and a file is reopened when its mtime or size changed.
+    """
+
+    def __init__(self, max_open: int= PDF_POOL_SIZE, handles_per_file: int= PDF_POOL_HANDLES_PER_FILE):
+        """
+        Arguments:
+            max_open ---> int: Maximum number of files kept open.
+            handles_per_file ---> int: Maximum concurrent handles per file.
+        """
+        self.max_open= max(1, max_open)
+        self.handles_per_file= max(1, handles_per_file)
+        self._files: "OrderedDict[str, _PooledFile]"= OrderedDict()
+        self._lock= threading.Lock()
+        self.hits= 0
+        self.opens= 0
+
+    @staticmethod
+    def _stamp(path: str)-> Tuple[int, int]:
+        stat= os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _get(self, path: str)-> _PooledFile:
+        key= os.path.abspath(path)
+        stamp= self._stamp(key)
+        retired= []
+        with self._lock:
+            entry= self._files.get(key)
+            if entry is not None and entry.stamp == stamp:
+                self._files.move_to_end(key)
+                return entry
+            if entry is not None:
+                retired.append(self._files.pop(key))
+            entry= _PooledFile(key, stamp, self.handles_per_file)
+            self._files[key]= entry
+            while len(self._files) > self.max_open:
+                retired.append(self._files.popitem(last= False)[1])
+        for old in retired:
+            old.retire()
+        return entry
+
+    @contextmanager
+    def open(self, path: str)-> Iterator[fitz.Document]:
+        """Borrow an open handle for `path` (exclusive while the block runs)."""
+        entry= self._get(path)
+        doc, opened= entry.acquire()
+        with self._lock:
+            if opened:
+                self.opens+= 1
+            else:
+                self.hits+= 1
+        try:
+            yield doc
+        finally:
+            entry.release(doc)
+
+    def close(self):
+        with self._lock:
+            entries= list(self._files.values())
+            self._files.clear()
+        for entry in entries:
+            entry.retire()
+
+    def stats(self)-> dict:
+        with self._lock:
+            return {
+                "files": len(self._files),
+                "handles": sum(len(e.idle) + e.in_use for e in self._files.values()),
+                "hits": self.hits,
+                "opens": self.opens,
+            }
+
+
+#shared by the render endpoints
+document_pool= DocumentPool()
+
+
+def encode_pixmap(pix: "fitz.Pixmap", fmt: str= "png", quality: int= 80)-> bytes:
+    """
+    Encode a pixmap in memory as PNG, JPEG or WebP.
+    WebP needs Pillow; PNG and JPEG are encoded by PyMuPDF itself.
+    """
+    if fmt == "png":
+        return pix.tobytes("png")
+    if fmt == "jpeg":
+        return pix.tobytes("jpeg", jpg_quality= quality)
+    if fmt == "webp":
+        if Image is None:
+            raise ValueError("WebP output requires Pillow (pip install pillow)")
+        image= Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+        out= io.BytesIO()
+        image.save(out, format= "WEBP", quality= quality, method= 4)
+        return out.getvalue()
+    raise ValueError(f"Unsupported image format: {fmt}")
+
+
+def _stored_rects(pdf_path: str, page_num: int, snippets: List[str],
+                  chunk_ids: List[Optional[str]])-> List[Optional[list]]:
+    """Per snippet: rectangles from the ingest sidecar, or None when they have to be searched."""
+    analysis= load_analysis(pdf_path)
+    if analysis is None:
+        return [None] * len(snippets)
+    found= []
+    for snippet, chunk_id in zip(snippets, chunk_ids):
+        rects= analysis.chunk_rects(page_num, chunk_id) if chunk_id else []
+        found.append(rects or analysis.snippet_rects(page_num, snippet) or None)
+    return found
+
+
+def render_page_highlight(pdf_path: str, page_num: int, snippets: Union[str, List[str]], dpi: int= 150,
+                          fmt: str= "png", quality: int= 80, max_width: Optional[int]= None,
+                          crop: bool= False, margin: float= 24,
+                          chunk_ids: Optional[List[Optional[str]]]= None)-> bytes:
+    """
+    Highlight the snippet(s) on a page and return the rendered image bytes.
+    Several snippets on the same page are drawn in a single rasterization.
+    A snippet with a chunk id highlights that whole chunk from the stored word boxes;
+    other snippets use the stored page text, and the page is searched only as a fallback.
+    Annotations are removed again afterwards, so the pooled document is left unchanged.
+    Arguments:
+        pdf_path ---> str: Path of the PDF.
+        page_num ---> int: 1-indexed page number.
+        snippets ---> str | List[str]: Text(s) to highlight.
+        chunk_ids ---> List[str]: Optional chunk id per snippet ("<page>_<index>").
+        dpi ---> int: Render resolution.
+        fmt ---> str: "png", "jpeg" or "webp".
+        quality ---> int: JPEG/WebP quality (1-100).
+        max_width ---> int: Downscale so the image is at most this many pixels wide.
+        crop ---> bool: Render only the bounding box of the hits (plus `margin`), full page if nothing matched.
+        margin ---> float: Margin around the cropped region, in PDF points.
+    """
+    if isinstance(snippets, str):
+        snippets= [snippets]
+    stored= _stored_rects(pdf_path, page_num, snippets, chunk_ids or [None] * len(snippets))
+    with document_pool.open(pdf_path) as doc:
+        page= doc.load_page(page_num - 1)  # 0-indexed
+        annots= []
+        hits= []
+        try:
+            for snippet, rects in zip(snippets, stored):
+                rects= [fitz.Rect(r) for r in rects] if rects else page.search_for(snippet)
+                if not rects:
+                    continue
+                highlight= page.add_highlight_annot(rects)
+                highlight.update()
+                annots.append(highlight)
+                hits.extend(rects)
+
+            clip= page.rect
+            if crop and hits:
+                region= fitz.Rect(hits[0])
+                for rect in hits[1:]:
+                    region|= rect
+                clip= fitz.Rect(region.x0 - margin, region.y0 - margin,
+                                region.x1 + margin, region.y1 + margin) & page.rect
+
+            zoom= dpi / 72
+            if max_width and clip.width * zoom > max_width:
+                zoom= max_width / clip.width
+            pix= page.get_pixmap(matrix= fitz.Matrix(zoom, zoom), clip= clip, alpha= False)
+        finally:
+            for annot in annots:
+                page.delete_annot(annot)
+        return encode_pixmap(pix, fmt, quality)
+
 
-from typing import List, Tuple
-
-def highlight_text_on_page(pdf_path: str, page_num: int, snippet: str, out_path: str):
-    doc = fitz.open(pdf_path)
-    page = doc.load_page(page_num - 1)  # 0-indexed
-    text_instances = page.search_for(snippet)
-    for inst in text_instances:
-        highlight = page.add_highlight_annot(inst)
-        highlight.update()
-    pix = page.get_pixmap(dpi=150)
-    pix.save(out_path)
-    doc.close()
\ No newline at end of file
+def highlight_text_on_page(pdf_path: str, page_num: int, snippet: str, out_path: Optional[str]= None):
+    """
+    Render a highlighted page as PNG; writes it to `out_path` when given, otherwise returns the bytes.
+    """
+    png= render_page_highlight(pdf_path, page_num, snippet)
+    if out_path is None:
+        return png
+    with open(out_path, "wb") as f:
+        f.write(png)
@@ -0,0 +1,116 @@
+"""
+services/pipeline.py
+
+Small helpers for streaming ingest: items flow from one stage to the next
+through bounded queues, so memory use depends on the queue sizes and not on
+the size of the document being processed.
+"""
+
+import queue
+import logging
+import threading
+from typing import Callable, Iterable, Iterator, List, TypeVar
+
+#logging configuration
+logger= logging.getLogger(__name__)
+
+T= TypeVar("T")
+R= TypeVar("R")
+
+_DONE= object()
+
+
+class _StageError:
+    """Wraps an exception raised inside a stage thread so the consumer can re-raise it."""
+    def __init__(self, error: BaseException):
+        self.error= error
+
+
+def batched(items: Iterable[T], size: int)-> Iterator[List[T]]:
+    """Group an iterable into lists of at most `size` items."""
+    batch= []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch= []
+    if batch:
+        yield batch
+
+
+def _put(q: "queue.Queue", item, stop: threading.Event)-> bool:
+    """Put with back-pressure; gives up (returns False) once the consumer has stopped."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout= 0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def pipelined(items: Iterable[T], fn: Callable[[T], R], workers: int= 1, queue_size: int= 4)-> Iterator[R]:
+    """
+    Apply `fn` to every item on `workers` background threads and yield results
+    as they complete (not necessarily in input order).
+
+    `items` is consumed on its own thread, so producing items, running `fn`
+    and consuming results all overlap. Both queues are bounded by `queue_size`,
+    which applies back-pressure to the producer. An exception in any stage is
+    re-raised in the consumer; closing the generator early stops all threads.
+
+    Arguments:
+        items ---> Iterable: Input items (may be a lazy generator).
+        fn ---> Callable: Work applied to each item.
+        workers ---> int: Number of threads running `fn`.
+        queue_size ---> int: Capacity of the input and output queues.
+    """
+    workers= max(1, workers)
+    in_q= queue.Queue(maxsize= max(1, queue_size))
+    out_q= queue.Queue(maxsize= max(1, queue_size))
+    stop= threading.Event()
+
+    def feed():
+        try:
+            for item in items:
+                if not _put(in_q, item, stop):
+                    return
+        except BaseException as e:
+            _put(out_q, _StageError(e), stop)
+        finally:
+            for _ in range(workers):
+                _put(in_q, _DONE, stop)
+
+    def work():
+        while not stop.is_set():
+            try:
+                item= in_q.get(timeout= 0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                _put(out_q, _DONE, stop)
+                return
+            try:
+                result= fn(item)
+            except BaseException as e:
+                result= _StageError(e)
+            if not _put(out_q, result, stop):
+                return
+
+    threads= [threading.Thread(target= feed, name= "pipeline-feed", daemon= True)]
+    threads+= [threading.Thread(target= work, name= f"pipeline-work-{i}", daemon= True) for i in range(workers)]
+    for t in threads:
+        t.start()
+
+    finished= 0
+    try:
+        while finished < workers:
+            result= out_q.get()
+            if result is _DONE:
+                finished+= 1
+            elif isinstance(result, _StageError):
+                raise result.error
+            else:
+                yield result
+    finally:
+        stop.set()
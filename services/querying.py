@@ -6,9 +6,17 @@ Integrates Ollama, neo4j and langfuse prompt management.
 """
 
 import os
+import re
 import time
+import hashlib
+import asyncio
 import logging
-from typing import List, Optional
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+import numpy as np
 
 from langchain_ollama import OllamaLLM, OllamaEmbeddings
 from langchain_neo4j import Neo4jVector
@@ -17,7 +25,18 @@ from langfuse.langchain import CallbackHandler as LfHandler
 from dotenv import load_dotenv
 from fastapi import HTTPException
 from langchain_core.documents import Document
-from services.storage import Neo4jStorage
+from services.storage import (
+    Neo4jStorage, VECTOR_SEARCH_CYPHER, scoped_search_cypher,
+    fulltext_search_cypher, fulltext_search_params
+)
+from services.vector_index import VECTOR_INDEX_MODE, get_local_index
+from services.context_packing import CONTEXT_PACKING, ContextPacker
+from services.metrics import (
+    LLM_TOKENS, PROMPT_TEMPLATE_AGE, PROMPT_TEMPLATE_REFRESHES, PROMPT_TEMPLATE_STALE_SERVED,
+    QUERY_STAGE_SECONDS, REGISTRY,
+)
+from services.lifecycle import OLLAMA_KEEP_ALIVE
+from services.neo4j_drivers import SharedGraph, neo4j_drivers
 
 #logging configuration
 
@@ -26,6 +45,434 @@ logger= logging.getLogger(__name__)
 #Environment Set-up
 load_dotenv()
 
+#semantic answer cache settings (overridable from .env)
+SEMANTIC_CACHE_ENABLED= os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_THRESHOLD= float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_MAX_ENTRIES= int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "256"))
+SEMANTIC_CACHE_TTL= float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+#ingest generations shared by the workers of a host (empty = this process only)
+SEMANTIC_CACHE_SHARED_DIR= os.getenv("SEMANTIC_CACHE_SHARED_DIR", "semantic_cache")
+
+#prompt template cache settings (overridable from .env)
+PROMPT_CACHE_TTL= float(os.getenv("LANGFUSE_PROMPT_TTL", "300"))
+PROMPT_REFRESH_INTERVAL= float(os.getenv("LANGFUSE_PROMPT_REFRESH_INTERVAL", "60"))
+
+#retrieval settings (overridable from .env)
+RETRIEVAL_MODE= os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+HYBRID_CANDIDATES= int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K= int(os.getenv("RRF_K", "60"))
+LEXICAL_MAX_TOKENS= int(os.getenv("LEXICAL_MAX_TOKENS", "4"))
+
+#per-stage latency metrics (served by /metrics)
+_EMBED_SECONDS= QUERY_STAGE_SECONDS.labels(stage= "query_embedding")
+_VECTOR_SEARCH_SECONDS= QUERY_STAGE_SECONDS.labels(stage= "vector_search")
+_FULLTEXT_SEARCH_SECONDS= QUERY_STAGE_SECONDS.labels(stage= "fulltext_search")
+_PROMPT_FETCH_SECONDS= QUERY_STAGE_SECONDS.labels(stage= "prompt_fetch")
+_PROMPT_BUILD_SECONDS= QUERY_STAGE_SECONDS.labels(stage= "prompt_build")
+_LLM_SECONDS= QUERY_STAGE_SECONDS.labels(stage= "llm_generation")
+_LLM_FIRST_TOKEN_SECONDS= QUERY_STAGE_SECONDS.labels(stage= "llm_first_token")
+_LLM_TOKENS= LLM_TOKENS.labels()
+_PROMPT_REFRESH_OK= PROMPT_TEMPLATE_REFRESHES.labels(result= "success")
+_PROMPT_REFRESH_FAILED= PROMPT_TEMPLATE_REFRESHES.labels(result= "failure")
+_PROMPT_STALE_SERVED= PROMPT_TEMPLATE_STALE_SERVED.labels()
+
+GLOBAL_SCOPE= "__all_projects__"
+SCOPE_SEPARATOR= "::"
+
+
+def cache_scope(project_name: Optional[str]= None, pdf_names: Optional[List[str]]= None)-> str:
+    """
+    Semantic cache scope of a query: its project, plus the selected PDFs if any.
+    The project always comes first so `SemanticCache.invalidate(project)` can find it.
+    """
+    scope= project_name or GLOBAL_SCOPE
+    if pdf_names:
+        scope= f"{scope}{SCOPE_SEPARATOR}{'|'.join(sorted(set(pdf_names)))}"
+    return scope
+
+
+#tokens that carry their meaning in the exact characters: part numbers,
+#error codes, versions and identifiers (a lone acronym or number is not enough)
+_IDENTIFIER_PATTERNS= (
+    re.compile(r"^(?=.*\d)(?=.*[A-Za-z])[\w\-./:#]+$"),   #ERR-1042, v2.3.1, x86_64, 0x80070005
+    re.compile(r"^\d+(?:[.\-/:]\d+){2,}$"),               #2.3.1, 2024-01-31
+    re.compile(r"^[A-Za-z]\w*_\w+$"),                      #snake_case
+)
+
+#function words ignored when deciding whether a query is only identifiers
+_STOPWORDS= frozenset("""
+a an and are as at be by can do does for from how i in is it me of on or show the
+to was what when where which who why with
+""".split())
+
+
+def _is_identifier(token: str)-> bool:
+    return any(p.search(token) for p in _IDENTIFIER_PATTERNS)
+
+
+def is_lexical_query(question: str)-> bool:
+    """
+    True for queries that are clearly looking for an exact string: a quoted
+    phrase, or a few words where every non-stopword is a code or identifier
+    ("ERR-1042", "where is v2.3.1"). Such queries are answered from the
+    full-text index without embedding; everything else ("What is RAG?")
+    goes through hybrid retrieval.
+    """
+    text= question.strip()
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "\"'":
+        return True
+    tokens= [t.strip(".,;!?()[]{}'\"") for t in text.split()]
+    tokens= [t for t in tokens if t]
+    if not tokens or len(tokens) > LEXICAL_MAX_TOKENS:
+        return False
+    terms= [t for t in tokens if t.lower() not in _STOPWORDS]
+    return bool(terms) and all(_is_identifier(t) for t in terms)
+
+
+def _doc_key(doc: Document)-> tuple:
+    meta= doc.metadata or {}
+    if meta.get("pdf_name") is not None and meta.get("chunk_id") is not None:
+        return (meta.get("project"), meta["pdf_name"], meta["chunk_id"])
+    return (meta.get("pdf_path"), meta.get("page_num"), doc.page_content)
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], k: int= RRF_K)-> List[Document]:
+    """
+    Fuse ranked lists with reciprocal rank fusion: score(d) = sum 1 / (k + rank(d)).
+    Only ranks are used, so BM25 and cosine scores need no normalization.
+    The fused score is stored in metadata["rrf_score"].
+    """
+    scores: Dict[tuple, float]= {}
+    docs: Dict[tuple, Document]= {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start= 1):
+            key= _doc_key(doc)
+            scores[key]= scores.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    ordered= sorted(scores, key= lambda key: -scores[key])
+    for key in ordered:
+        docs[key].metadata["rrf_score"]= round(scores[key], 6)
+    return [docs[key] for key in ordered]
+
+
+def _records_to_documents(records: List[dict])-> List[Document]:
+    return [
+        Document(
+            page_content= r.get("text") or "",
+            metadata= {key: r.get(key) for key in ("project", "pdf_name", "page_num", "pdf_path", "chunk_id", "score")}
+        )
+        for r in records
+    ]
+
+#Langfuse prompt template cache
+class PromptTemplateCache:
+    """
+    In-process cache of the Langfuse prompt template.
+
+    - The first request fetches the template synchronously.
+    - A daemon thread refreshes it every `refresh_interval` seconds.
+    - A template older than `ttl` triggers a background refresh but is still
+      served (stale-while-revalidate), so a slow or unreachable Langfuse host
+      never adds latency to queries once a template has been loaded.
+    Cache age, refresh failures and stale serves are exposed through `stats()`
+    and, once started, on /metrics (rag_prompt_template_*).
+    """
+
+    def __init__(self, fetch: Callable[[], object], ttl: float= PROMPT_CACHE_TTL,
+                 refresh_interval: float= PROMPT_REFRESH_INTERVAL):
+        """
+        Arguments:
+            fetch ---> Callable: Fetches the template from Langfuse, raises on failure.
+            ttl ---> float: Age in seconds after which the template is considered stale.
+            refresh_interval ---> float: Seconds between background refreshes (0 disables the timer).
+        """
+        self._fetch= fetch
+        self.ttl= ttl
+        self.refresh_interval= refresh_interval
+        self._template= None
+        self._loaded_at: Optional[float]= None
+        self._lock= threading.Lock()
+        self._refreshing= threading.Event()
+        self._stop= threading.Event()
+        self._thread: Optional[threading.Thread]= None
+        self._started= False
+        self.refresh_successes= 0
+        self.refresh_failures= 0
+        self.stale_served= 0
+        self.last_error: Optional[str]= None
+        self._last_failure: Optional[float]= None
+
+    def start(self):
+        """Start the background refresh timer and export the cache metrics on /metrics."""
+        if self._started:
+            return
+        self._started= True
+        REGISTRY.add_collector(self.collect_metrics)
+        if self.refresh_interval > 0:
+            self._thread= threading.Thread(target= self._run, name= "prompt-refresh", daemon= True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh()
+
+    def refresh(self)-> bool:
+        """Fetch the template now; keeps the previous one on failure."""
+        try:
+            template= self._fetch()
+        except Exception as e:
+            with self._lock:
+                self.refresh_failures+= 1
+                self.last_error= str(e)
+                self._last_failure= time.time()
+            _PROMPT_REFRESH_FAILED.inc()
+            logger.warning(f"Langfuse prompt refresh failed, keeping cached template: {e}")
+            return False
+        with self._lock:
+            self._template= template
+            self._loaded_at= time.time()
+            self.refresh_successes+= 1
+            self.last_error= None
+        _PROMPT_REFRESH_OK.inc()
+        return True
+
+    def _refresh_async(self):
+        """Kick off a single background refresh (no-op if one is already running)."""
+        if self._refreshing.is_set():
+            return
+        self._refreshing.set()
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing.clear()
+        threading.Thread(target= run, name= "prompt-revalidate", daemon= True).start()
+
+    def get(self):
+        """Return the cached template (possibly stale), or None if it was never loaded."""
+        with self._lock:
+            template, loaded_at, last_failure= self._template, self._loaded_at, self._last_failure
+        if loaded_at is None:
+            #never loaded: fetch inline, unless Langfuse just failed (then retry in the background)
+            if last_failure is not None and time.time() - last_failure < min(self.ttl, 30):
+                self._refresh_async()
+                return None
+            self.refresh()
+            with self._lock:
+                return self._template
+        if time.time() - loaded_at > self.ttl:
+            with self._lock:
+                self.stale_served+= 1
+            _PROMPT_STALE_SERVED.inc()
+            self._refresh_async()
+        return template
+
+    def stats(self)-> dict:
+        with self._lock:
+            return {
+                "loaded": self._loaded_at is not None,
+                "age_seconds": round(time.time() - self._loaded_at, 1) if self._loaded_at else None,
+                "ttl_seconds": self.ttl,
+                "refresh_successes": self.refresh_successes,
+                "refresh_failures": self.refresh_failures,
+                "stale_served": self.stale_served,
+                "last_error": self.last_error,
+            }
+
+    def collect_metrics(self):
+        """Refresh the template age gauge (runs before every /metrics render)."""
+        with self._lock:
+            loaded_at= self._loaded_at
+        PROMPT_TEMPLATE_AGE.set(time.time() - loaded_at if loaded_at else -1)
+
+#Semantic answer cache
+class SemanticCache:
+    """
+    Cache of answered queries keyed by query embedding, prompt version, top_k
+    and ingest generation.
+
+    A new query reuses a cached answer (and its chunks) when a past query of the
+    same project, prompt version and top_k has cosine similarity >= `threshold`.
+    Entries are kept per project with LRU eviction (`max_entries` per project)
+    and expire after `ttl` seconds. `invalidate(project)` drops a project's
+    entries; ingestion calls it whenever new chunks are written.
+
+    Each process has its own cache, so `invalidate` also bumps the project's
+    ingest generation, a small file in `shared_dir`. Entries answered under an
+    older generation are not served, which makes an upload handled by one
+    worker invalidate the answers cached by the others on the same host.
+    """
+
+    def __init__(self, threshold: float= SEMANTIC_CACHE_THRESHOLD,
+                 max_entries: int= SEMANTIC_CACHE_MAX_ENTRIES,
+                 ttl: float= SEMANTIC_CACHE_TTL, shared_dir: Optional[str]= SEMANTIC_CACHE_SHARED_DIR):
+        """
+        Arguments:
+            threshold ---> float: Cosine similarity from which a past query's answer is reused.
+            max_entries ---> int: Cached answers kept per scope (LRU).
+            ttl ---> float: Seconds a cached answer is served.
+            shared_dir ---> str: Directory holding the ingest generations shared with other workers (None = process only).
+        """
+        self.threshold= threshold
+        self.max_entries= max(1, max_entries)
+        self.ttl= ttl
+        self.shared_dir= Path(shared_dir) if shared_dir else None
+        self.hits= 0
+        self.misses= 0
+        self._lock= threading.Lock()
+        self._next_id= 0
+        #project -> OrderedDict[id, entry], in LRU order
+        self._entries: Dict[str, "OrderedDict[int, dict]"]= {}
+        #project -> (ids, normalized embedding matrix), rebuilt lazily after changes
+        self._matrices: Dict[str, tuple]= {}
+
+    @staticmethod
+    def _normalize(embedding: List[float])-> np.ndarray:
+        vector= np.asarray(embedding, dtype= np.float32)
+        norm= np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _matrix(self, project: str):
+        """(ids, matrix) of a project's entries; caller holds the lock."""
+        if project not in self._matrices:
+            entries= self._entries.get(project) or {}
+            ids= list(entries)
+            matrix= np.stack([entries[i]["vector"] for i in ids]) if ids else None
+            self._matrices[project]= (ids, matrix)
+        return self._matrices[project]
+
+    def _drop(self, project: str, entry_id: int):
+        del self._entries[project][entry_id]
+        self._matrices.pop(project, None)
+
+    def _generation_path(self, project: str)-> Optional[Path]:
+        if self.shared_dir is None:
+            return None
+        return self.shared_dir / f"{hashlib.sha1(project.encode('utf-8')).hexdigest()}.generation"
+
+    def generation(self, scope: str)-> str:
+        """
+        Ingest generation of a cache scope (of its project); read it before
+        retrieval and pass it to `lookup` and `store`.
+        """
+        path= self._generation_path(scope.split(SCOPE_SEPARATOR, 1)[0])
+        if path is None:
+            return ""
+        try:
+            return path.read_text(encoding= "utf-8")
+        except FileNotFoundError:
+            return ""
+        except OSError as e:
+            logger.warning(f"Semantic cache generation unreadable ({path}): {e}")
+            return ""
+
+    def _bump_generation(self, project: str):
+        path= self._generation_path(project)
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents= True, exist_ok= True)
+            tmp= path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp.write_text(f"{time.time_ns()}-{os.getpid()}", encoding= "utf-8")
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Semantic cache generation not shared with other workers ({path}): {e}")
+
+    def lookup(self, project: str, embedding: List[float], prompt_version: str, top_k: int,
+               generation: str= "")-> Optional[dict]:
+        """
+        Return the cached result of the most similar past query, or None.
+        Arguments:
+            project ---> str: Project scope of the query.
+            embedding ---> List[float]: Query embedding.
+            prompt_version ---> str: Version of the prompt template used to answer.
+            top_k ---> int: Chunks retrieved for the answer.
+            generation ---> str: Ingest generation of the scope (see `generation`).
+        """
+        if not embedding:
+            return None
+        query= self._normalize(embedding)
+        now= time.time()
+        with self._lock:
+            entries= self._entries.get(project)
+            if entries:
+                expired= [i for i, e in entries.items()
+                          if now - e["created"] > self.ttl or e["generation"] != generation]
+                for i in expired:
+                    self._drop(project, i)
+                ids, matrix= self._matrix(project)
+                if ids and matrix.shape[1] == query.shape[0]:
+                    scores= matrix @ query
+                    for index in np.argsort(-scores):
+                        if scores[index] < self.threshold:
+                            break
+                        entry= entries[ids[index]]
+                        if entry["prompt_version"] != prompt_version or entry["top_k"] != top_k:
+                            continue
+                        entries.move_to_end(ids[index])
+                        self.hits+= 1
+                        logger.info(f"Semantic cache hit (similarity {scores[index]:.3f}) for project '{project}'.")
+                        return entry["result"]
+            self.misses+= 1
+            return None
+
+    def store(self, project: str, embedding: List[float], prompt_version: str, top_k: int,
+              result: dict, generation: str= ""):
+        """Cache the answer of a query (`generation` as read before its retrieval)."""
+        if not embedding:
+            return
+        with self._lock:
+            entries= self._entries.setdefault(project, OrderedDict())
+            self._next_id+= 1
+            entries[self._next_id]= {
+                "vector": self._normalize(embedding),
+                "prompt_version": prompt_version,
+                "top_k": top_k,
+                "generation": generation,
+                "result": result,
+                "created": time.time(),
+            }
+            while len(entries) > self.max_entries:
+                entries.popitem(last= False)
+            self._matrices.pop(project, None)
+
+    def invalidate(self, project: Optional[str]= None):
+        """
+        Drop cached answers of a project, including its PDF-scoped queries (and
+        of unscoped queries, which search every project). With no project, clear
+        everything (in this process only). Other workers drop theirs on their next lookup.
+        """
+        if project is not None:
+            self._bump_generation(project)
+            self._bump_generation(GLOBAL_SCOPE)
+        with self._lock:
+            if project is None:
+                self._entries.clear()
+                self._matrices.clear()
+            else:
+                #PDF-scoped entries are keyed "<project>::<pdfs>"
+                for scope in list(self._entries):
+                    if scope.split(SCOPE_SEPARATOR, 1)[0] in (project, GLOBAL_SCOPE):
+                        self._entries.pop(scope, None)
+                        self._matrices.pop(scope, None)
+        logger.info(f"Semantic cache invalidated for project '{project or 'all'}'.")
+
+    def stats(self)-> dict:
+        with self._lock:
+            return {
+                "entries": sum(len(e) for e in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+#shared by the query pipeline and the ingest path (for invalidation)
+semantic_cache= SemanticCache()
+
 #RAG Pipeline
 
 class RAGPipeline:
@@ -73,53 +520,128 @@ class RAGPipeline:
             self.langfuse= None
             self.lf_handler= None
 
+        #prompt template cache with background refresh
+        self.prompt_cache= PromptTemplateCache(self._fetch_prompt_template) if self.langfuse else None
+        if self.prompt_cache:
+            self.prompt_cache.start()
+
         # LLM and Embeddings Initialization
         try:
-            self.llm = OllamaLLM(model=self.llm, callbacks=[self.lf_handler] if self.lf_handler else None)
-            self.embeddings = OllamaEmbeddings(model=self.embedding_model)
+            #keep_alive keeps both models resident between queries (see services/lifecycle.py warm-up)
+            self.llm = OllamaLLM(model=self.llm, callbacks=[self.lf_handler] if self.lf_handler else None,
+                                 keep_alive=OLLAMA_KEEP_ALIVE)
+            self.embeddings = OllamaEmbeddings(model=self.embedding_model, keep_alive=OLLAMA_KEEP_ALIVE)
             logger.info(f"Ollama models loaded from .env: LLM={self.llm}, Embeddings={self.embedding_model}")
         except Exception as e:
             logger.error(f"Failed to initialize Ollama models: {e}")
             raise
 
-        # Neo4j Connection Setup
-        try:
-            self.vector_index = Neo4jVector(
-                embedding=self.embeddings,
-                url=self.neo4j_uri,
-                username=self.neo4j_user,
-                password=self.neo4j_password,
-                node_label="Chunk",
-                text_node_property="text",
-                embedding_node_property="embedding",
-                index_name=self.neo4j_index_name,
-                #metadata_properties= ["pdf_name", "pdf_num", "pdf_path"]
-            )
-            try:
-                self.vector_index.metdata_keys= ["pdf_name", "page_num", "pdf_path"]
-                logger.info("Metadata properties added manually for Neo4j vector.")
-            except Exception:
-                logger.warning("Neo4jVector metadata patch not applied — using default properties.")
-            logger.info("Connected to Neo4jVector index successfully.")
+        #dedupe/merge/budget retrieved chunks before they go into the prompt
+        self.context_packer= ContextPacker() if CONTEXT_PACKING else None
+
+        #local ANN index mirror (primary path or Neo4j-down fallback)
+        self.local_index= get_local_index()
+        self.storage= None
+
+        # Neo4j Connection Setup (retried by the app's startup task while Neo4j is down, see main.py)
+        self.vector_index= None
+        try:
+            self.connect_neo4j()
         except Exception as e:
             logger.error(f"Neo4jVector initialization failed: {e}")
-            self.vector_index = None
             self.storage = Neo4jStorage(uri=self.neo4j_uri, user=self.neo4j_user, password=self.neo4j_password)
 
+        # Async Neo4j driver for the non-blocking query path (shared, see services/neo4j_drivers.py)
+        try:
+            self.async_driver= neo4j_drivers.get_async(self.neo4j_uri, self.neo4j_user, self.neo4j_password)
+            logger.info("Async Neo4j driver ready.")
+        except Exception as e:
+            logger.error(f"Async Neo4j driver initialization failed: {e}")
+            self.async_driver= None
+
+    def connect_neo4j(self):
+        """
+        Connect the Neo4jVector index on the process-wide driver shared with ingestion.
+        Raises while Neo4j is unreachable (queries meanwhile use the local index / storage
+        fallback). Once connected, an empty local index is filled from Neo4j in the background.
+        """
+        if self.vector_index is not None:
+            return
+        driver = neo4j_drivers.get(self.neo4j_uri, self.neo4j_user, self.neo4j_password)
+        #fail fast when Neo4j is down (Neo4jVector skips this check for a given graph and retries instead)
+        driver.verify_connectivity()
+        vector_index = Neo4jVector(
+            embedding=self.embeddings,
+            graph=SharedGraph(driver),
+            node_label="Chunk",
+            text_node_property="text",
+            embedding_node_property="embedding",
+            index_name=self.neo4j_index_name,
+            #metadata_properties= ["pdf_name", "pdf_num", "pdf_path"]
+        )
+        try:
+            vector_index.metdata_keys= ["pdf_name", "page_num", "pdf_path"]
+            logger.info("Metadata properties added manually for Neo4j vector.")
+        except Exception:
+            logger.warning("Neo4jVector metadata patch not applied — using default properties.")
+        self.vector_index = vector_index
+        logger.info("Connected to Neo4jVector index successfully.")
+
+        #fill an empty local index from Neo4j in the background
+        if self.local_index is not None and self.local_index.is_empty():
+            threading.Thread(target= self._bootstrap_local_index, name= "local-index-bootstrap", daemon= True).start()
+
+    def _bootstrap_local_index(self):
+        """Load every embedded chunk from Neo4j into the (empty) local index."""
+        storage= self.storage or Neo4jStorage(uri=self.neo4j_uri, user=self.neo4j_user, password=self.neo4j_password)
+        try:
+            start= time.time()
+            if self.local_index.rebuild(storage.iter_chunks()):
+                logger.info(f"Local vector index built from Neo4j ({len(self.local_index)} chunks) in {round(time.time()-start,2)}s.")
+        except Exception as e:
+            logger.warning(f"Local vector index bootstrap from Neo4j failed: {e}")
+        finally:
+            if storage is not self.storage:
+                storage.close()
+
     #langfuse prompt loader
-    def get_langfuse_prompt(self, context: str, question: str):
+    def _fetch_prompt_template(self):
         """
-        Retrives and compiles a  prompt from langfuse.
+        Fetch the prompt template from langfuse (used by the template cache); raises on failure.
         """
         prompt_name= os.getenv("LANGFUSE_PROMPT_NAME", "semantic_query_prompt")
         logger.info(f"Fetching Lnagfuse Prompt '{prompt_name}'...")
+        return self.langfuse.get_prompt(prompt_name, label= "production")
 
-        if not self.langfuse:
+    def get_prompt_template(self):
+        """
+        Return the cached prompt template; None if langfuse is unavailable.
+        """
+        if not self.prompt_cache:
             logger.warning("Langfuse not initialized. Using default prompt.")
+            return None
+        with _PROMPT_FETCH_SECONDS.time():
+            return self.prompt_cache.get()
+
+    @staticmethod
+    def prompt_version(prompt_template)-> str:
+        """Identifier of the prompt template, used to scope cached answers."""
+        if prompt_template is None:
+            return "default"
+        return f"{getattr(prompt_template, 'name', 'prompt')}:v{getattr(prompt_template, 'version', 0)}"
+
+    def get_langfuse_prompt(self, context: str, question: str, prompt_template= None):
+        """
+        Retrives and compiles a  prompt from langfuse.
+        An already fetched `prompt_template` can be passed to skip the fetch.
+        """
+        if prompt_template is None:
+            prompt_template= self.get_prompt_template()
+
+        if prompt_template is None:
             return f"Use the following context to answer accurately:\n{context}\n\nQuestion: {question}"
 
         try:
-            prompt_template= self.langfuse.get_prompt(prompt_name, label= "production")
             compiled= prompt_template.compile(context= context, question= question)
 
             if isinstance(compiled, dict) and "messages" in compiled:
@@ -133,38 +655,213 @@ class RAGPipeline:
             logger.info("Langfuse Prompt Compiled Successfully.")
             return chat_input
         except Exception as e:
-            logger.error(f"LangFuse Prompt fetching failed: {e}")
+            logger.error(f"LangFuse Prompt compiling failed: {e}")
             return f"Use the following context to answer accurately:\n{context}\n\nQuestion: {question}"
 
+    #query embedding
+    async def _aembed_query(self, question: str)-> List[float]:
+        with _EMBED_SECONDS.time():
+            return await self.embeddings.aembed_query(question)
+
     #retrival
-    def retrival_documents(self, question: str, k: int= 3)-> List[Document]:
+    def _use_local_index(self)-> bool:
+        """Local index first when configured as primary, or when Neo4jVector is unavailable."""
+        return self.local_index is not None and (VECTOR_INDEX_MODE == "primary" or not self.vector_index)
+
+    def _local_search(self, question: str, k: int, embedding: List[float],
+                      project_name: Optional[str], pdf_names: Optional[List[str]])-> Optional[List[Document]]:
+        """
+        Top-k from the local index; None when it has nothing to offer (empty index
+        or no match in scope), so the caller can try Neo4j instead.
         """
-        retrive top-k similar chunks from neo4j using similarity search.
+        if self.local_index is None or self.local_index.is_empty():
+            return None
+        records= self.local_index.search(embedding, k= k, project_name= project_name, pdf_names= pdf_names)
+        return _records_to_documents(records) if records else None
+
+    def _retrival_documents(self, question: str, k: int, embedding: List[float],
+                            project_name: Optional[str], pdf_names: Optional[List[str]])-> List[Document]:
+        """
+        Search on the calling thread: local index, Neo4jVector or the sync storage driver.
+        Used by `aretrival_documents` when the async driver is unavailable or the local index comes first.
         """
         logger.info(f"Retrieving top-{k} chunks from query: {question}")
         try:
+            if self._use_local_index():
+                docs= self._local_search(question, k, embedding, project_name, pdf_names)
+                if docs is not None:
+                    return docs
+            if self.vector_index and (project_name or pdf_names):
+                records= self.vector_index.query(
+                    scoped_search_cypher(project_name, pdf_names),
+                    params= {"project_name": project_name, "pdf_names": pdf_names or [], "k": k, "embedding": embedding}
+                )
+                return _records_to_documents(records)
             if self.vector_index:
-                return self.vector_index.similarity_search(question, k= k)
-            else:
+                return self.vector_index.similarity_search_by_vector(embedding, k= k)
+            if self.storage:
                 logger.warning("Falling back to Neo4j storage similarity search.")
-                raw= self.storage.similarity_search(question, k= k)
-                return [Document(page_content= r.get("text", "")) for r in raw]
+                return _records_to_documents(self.storage.similarity_search(
+                    embedding, k= k, project_name= project_name, pdf_names= pdf_names, index_name= self.neo4j_index_name))
+            return []
         except Exception as e:
             logger.error(f"Document Retrival failed: {e}")
+            docs= self._local_fallback(question, k, embedding, project_name, pdf_names)
+            if docs is not None:
+                return docs
             raise HTTPException(status_code= 500, detail= str(e))
 
-    #generation from context
-    def generation_from_context(self, question: str, docs: List[Document])-> str:
+    def _local_fallback(self, question: str, k: int, embedding: List[float],
+                        project_name: Optional[str], pdf_names: Optional[List[str]])-> Optional[List[Document]]:
+        """Serve from the local index after a Neo4j failure; None if it cannot help."""
+        if self.local_index is None:
+            return None
+        try:
+            docs= self._local_search(question, k, embedding, project_name, pdf_names)
+        except Exception as e:
+            logger.error(f"Local vector index fallback failed: {e}")
+            return None
+        if docs is not None:
+            logger.warning("Neo4j retrieval failed; served from the local vector index.")
+        return docs
+
+    #async retrival
+    async def aretrival_documents(self, question: str, k: int= 3, embedding: Optional[List[float]]= None,
+                                  project_name: Optional[str]= None, pdf_names: Optional[List[str]]= None)-> List[Document]:
+        """
+        Non-blocking top-k retrieval through the async Neo4j driver and the vector index
+        (or the scoped search when `project_name`/`pdf_names` are given).
+        Pass the precomputed query `embedding` to avoid embedding the question twice.
+        The local index answers first in VECTOR_INDEX_MODE=primary, and is the
+        fallback whenever Neo4j retrieval is unavailable or fails.
+        Runs the driver-based search on a worker thread if the async driver is unavailable.
+        """
+        #embedded outside the search timer, so query_embedding and vector_search do not overlap
+        if not embedding:
+            embedding= await self._aembed_query(question)
+        with _VECTOR_SEARCH_SECONDS.time():
+            return await self._aretrival_documents(question, k, embedding, project_name, pdf_names)
+
+    async def _aretrival_documents(self, question: str, k: int, embedding: List[float],
+                                   project_name: Optional[str], pdf_names: Optional[List[str]])-> List[Document]:
+        if not self.async_driver or self._use_local_index():
+            return await asyncio.to_thread(self._retrival_documents, question, k, embedding, project_name, pdf_names)
+
+        logger.info(f"Retrieving top-{k} chunks (async) from query: {question}")
+        try:
+            if project_name or pdf_names:
+                cypher= scoped_search_cypher(project_name, pdf_names)
+            else:
+                cypher= VECTOR_SEARCH_CYPHER
+            async with self.async_driver.session() as session:
+                result= await session.run(
+                    cypher,
+                    index_name= self.neo4j_index_name,
+                    project_name= project_name,
+                    pdf_names= pdf_names or [],
+                    k= k,
+                    embedding= embedding
+                )
+                records= await result.data()
+            return _records_to_documents(records)
+        except Exception as e:
+            logger.error(f"Async Document Retrival failed: {e}")
+            docs= await asyncio.to_thread(self._local_fallback, question, k, embedding, project_name, pdf_names)
+            if docs is not None:
+                return docs
+            raise HTTPException(status_code= 500, detail= str(e))
+
+    #lexical (full-text) retrival
+    async def alexical_documents(self, question: str, k: int= 3, project_name: Optional[str]= None,
+                                 pdf_names: Optional[List[str]]= None)-> List[Document]:
+        """
+        Top-k chunks by BM25 from the Neo4j full-text index (no embedding needed).
+        Returns an empty list when the index is missing or Neo4j is unavailable.
+        """
+        with _FULLTEXT_SEARCH_SECONDS.time():
+            return await self._alexical_documents(question, k, project_name, pdf_names)
+
+    async def _alexical_documents(self, question: str, k: int, project_name: Optional[str],
+                                  pdf_names: Optional[List[str]])-> List[Document]:
+        if not self.async_driver:
+            return await asyncio.to_thread(self._lexical_documents, question, k, project_name, pdf_names)
+        params= fulltext_search_params(question, k, project_name, pdf_names)
+        if not params["query"]:
+            return []
+        try:
+            async with self.async_driver.session() as session:
+                result= await session.run(fulltext_search_cypher(project_name, pdf_names), params)
+                records= await result.data()
+            return _records_to_documents(records)
+        except Exception as e:
+            logger.warning(f"Full-text retrieval failed, using vector results only: {e}")
+            return []
+
+    def _lexical_documents(self, question: str, k: int, project_name: Optional[str],
+                           pdf_names: Optional[List[str]])-> List[Document]:
+        """Full-text search through Neo4jVector or the sync driver (when the async driver is unavailable)."""
+        params= fulltext_search_params(question, k, project_name, pdf_names)
+        if not params["query"]:
+            return []
+        try:
+            if self.vector_index:
+                records= self.vector_index.query(fulltext_search_cypher(project_name, pdf_names), params= params)
+            elif self.storage:
+                records= self.storage.fulltext_search(question, k= k, project_name= project_name, pdf_names= pdf_names)
+            else:
+                return []
+            return _records_to_documents(records)
+        except Exception as e:
+            logger.warning(f"Full-text retrieval failed, using vector results only: {e}")
+            return []
+
+    #hybrid retrival
+    async def asearch_documents(self, question: str, k: int= 3, embedding: Optional[List[float]]= None,
+                                project_name: Optional[str]= None, pdf_names: Optional[List[str]]= None)-> List[Document]:
         """
-        Generate an answer using context and langfuse prompt.
+        Retrieval entry point used by the query pipeline.
+
+        RETRIEVAL_MODE=vector: vector search only.
+        RETRIEVAL_MODE=hybrid: BM25 and vector candidates, searched concurrently and
+        fused with reciprocal rank fusion. When no embedding is given and the question
+        looks lexical (see `is_lexical_query`), full-text hits are returned directly
+        and the query is never embedded; vector search is used if nothing matches.
         """
-        context= "\n".join([d.page_content for d in docs]) if docs else ""
+        if RETRIEVAL_MODE != "hybrid":
+            return await self.aretrival_documents(question, k= k, embedding= embedding,
+                                                  project_name= project_name, pdf_names= pdf_names)
+        if embedding is None and is_lexical_query(question):
+            docs= await self.alexical_documents(question, k, project_name, pdf_names)
+            if docs:
+                logger.info(f"Lexical query served from the full-text index ({len(docs)} chunks), embedding skipped.")
+                return docs
+            return await self.aretrival_documents(question, k= k, project_name= project_name, pdf_names= pdf_names)
+
+        candidates= max(k, HYBRID_CANDIDATES)
+        vector_docs, lexical_docs= await asyncio.gather(
+            self.aretrival_documents(question, k= candidates, embedding= embedding,
+                                     project_name= project_name, pdf_names= pdf_names),
+            self.alexical_documents(question, candidates, project_name, pdf_names),
+        )
+        return reciprocal_rank_fusion([vector_docs, lexical_docs])[:k]
+
+    #prompt assembly
+    def build_prompt(self, question: str, docs: List[Document], prompt_template= None)-> str:
+        """
+        Build the final LLM prompt from retrieved docs and the langfuse prompt.
+        Docs are packed (overlap removed, adjacent chunks merged, near-duplicates
+        dropped, token budget enforced) unless CONTEXT_PACKING is disabled.
+        """
+        if self.context_packer:
+            context= self.context_packer.pack(docs)
+        else:
+            context= "\n".join([d.page_content for d in docs]) if docs else ""
 
         #checking whether content from document or not
         if context:
             logger.info(f"---Retireved Context Preview (first 100 characters) ---\n{context[:100]}\n--- End of Preview ---")
 
-        prompt= self.get_langfuse_prompt(context, question)
+        prompt= self.get_langfuse_prompt(context, question, prompt_template)
 
         if isinstance(prompt, dict):
             if "messages" in prompt:
@@ -173,47 +870,190 @@ class RAGPipeline:
                 prompt= prompt["prompt"]
             else:
                 prompt= str(prompt)
+        return prompt
 
+    #generation from context
+    async def ageneration_from_context(self, question: str, docs: List[Document], prompt_template= None)-> str:
+        """
+        Generate an answer using context and langfuse prompt, with the non-blocking Ollama client.
+        """
+        with _PROMPT_BUILD_SECONDS.time():
+            prompt= self.build_prompt(question, docs, prompt_template)
         try:
-            response= self.llm.invoke(prompt)
+            with _LLM_SECONDS.time():
+                response= await self.llm.ainvoke(prompt)
             logger.info("Response generated Successfully.")
             return response
         except Exception as e:
             logger.error(f"LLM Generation failed: {e}")
             raise HTTPException(status_code= 500, detail= str(e))
 
-    #end to end query
-    def query(self, question: str, top_k: int= 3)-> dict:
+    @staticmethod
+    def _chunks_metadata(docs: List[Document])-> List[dict]:
+        """Chunk text + location returned to the client for highlighting."""
+        retrieved_chunks= []
+        for d in docs:
+            meta= getattr(d, "metadata", {})
+            retrieved_chunks.append({
+                "text": d.page_content,
+                "page_num": meta.get("page_num"),
+                "pdf_path": meta.get("pdf_path"),
+                "chunk_id": meta.get("chunk_id")
+            })
+        return retrieved_chunks
+
+    async def _aretrieve(self, question: str, top_k: int, project_name: Optional[str],
+                         pdf_names: Optional[List[str]]= None)-> dict:
+        """
+        First half of the pipeline: prompt template, query embedding, semantic
+        cache lookup and (on a miss) retrieval. The prompt-template fetch runs
+        concurrently with query embedding and vector retrieval; retrieval is
+        cancelled if the semantic cache answers the question.
+        Lexical queries in hybrid mode are not embedded (and so bypass the semantic cache).
+        """
+        template_task= asyncio.create_task(asyncio.to_thread(self.get_prompt_template))
+        try:
+            lexical_only= RETRIEVAL_MODE == "hybrid" and is_lexical_query(question)
+            embedding= None if lexical_only else await self._aembed_query(question)
+            retrieval_task= asyncio.create_task(self.asearch_documents(
+                question, k= top_k, embedding= embedding, project_name= project_name, pdf_names= pdf_names))
+        except BaseException:
+            template_task.cancel()
+            raise
+
+        try:
+            prompt_template= await template_task
+            version= self.prompt_version(prompt_template)
+            scope= cache_scope(project_name, pdf_names)
+            generation= semantic_cache.generation(scope) if SEMANTIC_CACHE_ENABLED and embedding else ""
+            cached= (semantic_cache.lookup(scope, embedding, version, top_k, generation)
+                     if SEMANTIC_CACHE_ENABLED and embedding else None)
+            if cached is not None:
+                retrieval_task.cancel()
+                docs= []
+            else:
+                docs= await retrieval_task
+        except BaseException:
+            retrieval_task.cancel()
+            raise
+        return {
+            "prompt_template": prompt_template,
+            "version": version,
+            "scope": scope,
+            "top_k": top_k,
+            "generation": generation,
+            "embedding": embedding,
+            "cached": cached,
+            "docs": docs,
+        }
+
+    #async end to end query
+    async def aquery(self, question: str, top_k: int= 3, project_name: Optional[str]= None,
+              pdf_names: Optional[List[str]]= None)-> dict:
         """
         Perform full retrival+generation Pipeline for a given user question.
         Retirves both the final answer and retrieved chunk metadata.
+        Answers are served from the semantic cache when a similar question was
+        already answered for the same project and prompt version.
+        Async Ollama and Neo4j calls, with independent steps (prompt fetch,
+        retrieval) running concurrently.
         """
         start_time= time.time()
-        logger.info(f"Processing query: {question}")
+        logger.info(f"Processing async query: {question}")
 
         try:
-            docs= self.retrival_documents(question, k= top_k)
+            state= await self._aretrieve(question, top_k, project_name, pdf_names)
+            if state["cached"] is not None:
+                elapsed= round(time.time()-start_time,2)
+                logger.info(f"Query served from semantic cache in {elapsed}s.")
+                return {**state["cached"], "cached": True}
+
+            docs= state["docs"]
             if not docs:
                 logger.warning("No relevant Documents Found")
                 return {
                     "answer": "No Relevant context found in database.",
                     "chunks": []
                 }
-            retrieved_chunks= []
-            for d in docs:
-                meta= getattr(d, "metadata", {})
-                retrieved_chunks.append({
-                    "text": d.page_content,
-                    "page_num": meta.get("page_num"),
-                    "pdf_path": meta.get("pdf_path")
-                })
-            answer= self.generation_from_context(question, docs)
-            elapsed= round(time.time()-start_time,2)
-            logger.info(f"Query Processed Successfully in {elapsed}s.")
-            return {
+            answer= await self.ageneration_from_context(question, docs, state["prompt_template"])
+            result= {
                 "answer": answer,
-                "chunks": retrieved_chunks
+                "chunks": self._chunks_metadata(docs)
                 }
+            if SEMANTIC_CACHE_ENABLED:
+                semantic_cache.store(state["scope"], state["embedding"], state["version"], state["top_k"],
+                                     result, state["generation"])
+            elapsed= round(time.time()-start_time,2)
+            logger.info(f"Query Processed Successfully in {elapsed}s.")
+            return {**result, "cached": False}
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Query pipeline failed: {e}")
-            raise HTTPException(status_code= 500, detail= str(e))
\ No newline at end of file
+            raise HTTPException(status_code= 500, detail= str(e))
+
+    #async streaming query
+    async def astream_query(self, question: str, top_k: int= 3, project_name: Optional[str]= None,
+              pdf_names: Optional[List[str]]= None)-> AsyncIterator[dict]:
+        """
+        Streaming variant of `aquery`, yielding events as they become available:
+            {"event": "chunks", "data": {"chunks": [...], "cached": bool}}  -- retrieved context, first
+            {"event": "token",  "data": {"text": str}}                      -- LLM output pieces
+            {"event": "done",   "data": {"elapsed": float, "ttft": float}}
+            {"event": "error",  "data": {"detail": str}}
+        """
+        start_time= time.time()
+        logger.info(f"Processing async streaming query: {question}")
+
+        try:
+            state= await self._aretrieve(question, top_k, project_name, pdf_names)
+            if state["cached"] is not None:
+                cached= state["cached"]
+                yield {"event": "chunks", "data": {"chunks": cached.get("chunks", []), "cached": True}}
+                yield {"event": "token", "data": {"text": cached.get("answer", "")}}
+                yield {"event": "done", "data": {"elapsed": round(time.time()-start_time,2), "ttft": 0.0}}
+                return
+
+            docs= state["docs"]
+            retrieved_chunks= self._chunks_metadata(docs)
+            yield {"event": "chunks", "data": {"chunks": retrieved_chunks, "cached": False}}
+            if not docs:
+                logger.warning("No relevant Documents Found")
+                yield {"event": "token", "data": {"text": "No Relevant context found in database."}}
+                yield {"event": "done", "data": {"elapsed": round(time.time()-start_time,2), "ttft": None}}
+                return
+
+            with _PROMPT_BUILD_SECONDS.time():
+                prompt= self.build_prompt(question, docs, state["prompt_template"])
+            pieces= []
+            ttft= None
+            llm_start= time.perf_counter()
+            async for token in self.llm.astream(prompt):
+                if ttft is None:
+                    ttft= round(time.time()-start_time,3)
+                    _LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - llm_start)
+                    logger.info(f"Time to first token: {ttft}s")
+                _LLM_TOKENS.inc()
+                pieces.append(token)
+                yield {"event": "token", "data": {"text": token}}
+            _LLM_SECONDS.observe(time.perf_counter() - llm_start)
+
+            if SEMANTIC_CACHE_ENABLED:
+                result= {"answer": "".join(pieces), "chunks": retrieved_chunks}
+                semantic_cache.store(state["scope"], state["embedding"], state["version"], state["top_k"],
+                                     result, state["generation"])
+            elapsed= round(time.time()-start_time,2)
+            logger.info(f"Streaming Query Processed Successfully in {elapsed}s.")
+            yield {"event": "done", "data": {"elapsed": elapsed, "ttft": ttft}}
+        except Exception as e:
+            logger.error(f"Streaming query pipeline failed: {e}")
+            detail= e.detail if isinstance(e, HTTPException) else str(e)
+            yield {"event": "error", "data": {"detail": detail}}
+
+    async def aclose(self):
+        """Stop the prompt refresher and release the Neo4j drivers (closed by the driver registry)."""
+        if self.prompt_cache:
+            self.prompt_cache.stop()
+        if self.storage:
+            self.storage.close()
+        self.async_driver= None
@@ -0,0 +1,220 @@
+"""
+services/render_cache.py
+
+Size-bounded cache of rendered highlight images.
+
+Entries are keyed by (PDF content hash, page, snippet, render options), so a
+changed PDF never serves an old image. Recently used images stay in memory
+(LRU, bounded by bytes); images evicted from memory spill to a disk directory
+(also bounded by bytes, oldest-access first) and are promoted back on a hit.
+The key digest doubles as the ETag of the rendered image.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+#logging configuration
+logger= logging.getLogger(__name__)
+
+#render cache settings (overridable from .env)
+RENDER_CACHE_MEMORY_BYTES= int(os.getenv("RENDER_CACHE_MEMORY_MB", "64")) * 1024 * 1024
+RENDER_CACHE_DISK_BYTES= int(os.getenv("RENDER_CACHE_DISK_MB", "512")) * 1024 * 1024
+RENDER_CACHE_DIR= os.getenv("RENDER_CACHE_DIR", "render_cache")
+RENDER_CACHE_MAX_AGE= int(os.getenv("RENDER_CACHE_MAX_AGE", "3600"))
+
+#(path, size, mtime_ns) -> sha256, so a PDF is hashed once per revision
+_file_hashes: Dict[Tuple[str, int, int], str]= {}
+_file_hashes_lock= threading.Lock()
+
+
+def file_content_hash(path: str)-> str:
+    """SHA-256 of a file, memoized on (path, size, mtime)."""
+    stat= os.stat(path)
+    key= (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _file_hashes_lock:
+        cached= _file_hashes.get(key)
+    if cached:
+        return cached
+    digest= hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    value= digest.hexdigest()
+    with _file_hashes_lock:
+        _file_hashes[key]= value
+    return value
+
+
+def render_key(content_hash: str, page_num: int, snippet: str, options: dict)-> str:
+    """Stable digest of everything that determines the rendered image."""
+    payload= json.dumps([content_hash, page_num, snippet, options], sort_keys= True, ensure_ascii= False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """
+    Two-level LRU cache of rendered images: memory first, then a disk spill.
+    Values are (image bytes, media type).
+    """
+
+    def __init__(self, memory_bytes: int= RENDER_CACHE_MEMORY_BYTES,
+                 disk_bytes: int= RENDER_CACHE_DISK_BYTES, spill_dir: str= RENDER_CACHE_DIR):
+        """
+        Arguments:
+            memory_bytes ---> int: Maximum total size of images kept in memory.
+            disk_bytes ---> int: Maximum total size of spilled images (0 disables the spill).
+            spill_dir ---> str: Directory for spilled images.
+        """
+        self.memory_bytes= max(0, memory_bytes)
+        self.disk_bytes= max(0, disk_bytes)
+        self.spill_dir= Path(spill_dir)
+        self._memory: "OrderedDict[str, Tuple[bytes, str]]"= OrderedDict()
+        self._memory_size= 0
+        self._lock= threading.Lock()
+        self.memory_hits= 0
+        self.disk_hits= 0
+        self.misses= 0
+        self.spilled= 0
+        #the spill directory is created (and its files counted) on the first spill, not at import
+        self._disk_size= 0
+        self._spill_ready= False
+        self._spill_lock= threading.Lock()
+
+    def _spill_path(self, key: str)-> Path:
+        return self.spill_dir / f"{key}.bin"
+
+    def _prepare_spill(self):
+        """Create the spill directory and count the files left by a previous run, once."""
+        with self._spill_lock:
+            if self._spill_ready:
+                return
+            self.spill_dir.mkdir(parents= True, exist_ok= True)
+            size= sum(p.stat().st_size for p in self.spill_dir.glob("*.bin"))
+            with self._lock:
+                self._disk_size+= size
+            self._spill_ready= True
+
+    def get(self, key: str)-> Optional[Tuple[bytes, str]]:
+        """Return (image bytes, media type) or None."""
+        with self._lock:
+            entry= self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits+= 1
+                return entry
+        entry= self._read_spill(key)
+        with self._lock:
+            if entry is None:
+                self.misses+= 1
+                return None
+            self.disk_hits+= 1
+        self.put(key, entry[0], entry[1])
+        return entry
+
+    def put(self, key: str, content: bytes, media_type: str):
+        """Store an image; evicted entries spill to disk."""
+        evicted= []
+        with self._lock:
+            old= self._memory.pop(key, None)
+            if old is not None:
+                self._memory_size-= len(old[0])
+            if len(content) <= self.memory_bytes:
+                self._memory[key]= (content, media_type)
+                self._memory_size+= len(content)
+            else:
+                evicted.append((key, (content, media_type)))
+            while self._memory_size > self.memory_bytes and self._memory:
+                old_key, old_entry= self._memory.popitem(last= False)
+                self._memory_size-= len(old_entry[0])
+                evicted.append((old_key, old_entry))
+        for old_key, old_entry in evicted:
+            self._write_spill(old_key, *old_entry)
+
+    def _read_spill(self, key: str)-> Optional[Tuple[bytes, str]]:
+        if not self.disk_bytes:
+            return None
+        path= self._spill_path(key)
+        try:
+            data= path.read_bytes()
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Render cache spill read failed for {key}: {e}")
+            return None
+        #refresh access time so eviction keeps recently used files
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        media_type, _, content= data.partition(b"\n")
+        return content, media_type.decode("ascii")
+
+    def _write_spill(self, key: str, content: bytes, media_type: str):
+        if not self.disk_bytes or len(content) > self.disk_bytes:
+            return
+        try:
+            self._prepare_spill()
+            path= self._spill_path(key)
+            if path.exists():
+                return
+            tmp= path.with_suffix(".tmp")
+            tmp.write_bytes(media_type.encode("ascii") + b"\n" + content)
+            os.replace(tmp, path)
+        except Exception as e:
+            logger.warning(f"Render cache spill write failed for {key}: {e}")
+            return
+        with self._lock:
+            self.spilled+= 1
+            self._disk_size+= len(content) + len(media_type) + 1
+            over= self._disk_size > self.disk_bytes
+        if over:
+            self._trim_disk()
+
+    def _trim_disk(self):
+        """Delete least recently used spill files until the disk budget is met."""
+        files= []
+        for p in self.spill_dir.glob("*.bin"):
+            try:
+                stat= p.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, p))
+        files.sort()
+        size= sum(f[1] for f in files)
+        target= int(self.disk_bytes * 0.9)
+        for _, file_size, path in files:
+            if size <= target:
+                break
+            try:
+                path.unlink()
+                size-= file_size
+            except FileNotFoundError:
+                size-= file_size
+            except OSError as e:
+                logger.warning(f"Render cache could not remove {path}: {e}")
+        with self._lock:
+            self._disk_size= size
+
+    def stats(self)-> dict:
+        with self._lock:
+            lookups= self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "disk_bytes": self._disk_size,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "spilled": self.spilled,
+                "hit_ratio": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            }
+
+
+#shared by the render endpoints
+render_cache= RenderCache()
@@ -8,8 +8,10 @@ and chunk embeddings across two databases:
 
 1. Neo4j Graph Database — stores project, PDF, and chunk relationships as nodes and edges.
    - Each project is represented as a `Project` node.
-   - Each PDF is a `PDF` node connected to its project via `HAS_PDF`.
-   - Each text chunk (with embeddings) is a `Chunk` node linked to its PDF via `HAS_CHUNK`.
+   - Each PDF is a `PDF` node connected to its project via `HAS_PDF`, keyed by
+     (project, name) so the same filename in two projects stays two nodes.
+   - Each text chunk (with embeddings) is a `Chunk` node linked to its PDF via `HAS_CHUNK`,
+     keyed by (project, pdf_name, chunk_id).
    - A vector index on `Chunk.embedding` enables efficient semantic search.
 
 2. MongoDB — stores metadata documents for quick lookup and retrieval of project and PDF information.
@@ -32,21 +34,30 @@ Key Functionalities:
 
 - Connects to Neo4j and MongoDB using environment variables (`.env` file).
 - Ensures Neo4j vector index for embeddings (cosine similarity, 768 dimensions).
-- Persists project hierarchy and chunk embeddings to Neo4j.
+- Persists project hierarchy and chunk embeddings to Neo4j, in UNWIND batches
+  inside explicit write transactions (with a per-row fallback for debugging).
+- Tracks per-page text hashes so a new PDF revision only re-writes changed pages,
+  and removes orphaned chunks in batches.
+- Optionally mirrors chunk writes/deletes into a local vector index
+  (services/vector_index.py) used for low-latency or Neo4j-down retrieval.
 - Persists metadata to MongoDB.
 - Includes robust logging for connection management, insertion, and error handling.
 - Supports IST (Asia/Kolkata) timezone for timestamps.
 """
 
 import os
+import re
+import time
 import logging
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 from abc import ABC, abstractmethod
-from neo4j import GraphDatabase
 from pymongo import MongoClient
 from dotenv import load_dotenv
 import pytz
 
+from services.neo4j_drivers import neo4j_drivers
+
 #logging configuration
 logger= logging.getLogger(__name__)
 
@@ -55,6 +66,121 @@ load_dotenv()
 
 ist= pytz.timezone("Asia/Kolkata")
 
+#bulk write tuning (overridable from .env)
+WRITE_BATCH_SIZE= int(os.getenv("NEO4J_WRITE_BATCH_SIZE", "500"))
+WRITE_RETRIES= int(os.getenv("NEO4J_WRITE_RETRIES", "3"))
+BULK_WRITES= os.getenv("NEO4J_BULK_WRITES", "true").lower() in ("1", "true", "yes")
+
+#graph layout version recorded on the (:Schema) node; bumped when a one-off migration is added
+SCHEMA_VERSION= 2
+
+#fields returned for every retrieved chunk
+RETURN_CHUNK_FIELDS= """
+RETURN c.text AS text, c.project AS project, c.pdf_name AS pdf_name, c.page_num AS page_num,
+       c.pdf_path AS pdf_path, c.chunk_id AS chunk_id, score
+"""
+
+
+def scoped_search_cypher(project_name: Optional[str]= None, pdf_names: Optional[List[str]]= None)-> str:
+    """
+    Exact top-k search restricted to one project and/or a set of PDFs.
+
+    The scope is resolved first by walking PDF-HAS_CHUNK->Chunk from the PDF
+    nodes indexed by (project, name), and only those chunks are scored. The
+    filter is therefore part of the search (never a post-filter on a global
+    top-k), and the cost depends on the size of the selected scope rather
+    than on the whole corpus.
+    """
+    if project_name:
+        match= "MATCH (pdf:PDF {project: $project_name})-[:HAS_CHUNK]->(c:Chunk)"
+        if pdf_names:
+            match+= "\nWHERE pdf.name IN $pdf_names"
+    else:
+        match= "MATCH (pdf:PDF)-[:HAS_CHUNK]->(c:Chunk)\nWHERE pdf.name IN $pdf_names"
+    return match + """
+WITH DISTINCT c
+WHERE c.embedding IS NOT NULL
+WITH c, vector.similarity.cosine(c.embedding, $embedding) AS score
+ORDER BY score DESC
+LIMIT $k
+""" + RETURN_CHUNK_FIELDS
+
+#unscoped top-k through the vector index
+VECTOR_SEARCH_CYPHER= "CALL db.index.vector.queryNodes($index_name, $k, $embedding)\nYIELD node AS c, score" + RETURN_CHUNK_FIELDS
+
+
+#full-text (BM25) search on Chunk.text; project and pdf_name are indexed too,
+#so a scope is a Lucene clause of the query rather than a filter on its hits
+FULLTEXT_INDEX_NAME= "chunk_search"
+FULLTEXT_FIELDS= ("text", "project", "pdf_name")
+
+_LUCENE_SPECIAL= re.compile(r'([+\-&|!(){}\[\]^"~*?:\\/])')
+_LUCENE_OPERATORS= {"AND", "OR", "NOT", "TO"}
+
+
+def _lucene_phrase(value: str)-> str:
+    """Quote a value as a Lucene phrase."""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def lucene_query(text: str, project_name: Optional[str]= None, pdf_names: Optional[List[str]]= None)-> str:
+    """
+    Turn free text into a safe Lucene query on the `text` field: special
+    characters are escaped and operator words neutralized, so every word is an
+    optional (OR-ed) term. Identifier-like words (ERR-1042, v2.3.1, snake_case)
+    are also added as a boosted phrase so their parts must match together.
+    A project/PDF scope is added as required `project` / `pdf_name` clauses.
+    Returns an empty string when the text has no searchable words.
+    """
+    parts= []
+    for token in text.split():
+        word= token.strip(".,;!?()[]{}'\"")
+        if not word:
+            continue
+        if word.upper() in _LUCENE_OPERATORS:
+            word= word.lower()
+        parts.append(_LUCENE_SPECIAL.sub(r"\\\1", word))
+        if re.search(r"\w[-_./:]\w", word):
+            parts.append(f"{_lucene_phrase(word)}^2")
+    if not parts:
+        return ""
+    clauses= [f"+text:({' '.join(parts)})"]
+    if project_name:
+        clauses.append(f"+project:{_lucene_phrase(project_name)}")
+    if pdf_names:
+        clauses.append("+(" + " ".join(f"pdf_name:{_lucene_phrase(name)}" for name in pdf_names) + ")")
+    return " ".join(clauses)
+
+
+def fulltext_search_cypher(project_name: Optional[str]= None, pdf_names: Optional[List[str]]= None)-> str:
+    """
+    Top-k BM25 search over the full-text index. The scope is already part of
+    the Lucene query (see `lucene_query`); the exact comparison here only drops
+    analyzed-phrase look-alikes (project "a b" also matches the phrase in "a b c").
+    """
+    cypher= "CALL db.index.fulltext.queryNodes($fulltext_index, $query, {limit: $k})\nYIELD node AS c, score"
+    filters= []
+    if project_name:
+        filters.append("c.project = $project_name")
+    if pdf_names:
+        filters.append("c.pdf_name IN $pdf_names")
+    if filters:
+        cypher+= "\nWHERE " + " AND ".join(filters)
+    return cypher + RETURN_CHUNK_FIELDS
+
+
+def fulltext_search_params(question: str, k: int, project_name: Optional[str]= None,
+                           pdf_names: Optional[List[str]]= None)-> dict:
+    """Parameters for `fulltext_search_cypher`."""
+    return {
+        "fulltext_index": FULLTEXT_INDEX_NAME,
+        "query": lucene_query(question, project_name, pdf_names),
+        "k": k,
+        "project_name": project_name,
+        "pdf_names": pdf_names or [],
+    }
+
+
 #base abstract class
 class BaseStorage(ABC):
     """
@@ -85,35 +211,62 @@ class Neo4jStorage(BaseStorage):
     this class is used for project graph, pdfs, chunks in Neo4j.
     ensures neo4j index
     """
-    def __init__(self):
-        self.uri= os.getenv("NEO4J_URI")
-        self.user= os.getenv("NEO4J_USER")
-        self.password= os.getenv("NEO4J_PASSWORD")
+    def __init__(self, uri: Optional[str]= None, user: Optional[str]= None,
+                 password: Optional[str]= None, mirror= None):
+        """
+        Arguments:
+            uri ---> str: Neo4j URI (defaults to NEO4J_URI).
+            user ---> str: Neo4j user (defaults to NEO4J_USER).
+            password ---> str: Neo4j password (defaults to NEO4J_PASSWORD).
+            mirror ---> LocalVectorIndex: Optional index kept in sync with successful chunk writes.
+        """
+        self.uri= uri or os.getenv("NEO4J_URI")
+        self.user= user or os.getenv("NEO4J_USER")
+        self.password= password or os.getenv("NEO4J_PASSWORD")
+        self.mirror= mirror
+        self.write_batch_size= max(1, WRITE_BATCH_SIZE)
+        self.write_retries= max(1, WRITE_RETRIES)
+        self.retry_backoff= 0.5
         self.driver= None
+        #indexes and migrations are checked once per instance, not per upload
+        self._indexes_ensured= False
         self._connect()
 
     def _connect(self):
         """
         Establishes connection to Neo4j
         """
-        #Neo4j Connection
+        #Neo4j Connection (process-wide driver shared with the query path)
         try:
-            self.driver= GraphDatabase.driver(self.uri, auth= (self.user, self.password))
+            self.driver= neo4j_drivers.get(self.uri, self.user, self.password)
             logger.info("Connection Established to Neo4j")
         except Exception as e:
             self.driver= None
             logger.error(f"Neo4j Connection Error : {e}")
 
+    def _mirror(self, method: str, *args):
+        """Apply a write to the local index mirror; a mirror failure never fails the Neo4j write."""
+        if self.mirror is None:
+            return
+        try:
+            getattr(self.mirror, method)(*args)
+        except Exception as e:
+            logger.warning(f"Local vector index {method} failed: {e}")
+
     #Neo4j Vector Index Initiallization
     def ensure_index(self):
         """
         Checking Neo4j vector index is exists for chunk embedding.
-        create a index if not exists.
+        create a index if not exists. Also creates the lookup indexes and
+        the full-text (BM25) index on Chunk.text, and migrates graphs written
+        by an older SCHEMA_VERSION. Runs once per instance; later calls return at once.
         """
+        if self._indexes_ensured:
+            return
         if not self.driver:
             logger.warning("Neo4j Driver is not yet started; skipping index creation.")
             return
-        
+
         try:
             with self.driver.session() as session:
                 session.run(
@@ -130,10 +283,91 @@ class Neo4jStorage(BaseStorage):
                     """
                 )
                 logger.info("Neo4j vector index ensured.")
+
+                #lookup indexes so MERGE on PDF/Chunk keys does not scan every node
+                session.run("CREATE INDEX project_name IF NOT EXISTS FOR (p:Project) ON (p.name)")
+                session.run("CREATE INDEX pdf_name IF NOT EXISTS FOR (p:PDF) ON (p.name)")
+                session.run("CREATE INDEX pdf_project IF NOT EXISTS FOR (p:PDF) ON (p.project)")
+                session.run("CREATE INDEX pdf_key IF NOT EXISTS FOR (p:PDF) ON (p.project, p.name)")
+                session.run("CREATE INDEX pdf_content_hash IF NOT EXISTS FOR (p:PDF) ON (p.content_hash)")
+                session.run("CREATE INDEX chunk_project_key IF NOT EXISTS FOR (c:Chunk) ON (c.project, c.pdf_name, c.chunk_id)")
+                #BM25 full-text index for lexical / hybrid retrieval
+                fields= ", ".join(f"c.{field}" for field in FULLTEXT_FIELDS)
+                session.run(f"CREATE FULLTEXT INDEX {FULLTEXT_INDEX_NAME} IF NOT EXISTS FOR (c:Chunk) ON EACH [{fields}]")
+                logger.info("Neo4j lookup indexes ensured.")
+
+                record= session.run("MATCH (s:Schema {name: 'rag'}) RETURN s.version AS version").single()
+                version= (record["version"] if record else None) or 1
+                if version < SCHEMA_VERSION:
+                    self._migrate_schema(session, version)
+            self._indexes_ensured= True
         except Exception as e:
             logger.error(f"[Neo4j Index Error] {e}")
+
+    def _migrate_schema(self, session, version: int):
+        """
+        One-off migrations from `version` up to SCHEMA_VERSION, recorded on the
+        (:Schema) node so they run once per database instead of on every upload.
+        """
+        logger.info(f"Migrating the Neo4j graph from schema version {version} to {SCHEMA_VERSION}...")
+        if version < 2:
+            #chunk_key (pdf_name, chunk_id) and chunk_text (text only) predate the project key
+            session.run("DROP INDEX chunk_key IF EXISTS")
+            session.run("DROP INDEX chunk_text IF EXISTS")
+            self._migrate_project_keys(session)
+        session.run(
+            "MERGE (s:Schema {name: 'rag'}) SET s.version= $version, s.migrated_at= $date",
+            version= SCHEMA_VERSION,
+            date= datetime.now(ist).isoformat()
+        ).consume()
+        logger.info(f"Neo4j graph migrated to schema version {SCHEMA_VERSION}.")
+
+    def _migrate_project_keys(self, session):
+        """
+        Give PDF and Chunk nodes written before the (project, name) key their project.
+        A PDF node shared by several projects stays with the first one; every
+        other project gets its own copy of the node and its chunks.
+        Nodes that already carry a project are left alone, so an interrupted run can be repeated.
+        """
+        copied= session.run(
+            """
+            MATCH (p:Project)-[r:HAS_PDF]->(pdf:PDF)
+            WHERE pdf.project IS NULL
+            WITH pdf, collect(p) AS projects, collect(r) AS links
+            SET pdf.project= projects[0].name
+            WITH pdf, projects, links
+            UNWIND range(1, size(projects) - 1) AS i
+            WITH pdf, projects[i] AS p, links[i] AS r
+            CREATE (p)-[:HAS_PDF]->(copy:PDF)
+            SET copy= properties(pdf), copy.project= p.name
+            DELETE r
+            WITH pdf, copy
+            CALL {
+                WITH pdf, copy
+                MATCH (pdf)-[:HAS_CHUNK]->(c:Chunk)
+                CREATE (copy)-[:HAS_CHUNK]->(dup:Chunk)
+                SET dup= properties(c), dup.project= copy.project
+                RETURN count(dup) AS chunks
+            }
+            RETURN count(copy) AS pdfs
+            """
+        ).single()
+        if copied and copied["pdfs"]:
+            logger.warning(f"Split {copied['pdfs']} PDF nodes shared between projects into per-project copies; "
+                           "re-upload those PDFs if the projects held different revisions.")
+        session.run(
+            """
+            MATCH (pdf:PDF)-[:HAS_CHUNK]->(c:Chunk)
+            WHERE c.project IS NULL AND pdf.project IS NOT NULL
+            CALL {
+                WITH pdf, c
+                SET c.project= pdf.project
+            } IN TRANSACTIONS OF 1000 ROWS
+            """
+        ).consume()
     
-    def store_project(self, project_name: str, pdf_data: list, chunks: list):
+    def store_project(self, project_name: str, pdf_data: list, chunks: list,
+                      bulk: Optional[bool]= None, batch_size: Optional[int]= None)-> dict:
         """
         Stores a project, it's PDFs, and their text chunks in Neo4j.
         Ensures vector index is present.
@@ -141,103 +375,511 @@ class Neo4jStorage(BaseStorage):
             project_name ---> str: The name of the project.
             pdf_data ---> list[dict]: List of PDF metadata dictionaries (name, pages),
             chunks ---> list[dict]: List of text chunks dictionaries with embeddings.
+            bulk ---> bool: Write chunks in UNWIND batches inside explicit transactions
+                            (defaults to NEO4J_BULK_WRITES). Set False for the slow
+                            per-row path with per-chunk error logging.
+            batch_size ---> int: Chunks per UNWIND batch (defaults to NEO4J_WRITE_BATCH_SIZE).
+        Returns:
+            dict: Write statistics (chunks written/failed, seconds, chunks per second).
         """
+        stats= {"chunks_written": 0, "chunks_failed": 0, "seconds": 0.0, "chunks_per_second": 0.0}
 
         if not self.driver:
             logger.warning("Neo4j Driver is not yet initialized; skipping project storage.")
-            return
+            return stats
 
+        if bulk is None:
+            bulk= BULK_WRITES
+
+        start= time.perf_counter()
         try:
             #vector index creation
             self.ensure_index()
 
             with self.driver.session() as session:
-                #project node
+                if bulk:
+                    written, failed= self._store_bulk(session, project_name, pdf_data, chunks,
+                                                      batch_size or self.write_batch_size)
+                else:
+                    written, failed= self._store_per_row(session, project_name, pdf_data, chunks)
+
+            elapsed= time.perf_counter() - start
+            stats.update({
+                "chunks_written": written,
+                "chunks_failed": failed,
+                "seconds": round(elapsed, 3),
+                "chunks_per_second": round(written / elapsed, 1) if elapsed > 0 else 0.0,
+            })
+            logger.info(
+                f"Neo4j Project {project_name}, stored successfully: {written} chunks in "
+                f"{stats['seconds']}s ({stats['chunks_per_second']} chunks/s, {failed} failed, "
+                f"mode= {'bulk' if bulk else 'per-row'})"
+            )
+
+        except Exception as e:
+            logger.error(f"Neo4j Storage Error: {e}")
+        return stats
+
+    def find_pdf_by_hash(self, project_name: str, content_hash: str)-> Optional[str]:
+        """
+        Return the name of a PDF in the project whose content hash matches, if any.
+        Arguments:
+            project_name ---> str: The name of the project.
+            content_hash ---> str: SHA-256 hex digest of the PDF file.
+        """
+        if not self.driver or not content_hash:
+            return None
+        try:
+            with self.driver.session() as session:
+                record= session.run(
+                    """
+                    MATCH (pdf:PDF {project: $project_name, content_hash: $content_hash})
+                    RETURN pdf.name AS name
+                    LIMIT 1
+                    """,
+                    project_name= project_name,
+                    content_hash= content_hash
+                ).single()
+                return record["name"] if record else None
+        except Exception as e:
+            logger.error(f"Neo4j PDF hash lookup failed: {e}")
+            return None
+
+    def get_page_hashes(self, project_name: str, pdf_name: str)-> Dict[int, str]:
+        """
+        Return the stored per-page text hashes of a project's PDF as {page_num: hash}.
+        Empty when the PDF is unknown or was ingested before page hashing existed.
+        """
+        if not self.driver:
+            return {}
+        try:
+            with self.driver.session() as session:
+                record= session.run(
+                    "MATCH (pdf:PDF {project: $project_name, name: $pdf_name}) RETURN pdf.page_hashes AS hashes",
+                    project_name= project_name,
+                    pdf_name= pdf_name
+                ).single()
+            hashes= (record["hashes"] if record else None) or []
+            return {page: h for page, h in enumerate(hashes, start= 1) if h}
+        except Exception as e:
+            logger.error(f"Neo4j page hash lookup failed for '{pdf_name}': {e}")
+            return {}
+
+    def set_page_hashes(self, project_name: str, pdf_name: str, page_hashes: List[str]):
+        """
+        Store per-page text hashes on the PDF node (index i holds page i+1,
+        empty string for pages without text). Call this only after the
+        page's chunks were written, so a failed write is retried next time.
+        """
+        if not self.driver:
+            return
+        try:
+            with self.driver.session() as session:
+                session.run(
+                    "MATCH (pdf:PDF {project: $project_name, name: $pdf_name}) SET pdf.page_hashes= $hashes",
+                    project_name= project_name,
+                    pdf_name= pdf_name,
+                    hashes= page_hashes
+                ).consume()
+        except Exception as e:
+            logger.error(f"Neo4j couldn't store page hashes for '{pdf_name}': {e}")
+
+    def set_content_hash(self, project_name: str, pdf_name: str, content_hash: Optional[str]):
+        """
+        Record the SHA-256 of the file on the PDF node, which makes re-uploads of
+        the same bytes duplicates (see find_pdf_by_hash). Call this only after
+        every chunk and page of the upload was stored, so a partial ingest can be repaired.
+        """
+        if not self.driver:
+            return
+        try:
+            with self.driver.session() as session:
+                session.run(
+                    "MATCH (pdf:PDF {project: $project_name, name: $pdf_name}) SET pdf.content_hash= $content_hash",
+                    project_name= project_name,
+                    pdf_name= pdf_name,
+                    content_hash= content_hash
+                ).consume()
+        except Exception as e:
+            logger.error(f"Neo4j couldn't store the content hash for '{pdf_name}': {e}")
+
+    def delete_stale_chunks(self, project_name: str, pdf_name: str, keep_ids: List[str],
+                            pages: Optional[List[int]]= None, batch_size: Optional[int]= None)-> int:
+        """
+        Delete chunks of a PDF that are no longer part of its current revision,
+        in batches of `batch_size` per write transaction.
+
+        Arguments:
+            project_name ---> str: Project the PDF belongs to.
+            pdf_name ---> str: PDF whose chunks are cleaned up.
+            keep_ids ---> List[str]: chunk_ids written for the current revision.
+            pages ---> List[int]: Only consider chunks on these pages (None = every page).
+            batch_size ---> int: Chunks deleted per transaction.
+        Returns:
+            int: Number of deleted chunks.
+        """
+        if not self.driver or (pages is not None and not pages):
+            return 0
+
+        batch_size= batch_size or self.write_batch_size
+        total= 0
+        try:
+            with self.driver.session() as session:
+                while True:
+                    deleted= session.execute_write(
+                        self._delete_chunks_tx, project_name, pdf_name, keep_ids, pages, batch_size
+                    )
+                    total+= deleted
+                    if deleted < batch_size:
+                        break
+            if total:
+                logger.info(f"Deleted {total} stale chunks of PDF '{pdf_name}' in project '{project_name}'.")
+            self._mirror("delete_chunks", project_name, pdf_name, keep_ids, pages)
+        except Exception as e:
+            logger.error(f"Neo4j stale chunk cleanup failed for '{pdf_name}': {e}")
+        return total
+
+    @staticmethod
+    def _delete_chunks_tx(tx, project_name: str, pdf_name: str, keep_ids: list,
+                          pages: Optional[list], batch_size: int)-> int:
+        record= tx.run(
+            """
+            MATCH (:PDF {project: $project_name, name: $pdf_name})-[:HAS_CHUNK]->(c:Chunk)
+            WHERE ($pages IS NULL OR c.page_num IN $pages)
+              AND NOT c.chunk_id IN $keep_ids
+            WITH c LIMIT $batch_size
+            DETACH DELETE c
+            RETURN count(*) AS deleted
+            """,
+            project_name= project_name,
+            pdf_name= pdf_name,
+            keep_ids= keep_ids,
+            pages= pages,
+            batch_size= batch_size
+        ).single()
+        return record["deleted"] if record else 0
+
+    @staticmethod
+    def _chunk_row(c: dict)-> dict:
+        """Build the Cypher parameter row for a chunk dictionary."""
+        return {
+            "project": c.get("project"),
+            "pdf_name": c.get("pdf_name"),
+            "chunk_id": c.get("chunk_id"),
+            "text": c.get("text", ""),
+            "embedding": c.get("embedding", []),
+            "page_num": c.get("page_num"),
+            "pdf_path": c.get("pdf_path"),
+            "page_hash": c.get("page_hash"),
+        }
+
+    @staticmethod
+    def _merge_project_tx(tx, project_name: str):
+        tx.run(
+            """
+            MERGE (p: Project {name: $name})
+            ON CREATE SET p.date_created= $date
+            """,
+            name= project_name,
+            date= datetime.now(ist).isoformat()
+        )
+
+    @staticmethod
+    def _merge_pdfs_tx(tx, project_name: str, rows: list):
+        tx.run(
+            """
+            MATCH (p: Project {name: $project_name})
+            UNWIND $rows AS row
+            MERGE (pdf: PDF {project: $project_name, name: row.pdf_name})
+            SET pdf.pages= row.pages,
+                pdf.content_hash= row.content_hash
+            MERGE (p)-[:HAS_PDF]->(pdf)
+            """,
+            project_name= project_name,
+            rows= rows
+        )
+
+    @staticmethod
+    def _merge_chunks_tx(tx, rows: list)-> set:
+        """Merge chunk rows onto their PDF nodes; returns the (project, pdf_name, chunk_id) keys actually written."""
+        record= tx.run(
+            """
+            UNWIND $rows AS row
+            MATCH (pdf:PDF {project: row.project, name: row.pdf_name})
+            MERGE (chunk:Chunk {project: row.project, pdf_name: row.pdf_name, chunk_id: row.chunk_id})
+            SET chunk.text = row.text,
+                chunk.embedding = row.embedding,
+                chunk.page_num = row.page_num,
+                chunk.pdf_path = row.pdf_path,
+                chunk.page_hash = row.page_hash
+            MERGE (pdf)-[:HAS_CHUNK]->(chunk)
+            RETURN collect(DISTINCT [row.project, row.pdf_name, row.chunk_id]) AS written
+            """,
+            rows= rows
+        ).single()
+        return {tuple(key) for key in record["written"]} if record else set()
+
+    @staticmethod
+    def _row_key(row: dict)-> tuple:
+        return (row["project"], row["pdf_name"], row["chunk_id"])
+
+    def _apply_written(self, rows: list, written: set)-> int:
+        """
+        Mirror the rows that were written and report the rest: rows whose PDF
+        node does not exist are not matched by the MERGE, so nothing is stored.
+
+        Returns:
+            int: Number of rows that were not written.
+        """
+        stored= [row for row in rows if self._row_key(row) in written]
+        self._mirror("upsert", stored)
+        missing= len(rows) - len(stored)
+        if missing:
+            pdfs= sorted({f"{row['project']}/{row['pdf_name']}" for row in rows if self._row_key(row) not in written})
+            logger.error(f"Neo4j skipped {missing} chunks whose PDF node does not exist: {', '.join(pdfs)}")
+        return missing
+
+    def _write_chunk_batch(self, session, rows: list)-> int:
+        """
+        Write one batch of chunk rows in a single write transaction, retrying
+        the whole batch on failure. If every attempt fails, the batch is replayed
+        row by row so the failing chunks get logged individually.
+        Rows without a PDF node count as failed (they are not retried).
+
+        Returns:
+            int: Number of chunks that could not be written.
+        """
+        for attempt in range(1, self.write_retries + 1):
+            try:
+                written= session.execute_write(self._merge_chunks_tx, rows)
+                return self._apply_written(rows, written)
+            except Exception as e:
+                logger.warning(f"Neo4j chunk batch of {len(rows)} failed (attempt {attempt}/{self.write_retries}): {e}")
+                if attempt < self.write_retries:
+                    time.sleep(self.retry_backoff * attempt)
+
+        logger.error(f"Neo4j chunk batch of {len(rows)} failed after retries; replaying row by row.")
+        failed= 0
+        for row in rows:
+            try:
+                failed+= self._apply_written([row], session.execute_write(self._merge_chunks_tx, [row]))
+            except Exception as e:
+                failed+= 1
+                logger.error(f"Neo4j Chunk Error, PDF '{row['pdf_name']}' Chunk_ID {row['chunk_id']}: {e}")
+        return failed
+
+    def _store_bulk(self, session, project_name: str, pdf_data: list, chunks: list, batch_size: int):
+        """
+        Bulk write path: project, PDFs and chunks are sent through UNWIND
+        inside explicit write transactions, `batch_size` chunks per transaction.
+        """
+        self._store_pdf_nodes(session, project_name, pdf_data)
+        return self._store_chunk_batches(session, chunks, batch_size)
+
+    def _store_pdf_nodes(self, session, project_name: str, pdf_data: list):
+        """Merge the project node and its PDF nodes in two write transactions."""
+        session.execute_write(self._merge_project_tx, project_name)
+        logger.info(f"Created or merged Project_node: {project_name}")
+
+        pdf_rows= []
+        for pdf in pdf_data:
+            pdf_name= pdf.get("name") or pdf.get("pdf_name")
+            if not pdf_name:
+                logger.warning(f"skipping PDF with missing name field: {pdf}")
+                continue
+            pdf_rows.append({
+                "pdf_name": pdf_name,
+                "pages": pdf.get("pages", 0),
+                "content_hash": pdf.get("content_hash"),
+            })
+        if pdf_rows:
+            session.execute_write(self._merge_pdfs_tx, project_name, pdf_rows)
+            logger.info(f"Stored {len(pdf_rows)} PDF nodes.")
+
+    def _store_chunk_batches(self, session, chunks: list, batch_size: int):
+        """Write chunks in UNWIND batches; returns (written, failed)."""
+        logger.info(f"starting bulk chunk storage for {len(chunks)} chunks in batches of {batch_size}...")
+        failed= 0
+        for i in range(0, len(chunks), batch_size):
+            rows= [self._chunk_row(c) for c in chunks[i:i + batch_size]]
+            failed+= self._write_chunk_batch(session, rows)
+            logger.debug(f"Stored chunk batch {i // batch_size + 1} ({len(rows)} chunks)")
+        return len(chunks) - failed, failed
+
+    def store_pdfs(self, project_name: str, pdf_data: list):
+        """
+        Create/merge the project node and its PDF nodes without writing chunks.
+        Used by the streaming ingest, which writes chunks batch by batch afterwards.
+        """
+        if not self.driver:
+            logger.warning("Neo4j Driver is not yet initialized; skipping PDF storage.")
+            return
+        try:
+            with self.driver.session() as session:
+                self._store_pdf_nodes(session, project_name, pdf_data)
+        except Exception as e:
+            logger.error(f"Neo4j Couldn't Store PDFs for project '{project_name}': {e}")
+            raise
+
+    def store_chunks(self, chunks: list, batch_size: Optional[int]= None)-> Tuple[int, int]:
+        """
+        Write chunk dictionaries for PDFs that already exist, in UNWIND batches.
+        Arguments:
+            chunks ---> list[dict]: Text chunk dictionaries with embeddings, each
+                                    carrying its `project` and `pdf_name`.
+            batch_size ---> int: Chunks per UNWIND batch (defaults to NEO4J_WRITE_BATCH_SIZE).
+        Returns:
+            Tuple[int, int]: (chunks written, chunks failed)
+        """
+        if not self.driver:
+            logger.warning("Neo4j Driver is not yet initialized; skipping chunk storage.")
+            return 0, len(chunks)
+        with self.driver.session() as session:
+            return self._store_chunk_batches(session, chunks, batch_size or self.write_batch_size)
+
+    def _store_per_row(self, session, project_name: str, pdf_data: list, chunks: list):
+        """
+        Slow path: one auto-commit query per PDF and per chunk, with per-row
+        error logging. Useful for debugging which chunk a write is failing on.
+        """
+        #project node
+        session.run(
+            """
+            MERGE (p: Project {name: $name})
+            ON CREATE SET p.date_created= $date
+            """,
+            {
+                "name": project_name,
+                "date": datetime.now(ist).isoformat()
+            }
+        )
+        logger.info(f"Created or merged Project_node: {project_name}")
+
+        #PDF Nodes
+        for pdf in pdf_data:
+
+            pdf_name= pdf.get("name") or pdf.get("pdf_name")
+            pages= pdf.get("pages", 0)
+
+            if not pdf_name:
+                logger.warning(f"skipping PDF with missing name field: {pdf}")
+
+            try:
                 session.run(
                     """
-                    MERGE (p: Project {name: $name})
-                    ON CREATE SET p.date_created= $date
+                    MATCH (p: Project {name: $project_name})
+                    MERGE (pdf: PDF {project: $project_name, name: $pdf_name})
+                    SET pdf.pages= $pages,
+                        pdf.content_hash= $content_hash
+                    MERGE (p)-[:HAS_PDF]->(pdf)
                     """,
                     {
-                        "name": project_name,
-                        "date": datetime.now(ist).isoformat()
+                        "project_name": project_name,
+                        "pdf_name": pdf_name,
+                        "pages": pages,
+                        "content_hash": pdf.get("content_hash")
                     }
                 )
-                logger.info(f"Created or merged Project_node: {project_name}")
-                
-                #PDF Nodes
-                for pdf in pdf_data:
-
-                    pdf_name= pdf.get("name") or pdf.get("pdf_name")
-                    pages= pdf.get("pages", 0)
-
-                    if not pdf_name:
-                        logger.warning(f"skipping PDF with missing name field: {pdf}")
-
-                    try:
-                        session.run(
-                            """
-                            MATCH (p: Project {name: $project_name})
-                            MERGE (pdf: PDF {name: $pdf_name})
-                            SET pdf.pages= $pages
-                            MERGE (p)-[:HAS_PDF]->(pdf)
-                            """,
-                            {
-                                "project_name": project_name,
-                                "pdf_name": pdf_name, #did here also
-                                "pages": pages #here also
-                            }
-                        )
-                        logger.info(f"Stored PDF node: {pdf_name}")
-                    except Exception as e:
-                        logger.error(f"Neo4j Couldn't Store PDF '{pdf_name}': {e}")
-
-                #chunk nodes
-                logger.info(f"starting chunk storage for {len(chunks)} chunks...")
-                for c in chunks:
-                    pdf_name= c.get("pdf_name")
-                    page_num= c.get("page_num")
-                    pdf_path= c.get("pdf_path")
-                    try:
-                        session.run(
-                            """
-                            MATCH (pdf:PDF {name: $pdf_name})
-                            MERGE (chunk:Chunk {pdf_name: $pdf_name, chunk_id: $id})
-                            SET chunk.text = $text, 
-                                chunk.embedding = $embedding,
-                                chunk.page_num = $page_num,
-                                chunk.pdf_path = $pdf_path
-                            MERGE (pdf)-[:HAS_CHUNK]->(chunk)
-                            """,
-                            {
-                                "pdf_name": pdf_name,
-                                "id": c.get("chunk_id"),
-                                "text": c.get("text", ""),
-                                "embedding": c.get('embedding',[]),
-                                "page_num": page_num,
-                                "pdf_path": pdf_path
-                            }
-                        )
-                        logger.info(f"Stored chunk {c['chunk_id']} for PDF {pdf_name}")
-                    except Exception as e:
-                        logger.error(f"Neo4j Chunk Error, PDF '{pdf_name}' Chunk_ID {c.get('chunk_id')}: {e}")
-
-            logger.info(f"Neo4j Project {project_name}, stored successfully")
-        
-        except Exception as e:
-            logger.error(f"Neo4j Storage Error: {e}")
-    
+                logger.info(f"Stored PDF node: {pdf_name}")
+            except Exception as e:
+                logger.error(f"Neo4j Couldn't Store PDF '{pdf_name}': {e}")
+
+        #chunk nodes
+        logger.info(f"starting chunk storage for {len(chunks)} chunks...")
+        failed= 0
+        for c in chunks:
+            row= self._chunk_row(c)
+            try:
+                record= session.run(
+                    """
+                    MATCH (pdf:PDF {project: $project, name: $pdf_name})
+                    MERGE (chunk:Chunk {project: $project, pdf_name: $pdf_name, chunk_id: $chunk_id})
+                    SET chunk.text = $text,
+                        chunk.embedding = $embedding,
+                        chunk.page_num = $page_num,
+                        chunk.pdf_path = $pdf_path,
+                        chunk.page_hash = $page_hash
+                    MERGE (pdf)-[:HAS_CHUNK]->(chunk)
+                    RETURN count(chunk) AS written
+                    """,
+                    row
+                ).single()
+                if not record or not record["written"]:
+                    failed+= 1
+                    logger.error(f"Neo4j Chunk Error, PDF '{row['pdf_name']}' Chunk_ID {row['chunk_id']}: PDF node does not exist")
+                    continue
+                self._mirror("upsert", [row])
+                logger.info(f"Stored chunk {row['chunk_id']} for PDF {row['pdf_name']}")
+            except Exception as e:
+                failed+= 1
+                logger.error(f"Neo4j Chunk Error, PDF '{row['pdf_name']}' Chunk_ID {row['chunk_id']}: {e}")
+        return len(chunks) - failed, failed
+
+    def similarity_search(self, embedding: List[float], k: int= 3, project_name: Optional[str]= None,
+                          pdf_names: Optional[List[str]]= None, index_name: str= "vector")-> List[dict]:
+        """
+        Top-k chunks for a query embedding, straight through the driver.
+        Unscoped queries use the vector index; project/PDF scoped queries only
+        score the chunks reachable from the selected Project/PDF nodes.
+        Returns:
+            List[dict]: text, pdf_name, page_num, pdf_path, chunk_id and score per chunk.
+        """
+        if not self.driver or not embedding:
+            return []
+        if project_name or pdf_names:
+            query= scoped_search_cypher(project_name, pdf_names)
+        else:
+            query= VECTOR_SEARCH_CYPHER
+        with self.driver.session() as session:
+            return session.run(
+                query,
+                project_name= project_name,
+                pdf_names= pdf_names or [],
+                index_name= index_name,
+                k= k,
+                embedding= embedding
+            ).data()
+
+    def fulltext_search(self, question: str, k: int= 3, project_name: Optional[str]= None,
+                        pdf_names: Optional[List[str]]= None)-> List[dict]:
+        """
+        Top-k chunks by BM25 score from the full-text index on Chunk.text,
+        filtered to the project/PDFs inside the Lucene query.
+        Returns the same fields as `similarity_search`.
+        """
+        params= fulltext_search_params(question, k, project_name, pdf_names)
+        if not self.driver or not params["query"]:
+            return []
+        with self.driver.session() as session:
+            return session.run(fulltext_search_cypher(project_name, pdf_names), params).data()
+
+    def iter_chunks(self, batch_size: Optional[int]= None):
+        """
+        Yield every embedded chunk (project, pdf_name, chunk_id, page_num, pdf_path, text, embedding)
+        from one streamed result, fetched `batch_size` records at a time. Used to rebuild the local index.
+        """
+        if not self.driver:
+            return
+        batch_size= batch_size or self.write_batch_size
+        with self.driver.session(fetch_size= batch_size) as session:
+            result= session.run(
+                """
+                MATCH (c:Chunk)
+                WHERE c.embedding IS NOT NULL
+                RETURN c.project AS project, c.pdf_name AS pdf_name, c.chunk_id AS chunk_id, c.page_num AS page_num,
+                       c.pdf_path AS pdf_path, c.text AS text, c.embedding AS embedding
+                """
+            )
+            for record in result:
+                yield record.data()
+
     #neo4j connection close
     def close(self):
         """
-        Close active Neo4j and MongoDB connections.
+        Release the Neo4j driver. The driver is shared (services/neo4j_drivers.py)
+        and is closed by the registry on shutdown, not here.
         """
-        try:
-            if self.driver:
-                self.driver.close()
-                logger.info("Neo4j Connection Closed")
-        except Exception as e:
-            logger.error(f"Neo4j Connection Close error: {e}")
+        self.driver= None
 
 
 #mongodb metadata storage
@@ -0,0 +1,809 @@
+"""
+services/vector_index.py
+
+In-process approximate nearest-neighbour index that mirrors the `Chunk`
+embeddings stored in Neo4j.
+
+- Vectors live in a float32 matrix (L2-normalized, so a dot product is the
+  cosine similarity) with an IVF layout: rows are assigned to k-means
+  centroids and an unscoped query only scores the `nprobe` closest lists.
+- The index is persisted under VECTOR_INDEX_PATH and memory-mapped at startup,
+  so opening it is cheap and pages are loaded on demand. Row metadata (chunk
+  text included) is stored column by column in memory-mapped files too; only
+  the row keys are held in RAM.
+- Neo4jStorage keeps it in sync with chunk writes and stale-chunk deletes
+  (see `Neo4jStorage(mirror=...)`); rows written since the last compaction
+  are held in a small in-memory delta that is searched exactly.
+- `save()` appends only the writes since the previous save to disk, as a delta
+  segment of the current generation. Once the delta reaches
+  VECTOR_INDEX_COMPACT_ROWS rows, a background compaction writes a new
+  generation; searches keep running on the old one until it is swapped in.
+- Rows are keyed by (project, pdf_name, chunk_id) like the Neo4j nodes;
+  project/PDF scoped queries score only the rows of the selected PDFs.
+- Several processes (e.g. uvicorn workers) may share the directory: disk writes
+  take an exclusive file lock and first catch up with what the other processes
+  wrote, and searches pick up new segments every VECTOR_INDEX_REFRESH_INTERVAL
+  seconds. The previous generation is kept for processes still reading it.
+
+RAGPipeline uses it as the primary retrieval path (VECTOR_INDEX_MODE=primary)
+or only when Neo4j retrieval is unavailable (VECTOR_INDEX_MODE=fallback).
+"""
+
+import os
+import json
+import time
+import array
+import shutil
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    #no cross-process lock (e.g. Windows): run a single worker per index directory
+    fcntl= None
+
+#logging configuration
+logger= logging.getLogger(__name__)
+
+#local index settings (overridable from .env)
+VECTOR_INDEX_MODE= os.getenv("VECTOR_INDEX_MODE", "fallback").lower()
+VECTOR_INDEX_PATH= os.getenv("VECTOR_INDEX_PATH", "vector_index")
+VECTOR_INDEX_NPROBE= int(os.getenv("VECTOR_INDEX_NPROBE", "8"))
+VECTOR_INDEX_MIN_TRAIN= int(os.getenv("VECTOR_INDEX_MIN_TRAIN", "4096"))
+VECTOR_INDEX_COMPACT_ROWS= int(os.getenv("VECTOR_INDEX_COMPACT_ROWS", "20000"))
+VECTOR_INDEX_REFRESH_INTERVAL= float(os.getenv("VECTOR_INDEX_REFRESH_INTERVAL", "5"))
+
+#metadata kept per row and returned with search results
+ROW_FIELDS= ("project", "pdf_name", "chunk_id", "page_num", "pdf_path", "text")
+STRING_FIELDS= ("project", "pdf_name", "chunk_id", "pdf_path", "text")
+#bumped when the on-disk layout changes; older generations are rebuilt from Neo4j
+INDEX_FORMAT= 3
+
+#rows copied per block during compaction
+_COPY_BLOCK= 4096
+
+
+def _normalize(matrix: np.ndarray)-> np.ndarray:
+    matrix= np.asarray(matrix, dtype= np.float32)
+    norms= np.linalg.norm(matrix, axis= -1, keepdims= True)
+    norms[norms == 0]= 1.0
+    return matrix / norms
+
+
+def _train_ivf(matrix: np.ndarray, nlist: int, iterations: int= 10, seed: int= 0)-> Tuple[np.ndarray, np.ndarray]:
+    """
+    Spherical k-means over (a sample of) the rows.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (centroids [nlist, dim], list assignment of every row)
+    """
+    rng= np.random.default_rng(seed)
+    rows= matrix.shape[0]
+    sample= np.asarray(matrix[np.sort(rng.choice(rows, min(rows, nlist * 64), replace= False))])
+    centroids= sample[rng.choice(len(sample), nlist, replace= False)].copy()
+    for _ in range(iterations):
+        assign= np.argmax(sample @ centroids.T, axis= 1)
+        sums= np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts= np.bincount(assign, minlength= nlist)
+        #empty lists keep their previous centroid
+        filled= counts > 0
+        centroids[filled]= _normalize(sums[filled])
+    return centroids, _assign(matrix, centroids)
+
+
+def _assign(matrix: np.ndarray, centroids: np.ndarray, block: int= 65536)-> np.ndarray:
+    """Nearest centroid of every row, computed in blocks to bound memory."""
+    out= np.empty(matrix.shape[0], dtype= np.int32)
+    for start in range(0, matrix.shape[0], block):
+        out[start:start + block]= np.argmax(matrix[start:start + block] @ centroids.T, axis= 1)
+    return out
+
+
+def _row_key(row: dict)-> Tuple[str, str, str]:
+    return (row.get("project"), row.get("pdf_name"), row.get("chunk_id"))
+
+
+def _top_k(scores: np.ndarray, k: int)-> np.ndarray:
+    """Indices of the k best scores, best first."""
+    if len(scores) > k:
+        idx= np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx= np.arange(len(scores))
+    return idx[np.argsort(-scores[idx])]
+
+
+def _encode(value)-> bytes:
+    return b"" if value is None else str(value).encode("utf-8")
+
+
+def _open_raw(path: Path, dtype, shape: tuple)-> np.ndarray:
+    """Memory-map a raw binary file (an empty file cannot be mapped)."""
+    if not shape[0]:
+        return np.zeros(shape, dtype= dtype)
+    return np.memmap(path, dtype= dtype, mode= "r", shape= shape)
+
+
+class _Segment:
+    """
+    Rows of one persisted segment, memory-mapped column by column:
+        vectors.f32          float32 [rows, dim], L2-normalized
+        page_num.npy         int32 [rows] (-1 when unknown)
+        <field>.bin          UTF-8 values of a string column, back to back
+        <field>.off.npy      int64 [rows + 1] offsets into <field>.bin
+    """
+
+    def __init__(self, directory: Optional[Path]= None, rows: int= 0, dim: int= 0):
+        self.rows= rows
+        self.vectors= np.zeros((0, dim), dtype= np.float32)
+        self.page_num= np.zeros(0, dtype= np.int32)
+        self._blobs= {field: np.zeros(0, dtype= np.uint8) for field in STRING_FIELDS}
+        self._offsets= {field: np.zeros(1, dtype= np.int64) for field in STRING_FIELDS}
+        if directory is None:
+            return
+        self.vectors= _open_raw(directory / "vectors.f32", np.float32, (rows, dim))
+        self.page_num= np.load(directory / "page_num.npy", mmap_mode= "r")
+        for field in STRING_FIELDS:
+            offsets= np.load(directory / f"{field}.off.npy", mmap_mode= "r")
+            self._offsets[field]= offsets
+            self._blobs[field]= _open_raw(directory / f"{field}.bin", np.uint8, (int(offsets[-1]),))
+
+    def raw(self, field: str, i: int)-> bytes:
+        offsets= self._offsets[field]
+        return self._blobs[field][int(offsets[i]):int(offsets[i + 1])].tobytes()
+
+    def column(self, field: str)-> List[str]:
+        """Every value of a string column (used for the in-memory row keys)."""
+        blob= self._blobs[field].tobytes()
+        offsets= self._offsets[field].tolist()
+        return [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(self.rows)]
+
+    def page(self, i: int)-> Optional[int]:
+        page= int(self.page_num[i])
+        return page if page >= 0 else None
+
+    def row(self, i: int)-> dict:
+        row= {field: self.raw(field, i).decode("utf-8") for field in STRING_FIELDS}
+        row["page_num"]= self.page(i)
+        return row
+
+
+class _SegmentWriter:
+    """Streams rows into a segment directory (layout: see `_Segment`)."""
+
+    def __init__(self, directory: Path):
+        directory.mkdir(parents= True, exist_ok= True)
+        self.directory= directory
+        self.rows= 0
+        self.dim: Optional[int]= None
+        self._vectors= open(directory / "vectors.f32", "wb")
+        self._files= {field: open(directory / f"{field}.bin", "wb") for field in STRING_FIELDS}
+        self._offsets= {field: array.array("q", [0]) for field in STRING_FIELDS}
+        self._page_num= array.array("i")
+
+    def _add(self, vector: np.ndarray, values: Dict[str, bytes], page_num: Optional[int]):
+        vector= np.asarray(vector, dtype= np.float32)
+        if self.dim is None:
+            self.dim= int(vector.shape[0])
+        self._vectors.write(vector.tobytes())
+        for field in STRING_FIELDS:
+            value= values[field]
+            self._files[field].write(value)
+            offsets= self._offsets[field]
+            offsets.append(offsets[-1] + len(value))
+        self._page_num.append(-1 if page_num is None else int(page_num))
+        self.rows+= 1
+
+    def add_row(self, vector: np.ndarray, meta: dict):
+        self._add(vector, {field: _encode(meta.get(field)) for field in STRING_FIELDS}, meta.get("page_num"))
+
+    def add_segment_rows(self, segment: _Segment, rows: np.ndarray):
+        """Copy rows of another segment without decoding their metadata."""
+        for start in range(0, len(rows), _COPY_BLOCK):
+            block= rows[start:start + _COPY_BLOCK]
+            vectors= np.asarray(segment.vectors[block], dtype= np.float32)
+            for vector, i in zip(vectors, block.tolist()):
+                self._add(vector, {field: segment.raw(field, i) for field in STRING_FIELDS}, segment.page(i))
+
+    def close(self)-> int:
+        self._vectors.close()
+        for field in STRING_FIELDS:
+            self._files[field].close()
+            np.save(self.directory / f"{field}.off.npy", np.array(self._offsets[field], dtype= np.int64))
+        np.save(self.directory / "page_num.npy", np.array(self._page_num, dtype= np.int32))
+        return self.rows
+
+
+class _FileLock:
+    """Exclusive lock on `<directory>/LOCK`, held by one process at a time."""
+
+    def __init__(self, directory: Path):
+        self.path= directory / "LOCK"
+        self._file= None
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents= True, exist_ok= True)
+        self._file= open(self.path, "a")
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+        self._file= None
+
+
+class LocalVectorIndex:
+    """
+    Disk-backed IVF index over chunk embeddings.
+
+    On disk (one generation directory, switched atomically through `CURRENT`):
+        meta.json         format, dim, row count, rows covered by the last training,
+                          whether it descends from a full rebuild
+        <segment files>   the compacted rows (see `_Segment`)
+        lists.npy         int32 [rows], IVF list of each row (when trained)
+        centroids.npy     float32 [nlist, dim] (when trained)
+        delta-NNNNNN/     writes saved since the generation was compacted, replayed
+                          in order on load: upserted rows plus a deletes list
+    LOCK (next to CURRENT) serializes the writers of all processes.
+    """
+
+    def __init__(self, path: str= VECTOR_INDEX_PATH, nprobe: int= VECTOR_INDEX_NPROBE,
+                 min_train: int= VECTOR_INDEX_MIN_TRAIN, compact_rows: int= VECTOR_INDEX_COMPACT_ROWS,
+                 refresh_interval: float= VECTOR_INDEX_REFRESH_INTERVAL):
+        """
+        Arguments:
+            path ---> str: Directory holding the persisted index.
+            nprobe ---> int: IVF lists scored per unscoped query.
+            min_train ---> int: Row count from which an IVF layout is trained (below: exact search).
+            compact_rows ---> int: Delta plus deleted rows that trigger a background compaction.
+            refresh_interval ---> float: Seconds between searches checking the disk for other processes' writes.
+        """
+        self.path= Path(path)
+        self.nprobe= max(1, nprobe)
+        self.min_train= max(1, min_train)
+        self.compact_rows= max(1, compact_rows)
+        self.refresh_interval= max(0.0, refresh_interval)
+        self._lock= threading.RLock()
+        #serializes disk writes (delta segments, compaction, rebuild) within the process; `_FileLock` across processes
+        self._persist_lock= threading.Lock()
+        self._refreshed_at= time.monotonic()
+        #older-layout generation already warned about
+        self._outdated: Optional[str]= None
+        self._compactor: Optional[threading.Thread]= None
+        #writes not on disk yet, in order: ("upsert", key, vector, meta) | ("delete", key)
+        self._journal: List[tuple]= []
+        self.searches= 0
+        self.search_seconds= 0.0
+        self._reset()
+        self._load()
+
+    #state
+    def _reset(self):
+        self.dim: Optional[int]= None
+        self._generation: Optional[str]= None
+        #delta segments of the generation already applied (by name)
+        self._applied_deltas: Set[str]= set()
+        #persisted (memory-mapped) segment
+        self._segment= _Segment()
+        self._alive= np.zeros(0, dtype= bool)
+        self._centroids: Optional[np.ndarray]= None
+        self._lists: Dict[int, np.ndarray]= {}
+        #(project, pdf_name) -> base rows
+        self._pdf_rows: Dict[Tuple[str, str], np.ndarray]= {}
+        self._trained_rows= 0
+        #generation descends from a full rebuild (not only from this process' writes)
+        self._complete= False
+        #rows written since the last compaction, searched exactly
+        self._delta_vectors: List[np.ndarray]= []
+        self._delta_meta: List[Optional[dict]]= []
+        self._delta_matrix: Optional[np.ndarray]= None
+        #(project, pdf_name, chunk_id) -> ("base" | "delta", position)
+        self._keys: Dict[Tuple[str, str, str], Tuple[str, int]]= {}
+
+    def _current_dir(self)-> Optional[Path]:
+        pointer= self.path / "CURRENT"
+        if not pointer.exists():
+            return None
+        current= self.path / pointer.read_text().strip()
+        return current if current.is_dir() else None
+
+    @staticmethod
+    def _delta_dirs(generation: Path)-> List[Path]:
+        return sorted(d for d in generation.glob("delta-*") if d.name.split("-", 1)[1].isdigit())
+
+    def _load(self):
+        """Memory-map the current generation from disk and replay its delta segments, if there is one."""
+        if self._current_dir() is None:
+            logger.info(f"No local vector index found at {self.path}; starting empty.")
+            return
+        try:
+            self._sync()
+        except Exception as e:
+            logger.error(f"Failed to load local vector index from {self.path}: {e}")
+            with self._lock:
+                self._reset()
+            return
+        if self._generation:
+            logger.info(f"Loaded local vector index: {len(self)} rows ({len(self._delta_meta)} in "
+                        f"{len(self._applied_deltas)} delta segments), {len(self._lists)} IVF lists, "
+                        f"from {self.path / self._generation}.")
+
+    def _sync(self)-> bool:
+        """
+        Catch up with the index on disk, which other processes sharing the directory
+        also write: switch to a newer generation, or replay delta segments not applied
+        yet. Files are read before the lock is taken; the journal is re-applied on top.
+
+        Returns:
+            bool: Whether anything changed.
+        """
+        current= self._current_dir()
+        if current is None:
+            return False
+        if current.name == self._generation:
+            deltas= [d for d in self._delta_dirs(current) if d.name not in self._applied_deltas]
+            if not deltas:
+                return False
+            ops= [op for directory in deltas for op in self._read_delta(directory)]
+            with self._lock:
+                if self._generation != current.name:
+                    return False
+                for op in ops + self._journal:
+                    self._apply(op)
+                self._applied_deltas.update(d.name for d in deltas)
+            return True
+
+        with open(current / "meta.json", "r", encoding= "utf-8") as f:
+            meta= json.load(f)
+        if meta.get("format") != INDEX_FORMAT:
+            if current.name != self._outdated:
+                self._outdated= current.name
+                logger.warning(f"Local vector index at {current} uses an older layout; starting empty so it is rebuilt.")
+            return False
+        segment= _Segment(current, meta.get("rows", 0), meta.get("dim") or 0)
+        centroids= None
+        lists= None
+        if (current / "centroids.npy").exists():
+            centroids= np.load(current / "centroids.npy")
+            lists= np.load(current / "lists.npy", mmap_mode= "r")
+        keys= list(zip(segment.column("project"), segment.column("pdf_name"), segment.column("chunk_id")))
+        deltas= self._delta_dirs(current)
+        ops= [op for directory in deltas for op in self._read_delta(directory)]
+        with self._lock:
+            self._reset()
+            self.dim= meta.get("dim")
+            self._generation= current.name
+            self._segment= segment
+            self._alive= np.ones(segment.rows, dtype= bool)
+            self._trained_rows= meta.get("trained_rows", 0)
+            self._complete= meta.get("complete", False)
+            self._index_base(keys, centroids, lists)
+            for op in ops + self._journal:
+                self._apply(op)
+            self._applied_deltas= {d.name for d in deltas}
+        return True
+
+    @staticmethod
+    def _read_delta(directory: Path)-> List[tuple]:
+        """Journal operations of a saved delta segment, in the order they were made."""
+        with open(directory / "meta.json", "r", encoding= "utf-8") as f:
+            meta= json.load(f)
+        segment= _Segment(directory, meta["rows"], meta.get("dim") or 0)
+        deletes= sorted(meta.get("deletes", []), key= lambda d: d[0])
+        ops= []
+        position= 0
+        for i in range(segment.rows + 1):
+            while position < len(deletes) and deletes[position][0] <= i:
+                ops.append(("delete", tuple(deletes[position][1:])))
+                position+= 1
+            if i < segment.rows:
+                row= segment.row(i)
+                ops.append(("upsert", _row_key(row), np.array(segment.vectors[i]), row))
+        return ops
+
+    def _refresh(self):
+        """Pick up writes of other processes, at most every `refresh_interval` seconds."""
+        now= time.monotonic()
+        if now - self._refreshed_at < self.refresh_interval:
+            return
+        #skipped while this process is writing (it syncs under the file lock anyway)
+        if not self._persist_lock.acquire(blocking= False):
+            return
+        try:
+            self._refreshed_at= now
+            self._sync()
+        except Exception as e:
+            logger.warning(f"Local vector index refresh failed: {e}")
+        finally:
+            self._persist_lock.release()
+
+    def _index_base(self, keys: List[Tuple[str, str, str]], centroids: Optional[np.ndarray],
+                    lists: Optional[np.ndarray]):
+        """Rebuild the in-memory lookups of the persisted segment. Caller holds the lock."""
+        self._keys= {key: ("base", i) for i, key in enumerate(keys)}
+        pdf_rows: Dict[Tuple[str, str], List[int]]= {}
+        for i, key in enumerate(keys):
+            pdf_rows.setdefault(key[:2], []).append(i)
+        self._pdf_rows= {pdf: np.asarray(rows, dtype= np.int64) for pdf, rows in pdf_rows.items()}
+        self._centroids= centroids
+        self._lists= {}
+        if centroids is not None and lists is not None:
+            order= np.argsort(lists, kind= "stable")
+            bounds= np.searchsorted(lists[order], np.arange(len(centroids) + 1))
+            self._lists= {c: order[bounds[c]:bounds[c + 1]] for c in range(len(centroids)) if bounds[c + 1] > bounds[c]}
+
+    def __len__(self)-> int:
+        with self._lock:
+            return len(self._keys)
+
+    def is_empty(self)-> bool:
+        return len(self) == 0
+
+    #writes (called by Neo4jStorage after successful Neo4j writes)
+    def _remove(self, key: Tuple[str, str, str]):
+        """Tombstone a row. Caller holds the lock."""
+        location= self._keys.pop(key, None)
+        if location is None:
+            return
+        segment, position= location
+        if segment == "base":
+            self._alive[position]= False
+        else:
+            self._delta_meta[position]= None
+
+    def _apply(self, op: tuple):
+        """Apply one journal operation to the in-memory state. Caller holds the lock."""
+        if op[0] == "delete":
+            self._remove(op[1])
+            return
+        _, key, vector, meta= op
+        if self.dim is None:
+            self.dim= int(vector.shape[0])
+        self._remove(key)
+        self._keys[key]= ("delta", len(self._delta_meta))
+        self._delta_vectors.append(vector)
+        self._delta_meta.append(meta)
+        self._delta_matrix= None
+
+    def upsert(self, rows: Iterable[dict]):
+        """
+        Add or replace chunk rows, keyed by (project, pdf_name, chunk_id).
+        Rows without an embedding (or with an unexpected dimension) are ignored.
+        """
+        with self._lock:
+            for row in rows:
+                embedding= row.get("embedding")
+                if not embedding:
+                    continue
+                vector= _normalize(np.asarray(embedding, dtype= np.float32))
+                if self.dim is not None and vector.shape[0] != self.dim:
+                    logger.warning(f"Skipping chunk {row.get('chunk_id')} with embedding dim {vector.shape[0]} != {self.dim}")
+                    continue
+                op= ("upsert", _row_key(row), vector, {field: row.get(field) for field in ROW_FIELDS})
+                self._apply(op)
+                self._journal.append(op)
+
+    def delete_chunks(self, project_name: str, pdf_name: str, keep_ids: List[str], pages: Optional[List[int]]= None):
+        """Mirror of Neo4jStorage.delete_stale_chunks."""
+        keep= set(keep_ids)
+        page_set= set(pages) if pages is not None else None
+        with self._lock:
+            stale= []
+            for key, (segment, position) in self._keys.items():
+                if key[:2] != (project_name, pdf_name) or key[2] in keep:
+                    continue
+                if segment == "base":
+                    page= self._segment.page(position)
+                else:
+                    page= self._delta_meta[position].get("page_num")
+                if page_set is None or page in page_set:
+                    stale.append(key)
+            for key in stale:
+                op= ("delete", key)
+                self._apply(op)
+                self._journal.append(op)
+
+    #search
+    def _delta_snapshot(self)-> Tuple[Optional[np.ndarray], List[Optional[dict]]]:
+        with self._lock:
+            if self._delta_vectors and self._delta_matrix is None:
+                self._delta_matrix= np.stack(self._delta_vectors)
+            return self._delta_matrix, list(self._delta_meta)
+
+    def _scope_pdfs(self, project_name: Optional[str], pdf_names: Optional[List[str]])-> Optional[Set[Tuple[str, str]]]:
+        """(project, pdf_name) pairs selected by a scope, or None for an unscoped query."""
+        if not project_name and not pdf_names:
+            return None
+        with self._lock:
+            pdfs= set(self._pdf_rows) | {(m["project"], m["pdf_name"]) for m in self._delta_meta if m}
+        names= set(pdf_names or ())
+        return {
+            pdf for pdf in pdfs
+            if (not project_name or pdf[0] == project_name) and (not names or pdf[1] in names)
+        }
+
+    def search(self, embedding: List[float], k: int= 3, project_name: Optional[str]= None,
+               pdf_names: Optional[List[str]]= None)-> List[dict]:
+        """
+        Top-k chunks by cosine similarity.
+        Scoped queries are exact over the selected PDFs; unscoped queries probe
+        the `nprobe` closest IVF lists (exact when the index is not trained).
+
+        Returns:
+            List[dict]: Row metadata (project, pdf_name, chunk_id, page_num, pdf_path, text) plus `score`.
+        """
+        self._refresh()
+        start= time.perf_counter()
+        if self.dim is None or not embedding or len(embedding) != self.dim:
+            return []
+        query= _normalize(np.asarray(embedding, dtype= np.float32))
+        scope= self._scope_pdfs(project_name, pdf_names)
+
+        with self._lock:
+            segment, alive= self._segment, self._alive
+            centroids, lists, pdf_rows= self._centroids, self._lists, self._pdf_rows
+
+        #candidate rows of the persisted segment
+        if scope is not None:
+            parts= [pdf_rows[pdf] for pdf in scope if pdf in pdf_rows]
+            rows= np.concatenate(parts) if parts else np.zeros(0, dtype= np.int64)
+        elif centroids is not None and lists:
+            probe= _top_k(centroids @ query, min(self.nprobe, len(centroids)))
+            parts= [lists[c] for c in probe if c in lists]
+            rows= np.concatenate(parts) if parts else np.zeros(0, dtype= np.int64)
+        else:
+            rows= np.arange(segment.rows)
+        if len(rows):
+            rows= rows[alive[rows]]
+
+        results: List[Tuple[float, dict]]= []
+        if len(rows):
+            scores= np.asarray(segment.vectors[rows] @ query)
+            for i in _top_k(scores, k):
+                results.append((float(scores[i]), segment.row(int(rows[i]))))
+
+        delta_matrix, delta_meta= self._delta_snapshot()
+        if delta_matrix is not None:
+            positions= [i for i, m in enumerate(delta_meta)
+                         if m and (scope is None or (m["project"], m["pdf_name"]) in scope)]
+            if positions:
+                scores= delta_matrix[positions] @ query
+                for i in _top_k(scores, k):
+                    results.append((float(scores[i]), delta_meta[positions[i]]))
+
+        results.sort(key= lambda r: -r[0])
+        with self._lock:
+            self.searches+= 1
+            self.search_seconds+= time.perf_counter() - start
+        return [{**m, "score": score} for score, m in results[:k]]
+
+    #persistence
+    def save(self, force: bool= False):
+        """
+        Persist the writes since the previous save as a delta segment of the
+        current generation (the first save, or force=True, compacts instead).
+        A compaction into a new generation is started in the background once
+        the delta reaches `compact_rows` rows. Searches never wait on disk I/O.
+        """
+        if force:
+            self.compact()
+            return
+        #waits for a refresh or compaction in progress, so the journal is on disk when this returns
+        with self._persist_lock:
+            if self._journal:
+                with _FileLock(self.path):
+                    self._sync()
+                    if self._generation is None:
+                        self._compact_locked()
+                    else:
+                        self._write_delta()
+        if self._compaction_due():
+            self._start_compaction()
+
+    def _write_delta(self):
+        """Append the journal to the current generation as its next delta segment. Caller holds both locks and has synced."""
+        with self._lock:
+            journal, self._journal= self._journal, []
+            generation, dim= self._generation, self.dim
+        if not journal:
+            return
+        deltas= self._delta_dirs(self.path / generation)
+        seq= int(deltas[-1].name.split("-", 1)[1]) + 1 if deltas else 1
+        start= time.perf_counter()
+        target= self.path / generation / f"delta-{seq:06d}"
+        tmp= target.with_name(target.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors= True)
+        try:
+            writer= _SegmentWriter(tmp)
+            deletes= []
+            for op in journal:
+                if op[0] == "delete":
+                    deletes.append([writer.rows, *op[1]])
+                else:
+                    writer.add_row(op[2], op[3])
+            rows= writer.close()
+            with open(tmp / "meta.json", "w", encoding= "utf-8") as f:
+                json.dump({"rows": rows, "dim": dim, "deletes": deletes}, f)
+            os.replace(tmp, target)
+        except Exception:
+            #keep the writes for the next save
+            with self._lock:
+                self._journal= journal + self._journal
+            raise
+        with self._lock:
+            self._applied_deltas.add(target.name)
+        logger.info(f"Saved local vector index {target.name} ({rows} rows, {len(deletes)} deletes) "
+                    f"in {time.perf_counter() - start:.2f}s.")
+
+    def _compaction_due(self)-> bool:
+        with self._lock:
+            dead= len(self._alive) - int(np.count_nonzero(self._alive))
+            return self._generation is not None and len(self._delta_meta) + dead >= self.compact_rows
+
+    def _start_compaction(self):
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            self._compactor= threading.Thread(target= self._background_compact, name= "local-index-compaction", daemon= True)
+            self._compactor.start()
+
+    def _background_compact(self):
+        try:
+            self.compact(only_if_due= True)
+        except Exception as e:
+            logger.error(f"Local vector index compaction failed: {e}")
+
+    def compact(self, only_if_due: bool= False):
+        """
+        Merge the persisted rows and the delta into a new generation and switch to it.
+
+        Arguments:
+            only_if_due ---> bool: Skip it when, once synced with the disk, the delta is below `compact_rows` (e.g. another process compacted meanwhile).
+        """
+        with self._persist_lock, _FileLock(self.path):
+            self._sync()
+            if not only_if_due or self._compaction_due():
+                self._compact_locked()
+        #writes made during the compaction go to the new generation
+        self.save()
+
+    def _compact_locked(self):
+        """
+        Snapshot the rows under the lock and write the new generation without it;
+        writes made meanwhile are re-applied on top when it is swapped in.
+        Caller holds both locks and has synced.
+        """
+        start= time.perf_counter()
+        with self._lock:
+            segment, base_rows= self._segment, np.flatnonzero(self._alive)
+            delta= [(self._delta_vectors[i], m) for i, m in enumerate(self._delta_meta) if m]
+            centroids, trained_rows, dim, complete= self._centroids, self._trained_rows, self.dim, self._complete
+            #everything written so far is part of the snapshot
+            self._journal= []
+
+        def fill(writer: _SegmentWriter):
+            writer.add_segment_rows(segment, base_rows)
+            for vector, meta in delta:
+                writer.add_row(vector, meta)
+
+        generation= self._write_generation(fill, dim, centroids, trained_rows, complete)
+        logger.info(f"Compacted local vector index into {generation} ({len(self)} rows) "
+                    f"in {time.perf_counter() - start:.2f}s.")
+
+    def _write_generation(self, fill: Callable[[_SegmentWriter], None], dim: Optional[int],
+                          centroids: Optional[np.ndarray]= None, trained_rows: int= 0, complete: bool= False)-> str:
+        """
+        Write a new generation from `fill(writer)`, retraining the IVF lists when
+        the index has doubled since the last training. Then point CURRENT at it,
+        swap it in and re-apply the journal on top. Caller holds both locks.
+        """
+        generation= f"gen-{time.time_ns()}"
+        target= self.path / generation
+        writer= _SegmentWriter(target)
+        fill(writer)
+        count= writer.close()
+        dim= dim or writer.dim
+
+        if count >= self.min_train:
+            vectors= _open_raw(target / "vectors.f32", np.float32, (count, dim))
+            if centroids is not None and count < 2 * max(trained_rows, 1):
+                lists= _assign(vectors, centroids)
+            else:
+                nlist= max(1, int(np.sqrt(count)))
+                centroids, lists= _train_ivf(vectors, nlist)
+                trained_rows= count
+                logger.info(f"Trained local vector index with {nlist} IVF lists over {count} rows.")
+            del vectors
+            np.save(target / "centroids.npy", centroids)
+            np.save(target / "lists.npy", lists)
+        else:
+            trained_rows= 0
+        meta= {"format": INDEX_FORMAT, "dim": dim, "rows": count, "trained_rows": trained_rows, "complete": complete}
+        with open(target / "meta.json", "w", encoding= "utf-8") as f:
+            json.dump(meta, f)
+        pointer_tmp= self.path / "CURRENT.tmp"
+        pointer_tmp.write_text(generation)
+        os.replace(pointer_tmp, self.path / "CURRENT")
+
+        self._sync()
+        self._remove_old_generations(generation)
+        return generation
+
+    def _remove_old_generations(self, current: str):
+        """Delete all generations but the current and the previous one (other processes may still read it). Caller holds the file lock."""
+        older= sorted((entry for entry in self.path.glob("gen-*") if entry.name != current), key= lambda entry: entry.name)
+        for entry in older[:-1]:
+            #may fail on platforms that lock memory-mapped files; retried on the next compaction
+            shutil.rmtree(entry, ignore_errors= True)
+
+    def rebuild(self, rows: Iterable[dict])-> bool:
+        """
+        Load every chunk from an external source (e.g. Neo4j) straight into a
+        new generation on disk and switch to it; rows are streamed, not held in memory.
+        Skipped (without consuming `rows`) when another process built the index meanwhile.
+
+        Returns:
+            bool: Whether the index was rebuilt.
+        """
+        def fill(writer: _SegmentWriter):
+            seen= set()
+            for row in rows:
+                embedding= row.get("embedding")
+                key= _row_key(row)
+                if not embedding or key in seen:
+                    continue
+                vector= _normalize(np.asarray(embedding, dtype= np.float32))
+                if writer.dim is not None and vector.shape[0] != writer.dim:
+                    continue
+                seen.add(key)
+                writer.add_row(vector, row)
+
+        start= time.perf_counter()
+        with self._persist_lock, _FileLock(self.path):
+            self._sync()
+            if self._complete:
+                logger.info(f"Local vector index already built ({len(self)} rows); skipping the rebuild.")
+                return False
+            generation= self._write_generation(fill, None, complete= True)
+        logger.info(f"Rebuilt local vector index {generation} ({len(self)} rows) in {time.perf_counter() - start:.2f}s.")
+        self.save()
+        return True
+
+    def stats(self)-> dict:
+        with self._lock:
+            return {
+                "rows": len(self._keys),
+                "delta_rows": sum(1 for m in self._delta_meta if m),
+                "unsaved_writes": len(self._journal),
+                "ivf_lists": len(self._lists),
+                "nprobe": self.nprobe,
+                "searches": self.searches,
+                "avg_search_ms": round(1000 * self.search_seconds / self.searches, 3) if self.searches else 0.0,
+            }
+
+
+_local_index: Optional[LocalVectorIndex]= None
+_local_index_lock= threading.Lock()
+
+
+def get_local_index()-> Optional[LocalVectorIndex]:
+    """Process-wide local index shared by ingestion and querying (None when VECTOR_INDEX_MODE=off)."""
+    global _local_index
+    if VECTOR_INDEX_MODE == "off":
+        return None
+    with _local_index_lock:
+        if _local_index is None:
+            try:
+                _local_index= LocalVectorIndex()
+            except Exception as e:
+                logger.error(f"Local vector index unavailable: {e}")
+                return None
+        return _local_index
@@ -1,6 +1,8 @@
 import streamlit as st
 import requests
-import tempfile
+import json
+import time
+import base64
 
 st.set_page_config(
     page_title="Generative AI RAG System",
@@ -169,23 +171,60 @@ if st.button("Upload PDFs"):
     if not uploaded_files:
         st.warning("Please select at least one PDF file.")
     else:
-        with st.spinner("Uploading and processing your PDFs..."):
+        with st.spinner("Uploading your PDFs..."):
             try:
                 files_payload = [("files", (f.name, f, "application/pdf")) for f in uploaded_files]
                 response = requests.post(
                     f"{BACKEND_URL}/api/upload",
                     files=files_payload,
                     data={"project_name": project_name},
-                    timeout=300
+                    timeout=120
                 )
-                if response.status_code == 200:
-                    st.success("Upload successfull! Your knowledge graph is ready.")
+                if response.status_code in (200, 202):
+                    st.session_state.upload_job_id = response.json().get("job_id")
                 else:
                     st.error(f"Upload failed: {response.status_code}")
                     st.json(response.json())
             except Exception as e:
                 st.error(f"Error: {e}")
 
+#ingestion runs in the background; poll the job until it finishes
+if st.session_state.get("upload_job_id"):
+    job_id = st.session_state.upload_job_id
+    progress = st.empty()
+    with st.spinner("Processing your PDFs..."):
+        while True:
+            try:
+                job = requests.get(f"{BACKEND_URL}/api/jobs/{job_id}", timeout=10).json()
+            except Exception as e:
+                st.error(f"Error while checking upload status: {e}")
+                break
+            with progress.container():
+                for name, info in job.get("files", {}).items():
+                    st.caption(f"{name}: {info.get('stage')} ({info.get('chunks_processed', 0)} chunks)")
+                st.caption(f"Throughput: {job.get('chunks_per_second', 0)} chunks/s")
+            status = job.get("status")
+            file_errors = {name: info.get("error") for name, info in job.get("files", {}).items()
+                           if info.get("stage") == "failed"}
+            if status == "completed":
+                st.success("Upload successfull! Your knowledge graph is ready.")
+                break
+            if status == "completed_with_errors":
+                st.warning("Upload finished, but some files could not be processed:")
+                for name, error in file_errors.items():
+                    st.error(f"{name}: {error}")
+                break
+            if status == "failed" or "job_id" not in job:
+                if file_errors:
+                    st.error("Upload failed: none of the files could be processed.")
+                    for name, error in file_errors.items():
+                        st.error(f"{name}: {error}")
+                else:
+                    st.error(f"Upload failed: {job.get('error') or job.get('detail')}")
+                break
+            time.sleep(1)
+    st.session_state.upload_job_id = None
+
 st.subheader("Chat with Your Knowledge Base")
 st.caption("Ask follow-up questions and continue the conversation")
 
@@ -193,6 +232,8 @@ if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
 if "last_chunks" not in st.session_state:
     st.session_state.last_chunks = []
+if "highlight_cache" not in st.session_state:
+    st.session_state.highlight_cache = {}
 
 st.markdown('<div class="chat-container">', unsafe_allow_html=True)
 for role, msg in st.session_state.chat_history:
@@ -219,21 +260,42 @@ if st.button("Clear Chat"):
     st.session_state.last_chunks = []
     st.rerun()
 
+def stream_answer(payload, placeholder):
+    """
+    Call the SSE endpoint and render the answer as tokens arrive.
+    Returns (answer, chunks).
+    """
+    answer, chunks = "", []
+    event = None
+    with requests.post(f"{BACKEND_URL}/query/stream", json=payload, stream=True, timeout=120) as res:
+        if res.status_code != 200:
+            return f"Query failed: {res.status_code}", []
+        for line in res.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[len("data:"):].strip())
+                if event == "chunks":
+                    chunks = data.get("chunks", [])
+                elif event == "token":
+                    answer += data.get("text", "")
+                    placeholder.markdown(f'<div class="chat-bubble bot-bubble">{answer}▌</div>', unsafe_allow_html=True)
+                elif event == "error":
+                    return f"Error: {data.get('detail')}", []
+    return answer or "No answer returned.", chunks
+
 if send and user_message.strip():
     st.session_state.chat_history.append(("user", user_message))
+    st.markdown(f'<div class="chat-bubble user-bubble">{user_message}</div>', unsafe_allow_html=True)
+    answer_placeholder = st.empty()
     with st.spinner("Thinking..."):
         try:
             payload = {"query": user_message, "project_name": project_name}
-            res = requests.post(f"{BACKEND_URL}/query", json=payload, timeout=120)
-
-            if res.status_code == 200:
-                data = res.json()
-                answer = data.get("answer", "No answer returned.")
-                st.session_state.chat_history.append(("bot", answer))
-                st.session_state.last_chunks = data.get("chunks", [])
-            else:
-                st.session_state.chat_history.append(("bot", f"Query failed: {res.status_code}"))
-                st.session_state.last_chunks = []
+            answer, chunks = stream_answer(payload, answer_placeholder)
+            st.session_state.chat_history.append(("bot", answer))
+            st.session_state.last_chunks = chunks
         except Exception as e:
             st.session_state.chat_history.append(("bot", f"Error: {e}"))
             st.session_state.last_chunks = []
@@ -245,27 +307,49 @@ if st.session_state.last_chunks:
     st.markdown("<br><hr><br>", unsafe_allow_html=True)
     st.subheader("Retrieved Contexts with Highlights")
 
-    for idx, chunk in enumerate(st.session_state.last_chunks):
-        st.markdown(f"**Chunk {idx + 1} — Page {chunk.get('page_num')}**")
-        st.caption(chunk.get("text", "")[:300] + "...")
-
-        payload = {
+    items = [
+        {
             "pdf_path": chunk.get("pdf_path"),
             "page_num": chunk.get("page_num"),
-            "snippet": chunk.get("text", "")[:100]
+            "snippet": chunk.get("text", "")[:100],
+            "chunk_id": chunk.get("chunk_id"),
+            "format": "jpeg",
+            "max_width": 1000
         }
+        for chunk in st.session_state.last_chunks
+    ]
 
+    #one batch request renders every page; reruns reuse the previous result
+    batch_key = json.dumps(items, sort_keys=True)
+    if batch_key not in st.session_state.highlight_cache:
         try:
-            highlight_res = requests.post(f"{BACKEND_URL}/pdf/highlight", json=payload)
+            highlight_res = requests.post(f"{BACKEND_URL}/pdf/highlight/batch", json={"items": items}, timeout=60)
             if highlight_res.status_code == 200:
-                tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-                tmp.write(highlight_res.content)
-                tmp.flush()
-                st.image(tmp.name, caption=f"Page {chunk.get('page_num')} Highlight", use_column_width=True)
+                st.session_state.highlight_cache = {batch_key: highlight_res.json().get("pages", [])}
             else:
-                st.warning(f"Could not generate highlight for page {chunk.get('page_num')}.")
+                st.warning(f"Could not generate highlights: {highlight_res.status_code}")
         except Exception as e:
-            st.warning(f"Error generating highlight: {e}")
+            st.warning(f"Error generating highlights: {e}")
+    pages = st.session_state.highlight_cache.get(batch_key, [])
+
+    #image of each chunk's page; a page is shown once, under its first chunk
+    page_of_item = {i: page for page in pages for i in page.get("items", [])}
+    shown_pages = set()
+
+    for idx, chunk in enumerate(st.session_state.last_chunks):
+        st.markdown(f"**Chunk {idx + 1} — Page {chunk.get('page_num')}**")
+        st.caption(chunk.get("text", "")[:300] + "...")
+
+        page = page_of_item.get(idx)
+        if page is None or page.get("error"):
+            st.warning(f"Could not generate highlight for page {chunk.get('page_num')}.")
+            continue
+        page_id = (page.get("pdf_path"), page.get("page_num"))
+        if page_id in shown_pages:
+            st.caption(f"Highlighted on page {chunk.get('page_num')} above.")
+            continue
+        shown_pages.add(page_id)
+        st.image(base64.b64decode(page["image"]), caption=f"Page {chunk.get('page_num')} Highlight", use_column_width=True)
 
 st.markdown("""
 <div class="footer">
@@ -0,0 +1,75 @@
+"""
+tests/test_context_packing.py
+
+Unit tests for ContextPacker: merging overlapping chunks of a page,
+near-duplicate removal and the token budget.
+"""
+
+from langchain_core.documents import Document
+
+from services.context_packing import ContextPacker, merge_overlap
+
+OVERLAP= "shared overlap between the two consecutive chunks"
+
+
+def _doc(text: str, page: int, index: int, pdf_name: str= "a.pdf", project: str= "p")-> Document:
+    return Document(page_content= text, metadata= {"project": project, "pdf_name": pdf_name,
+                                                   "page_num": page, "chunk_id": f"{page}_{index}"})
+
+
+def _words(seed: str, count: int= 40)-> str:
+    return " ".join(f"{seed}{i}" for i in range(count))
+
+
+def test_merge_overlap_drops_the_repeated_span():
+    assert merge_overlap(f"first part {OVERLAP}", f"{OVERLAP} second part") == f"first part {OVERLAP} second part"
+
+
+def test_merge_overlap_joins_unrelated_chunks_with_a_newline():
+    assert merge_overlap("left text", "right text") == "left text\nright text"
+
+
+def test_adjacent_chunks_of_a_page_merge_in_rank_order():
+    packer= ContextPacker(token_budget= 10_000)
+    docs= [
+        _doc(f"{OVERLAP} tail of the page", 1, 1),
+        _doc(_words("other"), 2, 0),
+        _doc(f"head of the page {OVERLAP}", 1, 0),
+    ]
+    context= packer.pack(docs)
+    assert context == f"head of the page {OVERLAP} tail of the page\n\n{_words('other')}"
+    assert packer.stats()["merged_chunks"] == 1
+
+
+def test_same_pdf_name_in_two_projects_is_not_merged():
+    packer= ContextPacker(token_budget= 10_000)
+    docs= [_doc(_words("alpha"), 1, 0, project= "p"), _doc(_words("beta"), 1, 0, project= "q"),
+           _doc(_words("gamma"), 1, 1, project= "q")]
+    context= packer.pack(docs)
+    assert _words("alpha") in context
+    assert _words("beta") in context and _words("gamma") in context
+    assert packer.stats()["merged_chunks"] == 1
+
+
+def test_near_duplicate_passages_are_dropped():
+    packer= ContextPacker(token_budget= 10_000)
+    text= _words("word")
+    docs= [_doc(text, 1, 0), _doc(text + " extra", 3, 0, pdf_name= "b.pdf"), _doc(_words("other"), 2, 0)]
+    context= packer.pack(docs)
+    assert context == f"{text}\n\n{_words('other')}"
+    assert packer.stats()["near_duplicates"] == 1
+
+
+def test_budget_keeps_rank_order_and_trims_the_last_passage_at_a_word():
+    packer= ContextPacker(token_budget= 100, chars_per_token= 4)
+    first, second= _words("a", 30), _words("b", 100)
+    context= packer.pack([_doc(first, 1, 0), _doc(second, 2, 0)])
+    assert context.startswith(first + "\n\n")
+    assert context.endswith(" ...")
+    assert len(context) <= 400 + len(" ...")
+    assert context[len(first) + 2:-len(" ...")] in second
+    assert packer.stats()["trimmed"] == 1
+
+
+def test_empty_input_packs_to_an_empty_context():
+    assert ContextPacker().pack([]) == ""
@@ -0,0 +1,97 @@
+"""
+tests/test_embeddings.py
+
+Unit tests for the batched Ollama embedder and the on-disk embedding cache:
+batch sizes, per-text fallback, cache hits and LRU eviction.
+"""
+
+import threading
+
+import pytest
+
+from utils.embeddings import EmbeddingCache, OllamaEmbedder
+
+
+class _FakeClient:
+    """Stands in for OllamaEmbeddings; texts containing "bad" fail a batch request."""
+
+    def __init__(self):
+        self.batches= []
+        self.singles= []
+        self._lock= threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.batches.append(list(texts))
+        if any("bad" in t for t in texts):
+            raise RuntimeError("batch rejected")
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        with self._lock:
+            self.singles.append(text)
+        if "bad" in text:
+            raise RuntimeError("text rejected")
+        return [float(len(text)), 1.0]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache= EmbeddingCache(path= str(tmp_path / "cache.sqlite3"), max_entries= 100)
+    yield cache
+    cache.close()
+
+
+def _embedder(cache= None, batch_size: int= 4, max_in_flight: int= 2)-> OllamaEmbedder:
+    embedder= OllamaEmbedder(batch_size= batch_size, max_in_flight= max_in_flight,
+                             cache= cache, use_cache= cache is not None)
+    embedder._client= _FakeClient()
+    return embedder
+
+
+def test_texts_are_sent_in_batches_and_returned_in_order():
+    embedder= _embedder()
+    texts= [f"text {i}" * (i + 1) for i in range(10)]
+    vectors= embedder.embed_documents(texts)
+    assert vectors == [[float(len(t)), 1.0] for t in texts]
+    assert sorted(len(b) for b in embedder._client.batches) == [2, 4, 4]
+
+
+def test_failed_batch_falls_back_to_single_texts():
+    embedder= _embedder(batch_size= 3)
+    vectors= embedder.embed_documents(["one", "bad two", "three"])
+    assert vectors[0] and vectors[2]
+    assert vectors[1] == []
+    assert embedder._client.singles == ["one", "bad two", "three"]
+
+
+def test_cached_texts_are_not_sent_again(cache):
+    embedder= _embedder(cache)
+    embedder.embed_documents(["alpha", "beta"])
+    embedder._client.batches.clear()
+    #keys use the normalized text, so trailing whitespace still hits
+    vectors= embedder.embed_documents(["alpha", "gamma", "beta "])
+    assert embedder._client.batches == [["gamma"]]
+    assert vectors[0] == [5.0, 1.0]
+    stats= cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 3)
+
+
+def test_failed_embeddings_are_not_cached(cache):
+    embedder= _embedder(cache, batch_size= 1)
+    embedder.embed_documents(["bad text"])
+    assert cache.get_many(embedder.model, ["bad text"]) == [None]
+
+
+def test_cache_evicts_least_recently_used_entries(tmp_path):
+    cache= EmbeddingCache(path= str(tmp_path / "small.sqlite3"), max_entries= 10)
+    cache.put_many("m", [f"t{i}" for i in range(10)], [[float(i)] for i in range(10)])
+    #touch the oldest entry so it survives the eviction
+    assert cache.get_many("m", ["t0"]) == [[0.0]]
+    cache.put_many("m", ["t10"], [[10.0]])
+    stats= cache.stats()
+    assert stats["entries"] == 9
+    assert stats["evictions"] == 2
+    assert cache.get_many("m", ["t0", "t10"]) == [[0.0], [10.0]]
+    assert cache.get_many("m", ["t1"]) == [None]
+    cache.close()
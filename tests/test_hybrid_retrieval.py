@@ -0,0 +1,104 @@
+"""
+tests/test_hybrid_retrieval.py
+
+Unit tests for the hybrid retrieval helpers: lexical query routing,
+the Lucene query builder and reciprocal rank fusion.
+"""
+
+import pytest
+from langchain_core.documents import Document
+
+from services.querying import is_lexical_query, reciprocal_rank_fusion
+from services.storage import fulltext_search_cypher, fulltext_search_params, lucene_query
+
+
+def _doc(pdf_name: str, chunk_id: str, project: str= "p")-> Document:
+    return Document(page_content= f"{pdf_name}:{chunk_id}",
+                    metadata= {"project": project, "pdf_name": pdf_name, "chunk_id": chunk_id})
+
+
+#is_lexical_query
+@pytest.mark.parametrize("question", [
+    "What is RAG?",
+    "How does TCP work",
+    "Explain LLM memory",
+    "Summarize the 2023 report",
+    "TCP",
+    "404",
+    "What does ERR-1042 mean",
+    "x86_64 build failure",
+    "",
+])
+def test_natural_questions_stay_hybrid(question):
+    assert not is_lexical_query(question)
+
+
+@pytest.mark.parametrize("question", [
+    "ERR-1042",
+    "where is v2.3.1",
+    "0x80070005",
+    "x86_64",
+    "max_retry_count",
+    "2024-01-31",
+    '"exact phrase search"',
+    "'single quoted'",
+])
+def test_codes_and_quoted_phrases_are_lexical(question):
+    assert is_lexical_query(question)
+
+
+def test_long_identifier_queries_stay_hybrid():
+    assert not is_lexical_query("ERR-1042 ERR-1043 ERR-1044 ERR-1045 ERR-1046")
+
+
+#lucene_query
+def test_lucene_query_escapes_and_neutralizes_operators():
+    query= lucene_query("foo AND bar(baz) a:b")
+    assert query.startswith("+text:(")
+    assert "foo and bar\\(baz" in query
+    assert "a\\:b" in query
+    assert " AND " not in query
+
+
+def test_lucene_query_boosts_identifier_phrases():
+    assert lucene_query("ERR-1042") == '+text:(ERR\\-1042 "ERR-1042"^2)'
+
+
+def test_lucene_query_without_words_is_empty():
+    assert lucene_query("?? !!") == ""
+    assert lucene_query("?? !!", project_name= "p", pdf_names= ["a.pdf"]) == ""
+
+
+def test_lucene_query_scope_is_required_clause():
+    query= lucene_query("report", project_name= 'team "x"', pdf_names= ["a.pdf", "b c.pdf"])
+    assert query == ('+text:(report) +project:"team \\"x\\"" '
+                     '+(pdf_name:"a.pdf" pdf_name:"b c.pdf")')
+
+
+def test_fulltext_search_filters_inside_the_query():
+    params= fulltext_search_params("report", 5, project_name= "p", pdf_names= ["a.pdf"])
+    assert params["k"] == 5
+    assert "+project:" in params["query"]
+    cypher= fulltext_search_cypher("p", ["a.pdf"])
+    assert "{limit: $k}" in cypher
+    assert "MATCH" not in cypher.replace("queryNodes", "")
+
+
+#reciprocal_rank_fusion
+def test_rrf_ranks_documents_found_by_both_lists_first():
+    vector= [_doc("a.pdf", "1"), _doc("a.pdf", "2"), _doc("a.pdf", "3")]
+    lexical= [_doc("a.pdf", "3"), _doc("b.pdf", "9")]
+    fused= reciprocal_rank_fusion([vector, lexical], k= 60)
+    keys= [d.metadata["chunk_id"] for d in fused]
+    assert keys[0] == "3"
+    assert sorted(keys) == ["1", "2", "3", "9"]
+    assert fused[0].metadata["rrf_score"] == round(1 / 63 + 1 / 61, 6)
+
+
+def test_rrf_keeps_same_chunk_of_different_projects_apart():
+    fused= reciprocal_rank_fusion([[_doc("a.pdf", "1", "p1")], [_doc("a.pdf", "1", "p2")]])
+    assert [d.metadata["project"] for d in fused] == ["p1", "p2"]
+
+
+def test_rrf_of_empty_lists_is_empty():
+    assert reciprocal_rank_fusion([[], []]) == []
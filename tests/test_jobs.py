@@ -0,0 +1,45 @@
+"""
+tests/test_jobs.py
+
+Unit tests for the ingestion job manager: job status from per-file outcomes
+and shutdown (queued jobs cancelled, running jobs drained).
+"""
+
+import threading
+
+from services.jobs import JobManager
+
+
+def test_status_is_derived_from_the_file_stages():
+    manager= JobManager(max_workers= 1)
+
+    def work(job):
+        job.update_file("a.pdf", stage= "done")
+        job.update_file("b.pdf", stage= "failed", error= "broken")
+        return {}
+
+    job= manager.submit("p", ["a.pdf", "b.pdf"], work)
+    assert manager.shutdown(timeout= 10)
+    assert job.status == "completed_with_errors"
+    assert job.error == "b.pdf: broken"
+
+
+def test_shutdown_drains_running_jobs_and_cancels_queued_ones():
+    manager= JobManager(max_workers= 1)
+    started, release= threading.Event(), threading.Event()
+
+    def work(job):
+        started.set()
+        release.wait(10)
+        job.update_file("a.pdf", stage= "done")
+        return {}
+
+    running= manager.submit("p", ["a.pdf"], work)
+    queued= manager.submit("p", ["b.pdf"], work)
+    assert started.wait(10)
+    assert not manager.shutdown(timeout= 0.05)
+    assert queued.status == "cancelled"
+
+    release.set()
+    assert manager.shutdown(timeout= 10)
+    assert running.status == "completed"
@@ -0,0 +1,118 @@
+"""
+tests/test_pdf_ingest.py
+
+Behaviour tests for the upload path with the databases and Ollama replaced by
+in-memory stand-ins: content hash dedup, incremental re-ingest and the retry
+of pages that failed on a previous upload of the same file.
+"""
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.harness import make_pdf
+from benchmarks.stand_ins import InMemoryMongo, InMemoryVectorStorage
+from router import pdf_upload
+from router.pdf_upload import PDFUploader
+from services.chunking import DocumentChunker
+
+PROJECT= "p"
+
+
+class _FakeEmbedder:
+    """Embeds every text as a small vector; texts containing `fail_on` fail while it is set."""
+
+    batch_size= 1
+    max_in_flight= 1
+
+    def __init__(self):
+        self.fail_on= None
+        self.texts= []
+        self._lock= threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.texts.extend(texts)
+        if self.fail_on and any(self.fail_on in t for t in texts):
+            raise RuntimeError("ollama unavailable")
+        return [[float(len(t)), 1.0, 0.5] for t in texts]
+
+
+@pytest.fixture
+def uploader(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_upload, "UPLOAD_DIR", tmp_path / "uploads")
+    (tmp_path / "uploads").mkdir()
+    uploader= PDFUploader.__new__(PDFUploader)
+    uploader.chunker= DocumentChunker(workers= 1)
+    uploader.embedder= _FakeEmbedder()
+    uploader.local_index= None
+    uploader.storage= InMemoryVectorStorage()
+    uploader.mongo= InMemoryMongo()
+    uploader.ist= pdf_upload.IST
+    yield uploader
+    uploader.chunker.close()
+
+
+@pytest.fixture
+def pdf_file(tmp_path):
+    return make_pdf(str(tmp_path / "doc.pdf"), pages= 3, seed= 7)
+
+
+def _upload(uploader: PDFUploader, path: str)-> dict:
+    with open(path, "rb") as f:
+        saved= uploader.save_uploads([SimpleNamespace(filename= "doc.pdf", file= f)], PROJECT)
+    return uploader.process_saved_pdfs(saved, PROJECT)
+
+
+def _chunks(uploader: PDFUploader)-> dict:
+    return {key[2]: row for key, row in uploader.storage._chunks.items() if key[:2] == (PROJECT, "doc.pdf")}
+
+
+def test_identical_upload_is_skipped_after_a_complete_ingest(uploader, pdf_file):
+    first= _upload(uploader, pdf_file)
+    assert first["uploaded_files"] == ["doc.pdf"]
+    embedded= len(uploader.embedder.texts)
+
+    second= _upload(uploader, pdf_file)
+    assert second["skipped_files"] == ["doc.pdf"]
+    assert len(uploader.embedder.texts) == embedded
+
+
+def test_identical_upload_re_embeds_the_pages_that_failed(uploader, pdf_file):
+    #the first chunk of page 2 starts with its section heading
+    uploader.embedder.fail_on= "Section 7.2:"
+    _upload(uploader, pdf_file)
+    failed= [row for row in _chunks(uploader).values() if not row["embedding"]]
+    assert failed and {row["page_num"] for row in failed} == {2}
+
+    uploader.embedder.fail_on= None
+    uploader.embedder.texts.clear()
+    second= _upload(uploader, pdf_file)
+    assert second["uploaded_files"] == ["doc.pdf"]
+    #only the failed page is embedded again
+    assert uploader.embedder.texts
+    assert {row["page_num"] for row in _chunks(uploader).values() if row["text"] in uploader.embedder.texts} == {2}
+    assert all(row["embedding"] for row in _chunks(uploader).values())
+
+    #now complete: the same bytes are a duplicate
+    assert _upload(uploader, pdf_file)["skipped_files"] == ["doc.pdf"]
+
+
+def test_identical_upload_retries_after_failed_chunk_writes(uploader, pdf_file, monkeypatch):
+    storage= uploader.storage
+    store_chunks= storage.store_chunks
+
+    def failing_store_chunks(chunks, batch_size= None):
+        written, failed= store_chunks(chunks[:-1], batch_size)
+        return written, failed + 1
+
+    monkeypatch.setattr(storage, "store_chunks", failing_store_chunks)
+    _upload(uploader, pdf_file)
+    assert storage._pdfs[(PROJECT, "doc.pdf")]["content_hash"] is None
+
+    monkeypatch.setattr(storage, "store_chunks", store_chunks)
+    uploader.embedder.texts.clear()
+    assert _upload(uploader, pdf_file)["uploaded_files"] == ["doc.pdf"]
+    assert uploader.embedder.texts
+    assert _upload(uploader, pdf_file)["skipped_files"] == ["doc.pdf"]
@@ -0,0 +1,88 @@
+"""
+tests/test_pdf_render.py
+
+Endpoint tests for /pdf/highlight: the ETag, cache hits on repeat requests,
+304 on If-None-Match and a new ETag when the PDF changes.
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from benchmarks.harness import make_pdf
+from router import pdf_render
+from services.render_cache import RenderCache
+
+
+@pytest.fixture
+def renders(tmp_path, monkeypatch):
+    """Swap in an empty render cache and count the rasterizations."""
+    monkeypatch.setattr(pdf_render, "render_cache", RenderCache(memory_bytes= 10_000_000, disk_bytes= 0,
+                                                                spill_dir= str(tmp_path / "spill")))
+    calls= []
+    render= pdf_render.render_page_highlight
+
+    def counting_render(*args, **kwargs):
+        calls.append(args[:2])
+        return render(*args, **kwargs)
+
+    monkeypatch.setattr(pdf_render, "render_page_highlight", counting_render)
+    return calls
+
+
+@pytest.fixture
+def client():
+    app= FastAPI()
+    app.include_router(pdf_render.router)
+    return TestClient(app)
+
+
+@pytest.fixture
+def pdf_file(tmp_path):
+    return make_pdf(str(tmp_path / "doc.pdf"), pages= 2, seed= 3)
+
+
+def _body(pdf_path: str, **options)-> dict:
+    return {"pdf_path": pdf_path, "page_num": 2, "snippet": "Section 3.2:", **options}
+
+
+def test_repeat_request_is_served_from_the_cache_with_the_same_etag(client, renders, pdf_file):
+    first= client.post("/pdf/highlight", json= _body(pdf_file))
+    assert first.status_code == 200
+    assert first.headers["content-type"] == "image/png"
+    assert first.content.startswith(b"\x89PNG")
+    etag= first.headers["etag"]
+    assert etag.startswith('"') and "max-age" in first.headers["cache-control"]
+
+    second= client.post("/pdf/highlight", json= _body(pdf_file))
+    assert second.status_code == 200
+    assert second.headers["etag"] == etag
+    assert second.content == first.content
+    assert len(renders) == 1
+    assert pdf_render.render_cache.stats()["memory_hits"] == 1
+
+
+def test_matching_if_none_match_returns_304_without_rendering(client, renders, pdf_file):
+    etag= client.post("/pdf/highlight", json= _body(pdf_file)).headers["etag"]
+    for header in (etag, f'"other", W/{etag}', "*"):
+        response= client.post("/pdf/highlight", json= _body(pdf_file), headers= {"If-None-Match": header})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+    assert len(renders) == 1
+
+    stale= client.post("/pdf/highlight", json= _body(pdf_file), headers= {"If-None-Match": '"other"'})
+    assert stale.status_code == 200
+
+
+def test_render_options_and_file_changes_produce_new_etags(client, renders, pdf_file):
+    png= client.post("/pdf/highlight", json= _body(pdf_file)).headers["etag"]
+    jpeg= client.post("/pdf/highlight", json= _body(pdf_file, format= "jpeg"))
+    assert jpeg.headers["content-type"] == "image/jpeg"
+    assert jpeg.headers["etag"] != png
+
+    make_pdf(pdf_file, pages= 2, seed= 4)
+    changed= client.post("/pdf/highlight", json= _body(pdf_file), headers= {"If-None-Match": png})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != png
+    assert len(renders) == 3
@@ -0,0 +1,57 @@
+"""
+tests/test_render_cache.py
+
+Unit tests for the render cache: memory LRU, the disk spill (created on first
+use) with promotion on a hit, the disk budget and content-hash keys.
+"""
+
+from services.render_cache import RenderCache, file_content_hash, render_key
+
+
+def _cache(tmp_path, memory_bytes: int= 10, disk_bytes: int= 1000)-> RenderCache:
+    return RenderCache(memory_bytes= memory_bytes, disk_bytes= disk_bytes, spill_dir= str(tmp_path / "spill"))
+
+
+def test_spill_directory_is_created_on_first_spill_only(tmp_path):
+    cache= _cache(tmp_path)
+    cache.put("a", b"12345", "image/png")
+    assert not (tmp_path / "spill").exists()
+    cache.put("b", b"678901", "image/png")
+    assert (tmp_path / "spill" / "a.bin").exists()
+
+
+def test_memory_hit_then_disk_hit_promotes_the_image(tmp_path):
+    cache= _cache(tmp_path)
+    cache.put("a", b"12345", "image/png")
+    assert cache.get("a") == (b"12345", "image/png")
+    cache.put("b", b"678901", "image/webp")
+    assert cache.get("a") == (b"12345", "image/png")
+    assert cache.get("missing") is None
+    stats= cache.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_disk_budget_drops_the_oldest_spills(tmp_path):
+    cache= _cache(tmp_path, memory_bytes= 0, disk_bytes= 50)
+    for i in range(10):
+        cache.put(f"k{i}", bytes(10), "image/png")
+    assert cache.stats()["disk_bytes"] <= 50
+    assert cache.get("k9") is not None
+
+
+def test_spill_files_of_a_previous_run_are_counted_and_served(tmp_path):
+    _cache(tmp_path, memory_bytes= 0).put("a", b"12345", "image/png")
+    cache= _cache(tmp_path, memory_bytes= 0)
+    assert cache.get("a") == (b"12345", "image/png")
+    cache.put("b", b"1", "image/png")
+    assert cache.stats()["disk_bytes"] == len(b"image/png\n12345") + len(b"image/png\n1")
+
+
+def test_render_key_changes_with_content_and_options(tmp_path):
+    pdf= tmp_path / "a.pdf"
+    pdf.write_bytes(b"one")
+    first= render_key(file_content_hash(str(pdf)), 1, "snippet", {"dpi": 150})
+    assert first == render_key(file_content_hash(str(pdf)), 1, "snippet", {"dpi": 150})
+    assert first != render_key(file_content_hash(str(pdf)), 1, "snippet", {"dpi": 72})
+    pdf.write_bytes(b"two, changed")
+    assert first != render_key(file_content_hash(str(pdf)), 1, "snippet", {"dpi": 150})
@@ -0,0 +1,76 @@
+"""
+tests/test_semantic_cache.py
+
+Unit tests for the semantic answer cache: similarity hits, the top_k and
+prompt version parts of the key, and invalidation across processes through
+the shared ingest generation.
+"""
+
+import pytest
+
+from services.querying import GLOBAL_SCOPE, SemanticCache, cache_scope
+
+RESULT= {"answer": "42", "chunks": []}
+
+
+@pytest.fixture
+def shared_dir(tmp_path):
+    return str(tmp_path / "semantic_cache")
+
+
+def _cache(shared_dir, **kwargs)-> SemanticCache:
+    return SemanticCache(threshold= 0.95, max_entries= 8, ttl= 60, shared_dir= shared_dir, **kwargs)
+
+
+def _store(cache: SemanticCache, scope: str, top_k: int= 3, embedding= (1.0, 0.0, 0.0)):
+    cache.store(scope, list(embedding), "v1", top_k, RESULT, cache.generation(scope))
+
+
+def _lookup(cache: SemanticCache, scope: str, top_k: int= 3, embedding= (1.0, 0.0, 0.0), version= "v1"):
+    return cache.lookup(scope, list(embedding), version, top_k, cache.generation(scope))
+
+
+def test_similar_query_with_the_same_key_hits(shared_dir):
+    cache= _cache(shared_dir)
+    _store(cache, "p")
+    assert _lookup(cache, "p", embedding= (0.99, 0.05, 0.0)) == RESULT
+    assert _lookup(cache, "p", embedding= (0.0, 1.0, 0.0)) is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_top_k_and_prompt_version_are_part_of_the_key(shared_dir):
+    cache= _cache(shared_dir)
+    _store(cache, "p", top_k= 3)
+    assert _lookup(cache, "p", top_k= 5) is None
+    assert _lookup(cache, "p", version= "v2") is None
+    assert _lookup(cache, "p", top_k= 3) == RESULT
+
+
+def test_invalidate_drops_the_project_its_pdf_scopes_and_unscoped_queries(shared_dir):
+    cache= _cache(shared_dir)
+    scoped= cache_scope("p", ["a.pdf"])
+    for scope in ("p", scoped, GLOBAL_SCOPE, "q"):
+        _store(cache, scope)
+    cache.invalidate("p")
+    assert _lookup(cache, "p") is None
+    assert _lookup(cache, scoped) is None
+    assert _lookup(cache, GLOBAL_SCOPE) is None
+    assert _lookup(cache, "q") == RESULT
+
+
+def test_invalidation_by_another_worker_reaches_this_cache(shared_dir):
+    this_worker, other_worker= _cache(shared_dir), _cache(shared_dir)
+    _store(this_worker, "p")
+    _store(this_worker, "q")
+    other_worker.invalidate("p")
+    assert _lookup(this_worker, "p") is None
+    assert _lookup(this_worker, "q") == RESULT
+
+
+def test_answer_stored_under_an_older_generation_is_not_served(shared_dir):
+    cache= _cache(shared_dir)
+    #generation read before retrieval; an upload lands while the answer is generated
+    generation= cache.generation("p")
+    _cache(shared_dir).invalidate("p")
+    cache.store("p", [1.0, 0.0, 0.0], "v1", 3, RESULT, generation)
+    assert _lookup(cache, "p") is None
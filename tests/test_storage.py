@@ -0,0 +1,123 @@
+"""
+tests/test_storage.py
+
+Unit tests for the Neo4j bulk write path with the driver replaced by a fake:
+UNWIND batch counts, chunks without a PDF node, batch retries and the
+row-by-row replay.
+"""
+
+from contextlib import contextmanager
+
+import pytest
+
+from services.storage import Neo4jStorage
+
+
+class _FakeTx:
+    def __init__(self, driver):
+        self._driver= driver
+
+    def run(self, query, **params):
+        driver= self._driver
+        rows= params.get("rows", [])
+        if "MERGE (pdf: PDF" in query:
+            driver.pdfs.update((params["project_name"], row["pdf_name"]) for row in rows)
+        elif "MERGE (chunk:Chunk" in query:
+            driver.chunk_batches.append(len(rows))
+            if driver.failures and len(rows) >= driver.fail_batches_of:
+                driver.failures-= 1
+                raise RuntimeError("transient write error")
+            written= [[r["project"], r["pdf_name"], r["chunk_id"]] for r in rows
+                      if (r["project"], r["pdf_name"]) in driver.pdfs]
+            return _Result({"written": written})
+        return _Result(None)
+
+
+class _Result:
+    def __init__(self, record):
+        self._record= record
+
+    def single(self):
+        return self._record
+
+
+class _FakeSession:
+    def __init__(self, driver):
+        self._driver= driver
+
+    def execute_write(self, fn, *args):
+        return fn(_FakeTx(self._driver), *args)
+
+
+class _FakeDriver:
+    """Records the size of every chunk transaction; the next `failures` ones of at least `fail_batches_of` rows raise."""
+
+    def __init__(self):
+        self.pdfs= set()
+        self.chunk_batches= []
+        self.failures= 0
+        self.fail_batches_of= 1
+
+    @contextmanager
+    def session(self, **kwargs):
+        yield _FakeSession(self)
+
+
+class _Mirror:
+    def __init__(self):
+        self.rows= []
+
+    def upsert(self, rows):
+        self.rows.extend(rows)
+
+
+class _Storage(Neo4jStorage):
+    def _connect(self):
+        self.driver= _FakeDriver()
+
+
+@pytest.fixture
+def storage():
+    storage= _Storage(mirror= _Mirror())
+    storage.write_retries= 2
+    storage.retry_backoff= 0
+    #index creation is not part of the write path under test
+    storage._indexes_ensured= True
+    return storage
+
+
+def _chunks(count: int, pdf_name: str= "a.pdf", project: str= "p")-> list:
+    return [{"project": project, "pdf_name": pdf_name, "chunk_id": f"{pdf_name}_{i}", "text": f"text {i}",
+             "embedding": [0.1, 0.2], "page_num": 1} for i in range(count)]
+
+
+def test_chunks_are_written_in_unwind_batches(storage):
+    stats= storage.store_project("p", [{"name": "a.pdf", "pages": 1}], _chunks(1200), bulk= True, batch_size= 500)
+    assert storage.driver.chunk_batches == [500, 500, 200]
+    assert (stats["chunks_written"], stats["chunks_failed"]) == (1200, 0)
+    assert len(storage.mirror.rows) == 1200
+
+
+def test_chunks_without_a_pdf_node_count_as_failed(storage):
+    storage.store_pdfs("p", [{"name": "a.pdf", "pages": 1}])
+    written, failed= storage.store_chunks(_chunks(3) + _chunks(2, pdf_name= "missing.pdf"), batch_size= 10)
+    assert (written, failed) == (3, 2)
+    assert storage.driver.chunk_batches == [5]
+    assert {row["pdf_name"] for row in storage.mirror.rows} == {"a.pdf"}
+
+
+def test_failed_batch_is_retried_as_a_whole(storage):
+    storage.store_pdfs("p", [{"name": "a.pdf", "pages": 1}])
+    storage.driver.failures= 1
+    assert storage.store_chunks(_chunks(4), batch_size= 4) == (4, 0)
+    assert storage.driver.chunk_batches == [4, 4]
+
+
+def test_batch_is_replayed_row_by_row_after_the_retries(storage):
+    storage.store_pdfs("p", [{"name": "a.pdf", "pages": 1}])
+    #every multi-row transaction fails, single rows go through
+    storage.driver.failures= 10
+    storage.driver.fail_batches_of= 2
+    assert storage.store_chunks(_chunks(3), batch_size= 3) == (3, 0)
+    assert storage.driver.chunk_batches == [3, 3, 1, 1, 1]
+    assert len(storage.mirror.rows) == 3
@@ -0,0 +1,229 @@
+"""
+tests/test_vector_index.py
+
+Unit tests for the local vector index: upserts, tombstones, the in-memory
+delta, delta segments on disk, compaction, reloading a persisted index and
+several processes sharing the index directory.
+"""
+
+import json
+import threading
+
+import numpy as np
+import pytest
+
+from services.vector_index import LocalVectorIndex
+
+DIM= 8
+
+
+def _row(chunk_id: str, seed: int, project: str= "p", pdf_name: str= "a.pdf", page_num: int= 1)-> dict:
+    vector= np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+    return {"project": project, "pdf_name": pdf_name, "chunk_id": chunk_id, "page_num": page_num,
+            "pdf_path": f"/data/{project}/{pdf_name}", "text": f"text of {chunk_id} ✓", "embedding": vector.tolist()}
+
+
+def _ids(results)-> list:
+    return [r["chunk_id"] for r in results]
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    return tmp_path / "index"
+
+
+def _open(path, **kwargs)-> LocalVectorIndex:
+    return LocalVectorIndex(path= str(path), min_train= kwargs.pop("min_train", 10_000),
+                            compact_rows= kwargs.pop("compact_rows", 10_000), **kwargs)
+
+
+def test_upsert_then_search_returns_the_row_with_its_metadata(index_dir):
+    index= _open(index_dir)
+    rows= [_row(str(i), i) for i in range(5)]
+    index.upsert(rows)
+    result= index.search(rows[3]["embedding"], k= 1)[0]
+    assert result["chunk_id"] == "3"
+    assert result["text"] == "text of 3 ✓"
+    assert result["score"] == pytest.approx(1.0, abs= 1e-5)
+
+
+def test_upsert_replaces_the_row_with_the_same_key(index_dir):
+    index= _open(index_dir)
+    index.upsert([_row("1", 1)])
+    index.upsert([{**_row("1", 2), "text": "new"}])
+    assert len(index) == 1
+    assert index.search(_row("1", 2)["embedding"], k= 5)[0]["text"] == "new"
+
+
+def test_delete_chunks_tombstones_only_stale_rows_of_the_pdf(index_dir):
+    index= _open(index_dir)
+    index.upsert([_row("1", 1, page_num= 1), _row("2", 2, page_num= 2), _row("3", 3, page_num= 2),
+                  _row("1", 4, project= "q")])
+    index.delete_chunks("p", "a.pdf", keep_ids= ["2"], pages= [2])
+    assert len(index) == 3
+    assert sorted(_ids(index.search(_row("x", 9)["embedding"], k= 10, project_name= "p"))) == ["1", "2"]
+    assert _ids(index.search(_row("x", 9)["embedding"], k= 10, project_name= "q")) == ["1"]
+
+
+def test_save_writes_delta_segments_and_reload_replays_them(index_dir):
+    index= _open(index_dir)
+    index.upsert([_row(str(i), i) for i in range(4)])
+    index.save()
+    generation= (index_dir / "CURRENT").read_text()
+    index.upsert([_row("4", 4)])
+    index.delete_chunks("p", "a.pdf", keep_ids= ["1", "2", "3", "4"])
+    index.save()
+    deltas= sorted(p.name for p in (index_dir / generation).glob("delta-*"))
+    assert deltas == ["delta-000001"]
+    assert json.loads((index_dir / generation / "delta-000001" / "meta.json").read_text())["rows"] == 1
+    assert index.stats()["unsaved_writes"] == 0
+
+    reloaded= _open(index_dir)
+    assert len(reloaded) == 4
+    assert sorted(_ids(reloaded.search(_row("x", 9)["embedding"], k= 10))) == ["1", "2", "3", "4"]
+    assert reloaded.search(_row("4", 4)["embedding"], k= 1)[0]["text"] == "text of 4 ✓"
+
+
+def test_delete_then_reupsert_in_one_delta_keeps_the_row(index_dir):
+    index= _open(index_dir)
+    index.upsert([_row("1", 1)])
+    index.save()
+    index.delete_chunks("p", "a.pdf", keep_ids= [])
+    index.upsert([_row("1", 2)])
+    index.save()
+    reloaded= _open(index_dir)
+    assert len(reloaded) == 1
+    assert reloaded.search(_row("1", 2)["embedding"], k= 1)[0]["score"] == pytest.approx(1.0, abs= 1e-5)
+
+
+def test_row_text_is_not_stored_in_meta_json(index_dir):
+    index= _open(index_dir)
+    index.upsert([_row("1", 1)])
+    index.save()
+    generation= index_dir / (index_dir / "CURRENT").read_text()
+    assert "text of" not in (generation / "meta.json").read_text()
+    reloaded= _open(index_dir)
+    assert isinstance(reloaded._segment.vectors, np.memmap)
+
+
+def test_compaction_merges_the_delta_into_a_new_generation(index_dir):
+    index= _open(index_dir, min_train= 20)
+    index.upsert([_row(str(i), i) for i in range(30)])
+    index.save()
+    index.upsert([_row(str(i), i + 100) for i in range(30, 40)])
+    index.delete_chunks("p", "a.pdf", keep_ids= [str(i) for i in range(5, 40)])
+    index.compact()
+    assert index.stats()["delta_rows"] == 0
+    assert len(index) == 35
+    #the previous generation is kept for other processes still reading it
+    assert len(list(index_dir.glob("gen-*"))) == 2
+
+    reloaded= _open(index_dir, min_train= 20)
+    assert len(reloaded) == 35
+    assert reloaded.stats()["ivf_lists"] > 0
+    query= _row("35", 135)["embedding"]
+    assert reloaded.search(query, k= 1, project_name= "p")[0]["chunk_id"] == "35"
+
+
+def test_writes_during_compaction_are_kept(index_dir, monkeypatch):
+    index= _open(index_dir)
+    index.upsert([_row("1", 1)])
+    index.save()
+    original= index._write_generation
+
+    def write_generation(fill, *args, **kwargs):
+        #a write that lands after the snapshot, while the generation is written
+        index.upsert([_row("2", 2)])
+        return original(fill, *args, **kwargs)
+
+    monkeypatch.setattr(index, "_write_generation", write_generation)
+    index.compact()
+    assert len(index) == 2
+    assert len(_open(index_dir)) == 2
+
+
+def test_save_starts_background_compaction(index_dir):
+    index= _open(index_dir, compact_rows= 3)
+    index.upsert([_row("1", 1)])
+    index.save()
+    index.upsert([_row(str(i), i) for i in range(2, 6)])
+    index.save()
+    index._compactor.join(timeout= 10)
+    assert index.stats()["delta_rows"] == 0
+    assert len(_open(index_dir)) == 5
+
+
+def test_rebuild_streams_rows_into_a_new_generation(index_dir):
+    index= _open(index_dir)
+    rows= [_row(str(i), i, project= "p" if i % 2 else "q") for i in range(10)]
+    index.rebuild(iter(rows + rows[:2]))
+    assert len(index) == 10
+    assert index.stats()["delta_rows"] == 0
+    assert sorted(_ids(index.search(rows[0]["embedding"], k= 10, project_name= "q"))) == ["0", "2", "4", "6", "8"]
+
+
+def test_rebuild_is_skipped_once_another_process_built_the_index(index_dir):
+    first= _open(index_dir)
+    second= _open(index_dir)
+    assert first.rebuild(iter([_row("1", 1), _row("2", 2)]))
+
+    def rows():
+        raise AssertionError("rows read although the index is built")
+        yield
+
+    assert not second.rebuild(rows())
+    assert len(second) == 2
+
+
+def test_rebuild_still_runs_after_only_local_writes_were_saved(index_dir):
+    index= _open(index_dir)
+    index.upsert([_row("1", 1)])
+    index.save()
+    assert index.rebuild(iter([_row(str(i), i) for i in range(5)]))
+    assert len(index) == 5
+
+
+def test_search_picks_up_deltas_saved_by_another_process(index_dir):
+    writer= _open(index_dir)
+    writer.upsert([_row("1", 1)])
+    writer.save()
+    reader= _open(index_dir, refresh_interval= 0)
+    writer.upsert([_row("2", 2)])
+    writer.save()
+    assert reader.search(_row("2", 2)["embedding"], k= 1)[0]["chunk_id"] == "2"
+    assert len(reader) == 2
+
+
+def test_saves_and_compactions_of_several_processes_keep_every_write(index_dir):
+    first= _open(index_dir)
+    second= _open(index_dir)
+    first.upsert([_row("1", 1)])
+    first.save()
+    second.upsert([_row("2", 2)])
+    #syncs first's generation before writing its delta
+    second.save()
+    first.upsert([_row("3", 3)])
+    first.compact()
+    second.upsert([_row("4", 4)])
+    second.delete_chunks("p", "a.pdf", keep_ids= ["2", "3", "4"])
+    second.save()
+    assert sorted(_ids(second.search(_row("3", 3)["embedding"], k= 10))) == ["2", "3", "4"]
+    assert len(_open(index_dir)) == 3
+    assert len(list(index_dir.glob("gen-*"))) <= 2
+
+
+def test_save_waits_for_a_refresh_holding_the_persist_lock(index_dir):
+    index= _open(index_dir)
+    index.upsert([_row("1", 1)])
+    index.save()
+    index.upsert([_row("2", 2)])
+    #a search-triggered refresh in progress
+    index._persist_lock.acquire()
+    saver= threading.Thread(target= index.save)
+    saver.start()
+    saver.join(timeout= 0.2)
+    assert saver.is_alive()
+    index._persist_lock.release()
+    saver.join(timeout= 10)
+    assert index.stats()["unsaved_writes"] == 0
+    assert len(_open(index_dir)) == 2
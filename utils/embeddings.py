@@ -3,13 +3,227 @@ utils/embeddings.py
 
 Base embedder and concrete Ollama Embedder wrapper with logging.
 """
+import os
+import time
+import sqlite3
+import hashlib
 import logging
-from typing import List
+import threading
+from array import array
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 from langchain_ollama import OllamaEmbeddings
 
+from services.metrics import (
+    EMBEDDING_CACHE_ENTRIES, EMBEDDING_CACHE_EVICTIONS, EMBEDDING_CACHE_LOOKUPS,
+    EMBEDDING_CACHE_SECONDS_SAVED, REGISTRY,
+)
+
 #logging Configuration
 logger= logging.getLogger(__name__)
 
+#batching defaults (overridable from .env)
+DEFAULT_BATCH_SIZE= int(os.getenv("OLLAMA_EMBED_BATCH_SIZE", "32"))
+DEFAULT_MAX_IN_FLIGHT= int(os.getenv("OLLAMA_EMBED_MAX_IN_FLIGHT", "4"))
+
+#embedding cache defaults (overridable from .env)
+CACHE_ENABLED= os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_PATH= os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache/embeddings.sqlite3")
+CACHE_MAX_ENTRIES= int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+#embedding cache metrics (served by /metrics)
+_CACHE_HITS= EMBEDDING_CACHE_LOOKUPS.labels(result= "hit")
+_CACHE_MISSES= EMBEDDING_CACHE_LOOKUPS.labels(result= "miss")
+
+#seconds Ollama keeps a model loaded after a request (also used for the LLM, see services/lifecycle.py)
+KEEP_ALIVE= int(os.getenv("OLLAMA_MODEL_KEEP_ALIVE", "1800"))
+
+#Persistent Embedding Cache
+class EmbeddingCache:
+    """
+    Disk-backed, content-addressed embedding cache stored in SQLite.
+
+    Keys are sha256(model name + normalized text), vectors are stored as
+    packed float32 blobs. When the number of entries goes above
+    `max_entries` the least recently used entries are evicted.
+    Hit/miss counters are kept in memory and exposed through `stats()`.
+    """
+
+    def __init__(self, path: str= CACHE_PATH, max_entries: int= CACHE_MAX_ENTRIES):
+        """
+        Open (or create) the cache database.
+
+        Arguments:
+            path ---> str: Location of the SQLite file.
+            max_entries ---> int: Maximum number of cached vectors kept on disk.
+        """
+        self.path= path
+        self.max_entries= max(1, max_entries)
+        self._lock= threading.Lock()
+        self.hits= 0
+        self.misses= 0
+        self.evictions= 0
+        #time spent in Ollama per embedded text, used to estimate time saved by hits
+        self._embed_seconds= 0.0
+        self._embedded_texts= 0
+
+        Path(self.path).parent.mkdir(parents= True, exist_ok= True)
+        self._conn= sqlite3.connect(self.path, check_same_thread= False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+        self._conn.commit()
+        self._entries= self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        logger.info(f"EmbeddingCache opened at '{self.path}' with {self._entries} entries.")
+
+    @staticmethod
+    def make_key(model: str, text: str)-> str:
+        """Content address for a (model, text) pair; whitespace is normalized."""
+        normalized= " ".join(text.split())
+        return hashlib.sha256(f"{model}\x00{normalized}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: List[str])-> List[Optional[List[float]]]:
+        """
+        Look up cached vectors.
+
+        Returns:
+            List: One entry per text, the cached vector or None on a miss.
+        """
+        if not texts:
+            return []
+        keys= [self.make_key(model, t) for t in texts]
+        found= {}
+        with self._lock:
+            unique= list(set(keys))
+            #stay below SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                part= unique[i:i + 500]
+                placeholders= ",".join("?" * len(part))
+                rows= self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall()
+                for key, blob in rows:
+                    found[key]= array("f", blob).tolist()
+            if found:
+                now= time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access= ? WHERE key= ?",
+                    [(now, k) for k in found]
+                )
+                self._conn.commit()
+            results= [found.get(k) for k in keys]
+            hits= sum(1 for r in results if r is not None)
+            self.hits+= hits
+            self.misses+= len(results) - hits
+        _CACHE_HITS.inc(hits)
+        _CACHE_MISSES.inc(len(results) - hits)
+        return results
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """Store vectors for texts; empty vectors (failed embeddings) are skipped."""
+        now= time.time()
+        rows= [
+            (self.make_key(model, t), array("f", v).tobytes(), now)
+            for t, v in zip(texts, vectors) if v
+        ]
+        if not rows:
+            return
+        with self._lock:
+            before= self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings(key, vector, last_access) VALUES (?, ?, ?)", rows
+            )
+            self._entries+= self._conn.total_changes - before
+            if self._entries > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop least recently used entries, down to 90% of max_entries. Caller holds the lock."""
+        target= int(self.max_entries * 0.9)
+        excess= self._entries - target
+        self._conn.execute(
+            """
+            DELETE FROM embeddings WHERE key IN (
+                SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?
+            )
+            """,
+            (excess,)
+        )
+        self._entries= self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self.evictions+= excess
+        EMBEDDING_CACHE_EVICTIONS.inc(excess)
+        logger.info(f"EmbeddingCache evicted {excess} entries, {self._entries} remaining.")
+
+    def record_embed_time(self, seconds: float, count: int):
+        """Record how long Ollama took to embed `count` texts (cache misses)."""
+        with self._lock:
+            self._embed_seconds+= seconds
+            self._embedded_texts+= count
+
+    def stats(self)-> dict:
+        """Return hit/miss counters and an estimate of Ollama time saved."""
+        with self._lock:
+            lookups= self.hits + self.misses
+            per_text= self._embed_seconds / self._embedded_texts if self._embedded_texts else 0.0
+            return {
+                "entries": self._entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "estimated_seconds_saved": round(self.hits * per_text, 2),
+            }
+
+    def close(self):
+        """Close the SQLite connection."""
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache: Optional[EmbeddingCache]= None
+_default_cache_lock= threading.Lock()
+
+def get_embedding_cache()-> Optional[EmbeddingCache]:
+    """
+    Return the process-wide embedding cache, creating it on first use.
+    Returns None when the cache is disabled or cannot be opened.
+    """
+    global _default_cache
+    if not CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            try:
+                _default_cache= EmbeddingCache()
+            except Exception as e:
+                logger.warning(f"Embedding cache unavailable, continuing without it: {e}")
+                return None
+        return _default_cache
+
+def collect_cache_metrics():
+    """Refresh the embedding cache gauges (runs before every /metrics render)."""
+    cache= _default_cache
+    if cache is None:
+        return
+    stats= cache.stats()
+    EMBEDDING_CACHE_ENTRIES.set(stats["entries"])
+    EMBEDDING_CACHE_SECONDS_SAVED.set(stats["estimated_seconds_saved"])
+
+
+REGISTRY.add_collector(collect_cache_metrics)
+
 #Base Class for Embedding
 class BaseEmbedder:
     """
@@ -18,23 +232,47 @@ class BaseEmbedder:
     Methods:
         embed_query(text: str)-> List[float]:
         Should return a list of floats representing the text embedding
+        embed_documents(texts: List[str])-> List[List[float]]:
+        Embeds many texts, one vector per input text in the same order.
     """
     def embed_query(self, text: str) -> List[float]:
         raise NotImplementedError("SubClass Must Implement this method.")
 
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Default batch implementation, embeds texts one by one.
+        Subclasses should override this with a real batch call.
+        """
+        return [self.embed_query(t) for t in texts]
+
 #Ollama Embedding
 class OllamaEmbedder(BaseEmbedder):
-    def __init__(self, model: str= "nomic-embed-text:latest"):
+    def __init__(self,
+                model: str= "nomic-embed-text:latest",
+                batch_size: int= DEFAULT_BATCH_SIZE,
+                max_in_flight: int= DEFAULT_MAX_IN_FLIGHT,
+                cache: Optional[EmbeddingCache]= None,
+                use_cache: bool= True):
         """
         Initialize the Ollama embedding model.
 
         Arguments:
             model ---> str: Name of emnedding model to use.
+            batch_size ---> int: Number of texts sent to Ollama per request.
+            max_in_flight ---> int: Maximum number of batch requests running at once.
+            cache ---> EmbeddingCache: Cache to use, defaults to the shared on-disk cache.
+            use_cache ---> bool: Set False to always call Ollama.
         """
         self.model= model
-        logger.info(f"Initializing OllamaEbedder with model '{self.model}'.")
+        self.batch_size= max(1, batch_size)
+        self.max_in_flight= max(1, max_in_flight)
+        self.cache= (cache or get_embedding_cache()) if use_cache else None
+        logger.info(
+            f"Initializing OllamaEbedder with model '{self.model}', "
+            f"batch_size= {self.batch_size}, max_in_flight= {self.max_in_flight}."
+        )
         try:
-            self._client= OllamaEmbeddings(model= self.model)
+            self._client= OllamaEmbeddings(model= self.model, keep_alive= KEEP_ALIVE)
             logger.info("OllamaEmbeddings succesfully initialized.")
         except Exception as e:
             logger.exception(f"Failed to initialize OllamaEmbeddings: {e}")
@@ -49,11 +287,87 @@ class OllamaEmbedder(BaseEmbedder):
         Returns:
             List[float]: The Embedding Vector.
         """
+        if self.cache:
+            cached= self.cache.get_many(self.model, [text])[0]
+            if cached is not None:
+                logger.debug("Embedding served from cache.")
+                return cached
+        return self._embed_single(text)
+
+    def _embed_single(self, text: str)-> List[float]:
+        """Embed one text with Ollama, bypassing the cache lookup."""
         try:
             logger.debug(f"Generating embedding for text: {text[:60]}...")
+            start= time.perf_counter()
             embedding= self._client.embed_query(text)
             logger.info("Embedding generated successfully.")
+            if self.cache and embedding:
+                self.cache.record_embed_time(time.perf_counter() - start, 1)
+                self.cache.put_many(self.model, [text], [embedding])
             return embedding
         except Exception as e:
             logger.exception(f"Error generating embeddings: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    def _embed_batch(self, batch: List[str])-> List[List[float]]:
+        """
+        Embed a single batch with one Ollama request.
+        If the batch request fails, fall back to per-text embedding so that
+        one bad chunk does not drop the whole batch.
+        """
+        try:
+            start= time.perf_counter()
+            vectors= self._client.embed_documents(batch)
+            if len(vectors) != len(batch):
+                raise ValueError(f"Expected {len(batch)} embeddings, got {len(vectors)}")
+            if self.cache:
+                self.cache.record_embed_time(time.perf_counter() - start, len(batch))
+                self.cache.put_many(self.model, batch, vectors)
+            return vectors
+        except Exception as e:
+            logger.warning(f"Batch embedding failed for {len(batch)} texts, falling back to per-text: {e}")
+            return [self._embed_single(t) for t in batch]
+
+    def embed_documents(self, texts: List[str])-> List[List[float]]:
+        """
+        Generate embeddings for many texts using batched Ollama requests.
+        At most `max_in_flight` batches are sent concurrently.
+
+        Arguments:
+            texts---> List[str]: The input texts to embed.
+        Returns:
+            List[List[float]]: One embedding per text, in input order.
+            Texts that could not be embedded get an empty list.
+        """
+        if not texts:
+            return []
+
+        #serve what we can from the cache, only send misses to Ollama
+        results= self.cache.get_many(self.model, texts) if self.cache else [None] * len(texts)
+        missing= [i for i, r in enumerate(results) if r is None]
+        if self.cache:
+            logger.info(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses.")
+        if not missing:
+            return results
+
+        vectors= self._embed_uncached([texts[i] for i in missing])
+        for i, vector in zip(missing, vectors):
+            results[i]= vector
+        return results
+
+    def _embed_uncached(self, texts: List[str])-> List[List[float]]:
+        """Embed texts with Ollama in batches, bypassing the cache lookup."""
+        batches= [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        logger.info(f"Embedding {len(texts)} texts in {len(batches)} batches.")
+
+        if len(batches) == 1 or self.max_in_flight == 1:
+            results= [self._embed_batch(b) for b in batches]
+        else:
+            with ThreadPoolExecutor(max_workers= min(self.max_in_flight, len(batches))) as pool:
+                results= list(pool.map(self._embed_batch, batches))
+
+        return [vector for batch in results for vector in batch]
+
+    def cache_stats(self)-> dict:
+        """Hit/miss counters of the embedding cache (empty when caching is off)."""
+        return self.cache.stats() if self.cache else {}